@@ -0,0 +1,181 @@
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
+from django.http import HttpResponse, HttpResponseNotModified
+from django.urls import URLPattern
+from django.utils.cache import patch_vary_headers
+from rest_framework import exceptions, status
+from rest_framework.renderers import JSONRenderer
+
+from recipes.catalog import get_catalog_version
+
+from .indexes import ingredient_index, tag_index
+from .views import IngredientViewSet, TagViewSet
+
+JSON = 'application/json'
+JSON_RANGES = ('*/*', 'application/*', JSON)
+
+executor = ThreadPoolExecutor(max_workers=settings.ASGI_THREADS,
+                              thread_name_prefix='api')
+
+
+def database_sync_to_async(func):
+    """Выполняем синхронный код с ORM в пуле потоков.
+
+    В Django 3.2 нет асинхронного ORM. По умолчанию sync_to_async
+    выполняет весь синхронный код воркера в одном потоке, поэтому
+    запросы к базе идут в отдельном пуле из ASGI_THREADS потоков.
+    Устаревшие соединения закрываются до и после вызова,
+    как это делает обработчик запросов.
+    """
+
+    @functools.wraps(func)
+    def inner(*args, **kwargs):
+        close_old_connections()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            close_old_connections()
+
+    return sync_to_async(inner, thread_sensitive=False, executor=executor)
+
+
+def async_view(view):
+    """Асинхронная обертка представления DRF.
+
+    DRF 3.12 не поддерживает асинхронные представления, а у рецептов
+    почти каждый шаг (токен, фильтры, страница, счетчик) обращается
+    к базе, поэтому представление и отрисовка ответа выполняются
+    в пуле потоков целиком. Цикл событий воркера в это время
+    обслуживает другие запросы. Атрибуты представления (cls, actions,
+    csrf_exempt) сохраняются.
+    """
+
+    def render(request, *args, **kwargs):
+        response = view(request, *args, **kwargs)
+        if hasattr(response, 'render'):
+            response.render()
+        return response
+
+    run = database_sync_to_async(render)
+
+    @functools.wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        return await run(request, *args, **kwargs)
+
+    return wrapper
+
+
+def accepts_json(request):
+    """DRF ответил бы на запрос JSONRenderer без параметров.
+
+    Остальные запросы (?format=, браузерный API, Accept с параметрами)
+    обслуживает представление DRF.
+    """
+
+    if request.method != 'GET' or 'format' in request.GET:
+        return False
+    accept = request.META.get('HTTP_ACCEPT') or '*/*'
+    ranges = [media_range.strip() for media_range in accept.split(',')]
+    return ';' not in accept and any(
+        media_range in JSON_RANGES for media_range in ranges)
+
+
+def json_response(data, status_code=status.HTTP_200_OK):
+    response = HttpResponse(JSONRenderer().render(data),
+                            content_type=JSON, status=status_code)
+    return response
+
+
+def catalog_view(viewset, index, lookup, view):
+    """Асинхронное представление справочника.
+
+    Справочник отдается из индекса в памяти воркера (index) прямо
+    в цикле событий: ETag и Last-Modified вычисляются по версии
+    справочника, как в CatalogConditionalMixin, а в базу через пул
+    потоков идем, только когда версия изменилась. Версия читается
+    из кеша Django синхронно: это быстрое локальное чтение, у кеша
+    Django 3.2 нет асинхронного API. lookup(index, request, **kwargs)
+    возвращает данные ответа или None для 404.
+    """
+
+    conditions = viewset()
+    load = database_sync_to_async(index.load)
+    fallback = async_view(view)
+
+    @functools.wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        if not accepts_json(request):
+            return await fallback(request, *args, **kwargs)
+
+        version = get_catalog_version(conditions.catalog_name)
+        etag, last_modified = conditions.get_validators(
+            request, version, JSON)
+        if conditions.is_not_modified(request, etag, last_modified):
+            response = HttpResponseNotModified()
+        else:
+            if index.version != version:
+                await load()
+            data = lookup(index, request, **kwargs)
+            if data is None:
+                response = json_response(
+                    {'detail': exceptions.NotFound.default_detail},
+                    status.HTTP_404_NOT_FOUND)
+            else:
+                response = json_response(data)
+
+        conditions.set_validators(response, etag, last_modified)
+        response['Allow'] = 'GET, HEAD, OPTIONS'
+        patch_vary_headers(response, ('Accept',))
+        return response
+
+    return wrapper
+
+
+def get_by_pk(index, request, pk):
+    try:
+        return index.get(int(pk))
+    except (TypeError, ValueError):
+        return None
+
+
+# Маршруты, которые в режиме ASGI обслуживаются асинхронно:
+# справочники — из памяти в цикле событий, лента и страница
+# рецепта — представлением DRF в пуле потоков.
+CATALOG_ROUTES = {
+    'ingredients-list': (
+        IngredientViewSet, ingredient_index,
+        lambda index, request: index.lookup(request.GET.get('name'))),
+    'ingredients-detail': (IngredientViewSet, ingredient_index, get_by_pk),
+    'tags-list': (TagViewSet, tag_index, lambda index, request: index.all()),
+    'tags-detail': (TagViewSet, tag_index, get_by_pk),
+}
+ASYNC_ROUTES = (
+    'recipes-list',
+    'recipes-detail',
+)
+
+
+def async_urlpatterns(patterns):
+    """Заменяем представления маршрутов CATALOG_ROUTES и ASYNC_ROUTES
+    асинхронными.
+    """
+
+    result = []
+    for pattern in patterns:
+        if isinstance(pattern, URLPattern) and (
+                pattern.name in CATALOG_ROUTES):
+            callback = catalog_view(*CATALOG_ROUTES[pattern.name],
+                                    pattern.callback)
+        elif isinstance(pattern, URLPattern) and (
+                pattern.name in ASYNC_ROUTES):
+            callback = async_view(pattern.callback)
+        else:
+            result.append(pattern)
+            continue
+        result.append(URLPattern(pattern.pattern, callback,
+                                 pattern.default_args, pattern.name))
+    return result
@@ -0,0 +1,130 @@
+import random
+import threading
+import time
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+from django.utils.functional import SimpleLazyObject, empty
+
+STICKY_KEY = 'db-primary:{}'
+
+# Отдельный кеш, чтобы метки не вытесняли версии справочников
+# из общего кеша (и наоборот).
+STICKY_CACHE = 'replica_sticky'
+
+# Эти модели читаются только с основной базы: токен или сессия,
+# созданные при входе, могут еще не дойти до реплики.
+PRIMARY_MODELS = ('authtoken.token', 'sessions.session')
+
+routing = ContextVar('db_routing', default=None)
+
+
+class RoutingState:
+    """Состояние маршрутизации одного запроса.
+
+    Чтения идут на реплику, только если запрос безопасный (GET, HEAD,
+    OPTIONS), пользователь недавно ничего не записывал и в этом запросе
+    еще не было записи. Реплика выбирается один раз на запрос.
+    """
+
+    def __init__(self, request, safe):
+        self.request = request
+        self.safe = safe
+        self.wrote = False
+        self.sticky = None
+        self.replica = None
+        self.replica_chosen = False
+
+    def user_id(self):
+        """id пользователя, если он уже известен, без обращения к базе."""
+
+        user = self.request.__dict__.get('user')
+        if isinstance(user, SimpleLazyObject):
+            user = user._wrapped
+            if user is empty:
+                return None
+        if user is None or not user.is_authenticated:
+            return None
+        return user.pk
+
+    def choose_replica(self):
+        if not self.replica_chosen:
+            healthy = [alias for alias in settings.DATABASE_REPLICAS
+                       if replica_health.is_healthy(alias)]
+            self.replica = random.choice(healthy) if healthy else None
+            self.replica_chosen = True
+        return self.replica
+
+
+class ReplicaHealth:
+    """Доступность реплик в пределах воркера.
+
+    Недоступная реплика исключается на REPLICA_RETRY_SECONDS,
+    после чего снова проверяется подключением.
+    """
+
+    def __init__(self):
+        self.down_until = {}
+        self.lock = threading.Lock()
+
+    def is_healthy(self, alias):
+        if time.monotonic() < self.down_until.get(alias, 0):
+            return False
+        try:
+            connections[alias].ensure_connection()
+        except DatabaseError:
+            with self.lock:
+                self.down_until[alias] = (
+                    time.monotonic() + settings.REPLICA_RETRY_SECONDS)
+            return False
+        return True
+
+
+replica_health = ReplicaHealth()
+
+
+def mark_sticky(user_id):
+    """Чтения пользователя идут на основную базу REPLICA_STICKY_SECONDS
+    после записи, чтобы он видел свои изменения.
+    """
+
+    if not settings.DATABASE_REPLICAS:
+        return
+    caches[STICKY_CACHE].set(STICKY_KEY.format(user_id), True,
+                             timeout=settings.REPLICA_STICKY_SECONDS)
+
+
+class PrimaryReplicaRouter:
+    """Запись — в основную базу, безопасные запросы читают с реплик.
+
+    Решение принимается по состоянию запроса из replica_routing_middleware.
+    Вне запроса (команды, фоновые задачи) используется основная база.
+    """
+
+    def db_for_read(self, model, **hints):
+        if not settings.DATABASE_REPLICAS:
+            return DEFAULT_DB_ALIAS
+        state = routing.get()
+        if (state is None or not state.safe or state.wrote
+                or model._meta.label_lower in PRIMARY_MODELS):
+            return DEFAULT_DB_ALIAS
+
+        if state.sticky is None:
+            user_id = state.user_id()
+            if user_id is not None:
+                state.sticky = bool(caches[STICKY_CACHE].get(
+                    STICKY_KEY.format(user_id)))
+        if state.sticky:
+            return DEFAULT_DB_ALIAS
+        return state.choose_replica() or DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        state = routing.get()
+        if state is not None:
+            state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
@@ -1,6 +1,7 @@
 from django_filters.rest_framework import FilterSet, filters
 
 from recipes.models import Ingredient, Recipe, Tag
+from recipes.search import search_recipes
 
 
 class SearchIngredientFilter(FilterSet):
@@ -25,6 +26,32 @@ class RecipeFilter(FilterSet):
         help_text='Фильтровать рецепты по тегам.'
     )
 
+    ingredients = filters.ModelMultipleChoiceFilter(
+        field_name='ingredients',
+        queryset=Ingredient.objects.all(),
+        conjoined=True,
+        help_text='Рецепты, в которых есть все указанные ингредиенты.'
+    )
+
+    exclude_ingredients = filters.ModelMultipleChoiceFilter(
+        field_name='ingredients',
+        queryset=Ingredient.objects.all(),
+        exclude=True,
+        help_text='Рецепты без указанных ингредиентов.'
+    )
+
+    cooking_time_min = filters.NumberFilter(
+        field_name='cooking_time',
+        lookup_expr='gte',
+        help_text='Время приготовления не меньше, минут.'
+    )
+
+    cooking_time_max = filters.NumberFilter(
+        field_name='cooking_time',
+        lookup_expr='lte',
+        help_text='Время приготовления не больше, минут.'
+    )
+
     is_favorited = filters.NumberFilter(
         method='filter_is_favorited',
         help_text='Фильтровать рецепты, добавленные в избранное.',
@@ -35,6 +62,11 @@ class RecipeFilter(FilterSet):
         help_text='Фильтровать рецепты, находящиеся в корзине покупок.',
     )
 
+    search = filters.CharFilter(
+        method='filter_search',
+        help_text='Полнотекстовый поиск по названию и описанию.',
+    )
+
     class Meta:
         model = Recipe
         fields = ('tags', 'author')
@@ -61,3 +93,14 @@ class RecipeFilter(FilterSet):
             return queryset.filter(
                 shop_recipe__user=self.request.user)
         return queryset
+
+    def filter_search(self, queryset, name, value):
+        """Ищет рецепты по названию и описанию, лучшие совпадения первыми.
+
+        Возвращает:
+            QuerySet: Отфильтрованный набор данных.
+        """
+
+        if not value.strip():
+            return queryset
+        return search_recipes(queryset, value)
@@ -0,0 +1,594 @@
+import threading
+import time
+from array import array
+from bisect import bisect_left
+from collections import Counter, defaultdict
+from itertools import islice
+
+from django.conf import settings
+
+from recipes.catalog import (get_catalog_version, get_recipe_change_marker,
+                             get_recipe_changes, get_settled_change)
+from recipes.models import (Favourite, Ingredient, IngredientsAmount, Recipe,
+                            ShoppingCart, Tag)
+
+from .middleware import exempt_from_budget
+
+
+class IngredientIndex:
+    """Индекс ингредиентов в памяти воркера для поиска по началу названия.
+
+    Названия приводятся к нижнему регистру и хранятся в отсортированном
+    массиве, поиск по префиксу выполняется двоичным поиском.
+    Индекс перестраивается, когда меняется версия справочника
+    ингредиентов (см. recipes.catalog).
+
+    Результаты совпадают с name__istartswith в PostgreSQL
+    (UPPER(name) LIKE UPPER('префикс%')) и отдаются в порядке id.
+    """
+
+    def __init__(self):
+        self.version = None
+        self.data = ((), (), (), ())
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def normalize(value):
+        return value.lower()
+
+    def load(self):
+        """Загружаем справочник, если его версия изменилась."""
+
+        version = get_catalog_version('ingredients')
+        if version == self.version:
+            return
+        with self.lock, exempt_from_budget():
+            if version == self.version:
+                return
+            rows = sorted(
+                Ingredient.objects.values('id', 'name', 'measurement_unit'),
+                key=lambda row: (self.normalize(row['name']), row['id']),
+            )
+            items_by_id = sorted(rows, key=lambda row: row['id'])
+            self.data = (
+                [self.normalize(row['name']) for row in rows],
+                rows,
+                items_by_id,
+                [row['id'] for row in items_by_id],
+            )
+            self.version = version
+
+    def search(self, prefix=None):
+        """Ингредиенты, название которых начинается с prefix."""
+
+        self.load()
+        return self.lookup(prefix)
+
+    def lookup(self, prefix=None):
+        """Поиск по уже загруженному справочнику, без обращения к кешу."""
+
+        keys, items, items_by_id, _ = self.data
+        if not prefix:
+            return items_by_id
+
+        prefix = self.normalize(prefix)
+        start = bisect_left(keys, prefix)
+        end = start
+        while end < len(keys) and keys[end].startswith(prefix):
+            end += 1
+        return sorted(items[start:end], key=lambda row: row['id'])
+
+    def get(self, pk):
+        """Ингредиент по id из загруженного справочника или None."""
+
+        _, _, items_by_id, ids = self.data
+        index = bisect_left(ids, pk)
+        if index < len(ids) and ids[index] == pk:
+            return items_by_id[index]
+        return None
+
+
+ingredient_index = IngredientIndex()
+
+
+class TagIndex:
+    """Теги в памяти воркера.
+
+    Тегов немного, поэтому при смене версии справочника они
+    перечитываются целиком. Используется асинхронными представлениями,
+    чтобы отвечать из цикла событий без обращения к базе.
+    """
+
+    def __init__(self):
+        self.version = None
+        self.data = ((), ())
+        self.lock = threading.Lock()
+
+    def load(self):
+        """Загружаем справочник, если его версия изменилась."""
+
+        version = get_catalog_version('tags')
+        if version == self.version:
+            return
+        with self.lock, exempt_from_budget():
+            if version == self.version:
+                return
+            rows = list(Tag.objects.order_by('id').values(
+                'id', 'name', 'color', 'slug'))
+            self.data = (rows, [row['id'] for row in rows])
+            self.version = version
+
+    def all(self):
+        return self.data[0]
+
+    def get(self, pk):
+        """Тег по id из загруженного справочника или None."""
+
+        rows, ids = self.data
+        index = bisect_left(ids, pk)
+        if index < len(ids) and ids[index] == pk:
+            return rows[index]
+        return None
+
+
+tag_index = TagIndex()
+
+
+class RecipeIndex:
+    """Основа индексов рецептов в памяти воркера.
+
+    Рецепты пронумерованы по возрастанию id, номера не меняются:
+    новые рецепты дописываются в конец, удаленные остаются пустыми
+    позициями до следующей перестройки. id измененных рецептов читаются
+    из журнала (см. recipes.catalog), изменения применяются к копии
+    данных, которая затем подменяет текущую, поэтому поиск в других
+    потоках не видит промежуточных состояний. Целиком индекс
+    перестраивается при смене версий CATALOGS и если журнал отстал.
+    """
+
+    CATALOGS = ('recipes',)
+    UNSETTLED = object()
+
+    def __init__(self):
+        self.version = None
+        self.marker = None
+        self.since = 0
+        self.checked = 0.0
+        self.data = self.empty()
+        self.lock = threading.Lock()
+
+    def empty(self):
+        raise NotImplementedError
+
+    def build(self):
+        """Данные индекса по всем рецептам."""
+
+        raise NotImplementedError
+
+    def update(self, data, recipe_ids):
+        """Копия data с текущим состоянием рецептов recipe_ids.
+
+        Возвращает None, если индекс нужно перестроить целиком.
+        """
+
+        raise NotImplementedError
+
+    def load(self):
+        """Применяем изменения рецептов из журнала, если они были."""
+
+        version = tuple(get_catalog_version(name) for name in self.CATALOGS)
+        marker = get_recipe_change_marker()
+        now = time.monotonic()
+        if version == self.version and marker == self.marker:
+            self.checked = now
+            return
+        with self.lock, exempt_from_budget():
+            version = tuple(
+                get_catalog_version(name) for name in self.CATALOGS)
+            marker = get_recipe_change_marker()
+            if version == self.version and marker == self.marker:
+                return
+
+            data = changes = None
+            # Старые записи журнала удаляются: если воркер давно
+            # не сверялся, часть изменений могла пропасть.
+            if (version == self.version and now - self.checked
+                    < settings.RECIPE_CHANGES_TTL / 2):
+                changes = get_recipe_changes(self.since)
+            if changes is not None:
+                recipe_ids, since, settled = changes
+                data = self.update(self.data, recipe_ids)
+            if data is None:
+                since, settled = get_settled_change()
+                data = self.build()
+
+            self.data = data
+            self.since = since
+            self.version = version
+            self.marker = marker if settled else self.UNSETTLED
+            self.checked = now
+
+    @staticmethod
+    def find(values, value):
+        """Номер value в отсортированном массиве или None."""
+
+        index = bisect_left(values, value)
+        if index < len(values) and values[index] == value:
+            return index
+        return None
+
+
+class PantryIndex(RecipeIndex):
+    """Обратный индекс ингредиент -> рецепты в памяти воркера.
+
+    Для каждого ингредиента хранится отсортированный массив номеров
+    рецептов, для каждого рецепта — количество его ингредиентов.
+    Поиск по набору продуктов пользователя складывает массивы нужных
+    ингредиентов и не обращается к базе.
+    """
+
+    CATALOGS = ('recipes', 'ingredients')
+
+    def empty(self):
+        return array('q'), array('H'), {}
+
+    def build(self):
+        rows = (
+            IngredientsAmount.objects
+            .values_list('recipe_id', 'ingredient_id')
+            .order_by('recipe_id')
+            .distinct()
+        )
+        recipe_ids, sizes = array('q'), array('H')
+        postings = defaultdict(lambda: array('I'))
+        for recipe_id, ingredient_id in rows.iterator(chunk_size=10000):
+            if not recipe_ids or recipe_ids[-1] != recipe_id:
+                recipe_ids.append(recipe_id)
+                sizes.append(0)
+            sizes[-1] += 1
+            postings[ingredient_id].append(len(recipe_ids) - 1)
+        return recipe_ids, sizes, dict(postings)
+
+    def update(self, data, recipe_ids):
+        ingredients = defaultdict(set)
+        for recipe_id, ingredient_id in IngredientsAmount.objects.filter(
+                recipe_id__in=recipe_ids).values_list(
+                    'recipe_id', 'ingredient_id'):
+            ingredients[recipe_id].add(ingredient_id)
+
+        ids, sizes, postings = data
+        ids, sizes, postings = array('q', ids), array('H', sizes), dict(
+            postings)
+        copied = set()
+
+        def posting(ingredient_id):
+            if ingredient_id not in copied:
+                postings[ingredient_id] = array(
+                    'I', postings.get(ingredient_id, ()))
+                copied.add(ingredient_id)
+            return postings[ingredient_id]
+
+        for recipe_id in sorted(recipe_ids):
+            position = self.find(ids, recipe_id)
+            if position is None:
+                if not ingredients[recipe_id]:
+                    continue
+                if ids and recipe_id < ids[-1]:
+                    return None
+                ids.append(recipe_id)
+                sizes.append(0)
+                position = len(ids) - 1
+            elif sizes[position]:
+                for ingredient_id in list(postings):
+                    index = self.find(postings[ingredient_id], position)
+                    if index is not None:
+                        del posting(ingredient_id)[index]
+
+            sizes[position] = len(ingredients[recipe_id])
+            for ingredient_id in ingredients[recipe_id]:
+                positions = posting(ingredient_id)
+                positions.insert(bisect_left(positions, position), position)
+        return ids, sizes, postings
+
+    def search(self, ingredient_ids, min_coverage=0):
+        """Рецепты, отсортированные по доле ингредиентов из ingredient_ids.
+
+        При равной доле выше рецепты с большим числом совпадений,
+        затем более новые. Возвращает список
+        (id рецепта, найдено ингредиентов, всего ингредиентов).
+        """
+
+        self.load()
+        recipe_ids, sizes, postings = self.data
+        matched = Counter()
+        for ingredient_id in set(ingredient_ids):
+            matched.update(postings.get(ingredient_id, ()))
+
+        results = [
+            (recipe_ids[position], count, sizes[position])
+            for position, count in matched.items()
+            if count >= min_coverage * sizes[position]
+        ]
+        results.sort(key=lambda row: (-row[1] / row[2], -row[1], -row[0]))
+        return results
+
+
+pantry_index = PantryIndex()
+
+
+def to_bitmap(positions, size):
+    """Битовая карта (int) из номеров установленных битов."""
+
+    data = bytearray((size + 7) // 8)
+    for position in positions:
+        data[position >> 3] |= 1 << (position & 7)
+    return int.from_bytes(data, 'little')
+
+
+def to_container(positions, size):
+    """Множество номеров рецептов: битовая карта или массив.
+
+    Отсортированный массив занимает 4 байта на номер, битовая карта —
+    size / 8 байт, поэтому карта хранится только для частых значений.
+    """
+
+    if len(positions) * 32 > size:
+        return to_bitmap(positions, size)
+    return array('I', sorted(positions))
+
+
+def union(containers, size):
+    """Битовая карта объединения множеств номеров."""
+
+    result, positions = 0, []
+    for container in containers:
+        if isinstance(container, int):
+            result |= container
+        else:
+            positions.extend(container)
+    return result | to_bitmap(positions, size)
+
+
+class BitmapIds:
+    """id рецептов битовой карты в порядке убывания.
+
+    Поддерживает len() и срезы, поэтому может передаваться
+    в пагинатор как список: id читаются только до конца страницы.
+    """
+
+    def __init__(self, bitmap, recipe_ids):
+        self.bitmap = bitmap
+        self.recipe_ids = recipe_ids
+
+    def __len__(self):
+        # int.bit_count() есть только с Python 3.10, образ собирается на 3.9.
+        return bin(self.bitmap).count('1')
+
+    def __iter__(self):
+        data = self.bitmap.to_bytes((self.bitmap.bit_length() + 7) // 8,
+                                    'little')
+        for index in range(len(data) - 1, -1, -1):
+            byte = data[index]
+            if not byte:
+                continue
+            for bit in range(7, -1, -1):
+                if byte >> bit & 1:
+                    yield self.recipe_ids[index * 8 + bit]
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            return list(islice(self, key.start, key.stop, key.step))
+        return next(islice(self, key, None))
+
+
+class RecipeFilterIndex(RecipeIndex):
+    """Множества рецептов в памяти воркера для RecipeFilter.
+
+    Для каждого тега, ингредиента, автора и времени приготовления
+    хранится множество номеров рецептов (см. to_container). Фильтры
+    комбинируются операциями AND/OR/NOT над битовыми картами,
+    из базы затем читается только текущая страница.
+
+    Результаты совпадают с фильтрацией RecipeFilter в базе,
+    кроме поиска по тексту: с параметром search индекс не применяется.
+    """
+
+    CATALOGS = ('recipes', 'tags', 'ingredients')
+    GROUPS = ('authors', 'cooking_times', 'tags', 'ingredients')
+
+    def empty(self):
+        return None
+
+    @staticmethod
+    def with_positions(rows, recipe_ids):
+        """(номер рецепта, значение) для строк, упорядоченных по recipe_id."""
+
+        position = 0
+        for recipe_id, value in rows.order_by('recipe_id').iterator(
+                chunk_size=10000):
+            while (position < len(recipe_ids)
+                   and recipe_ids[position] < recipe_id):
+                position += 1
+            if (position < len(recipe_ids)
+                    and recipe_ids[position] == recipe_id):
+                yield position, value
+
+    def build(self):
+        recipe_ids, authors, cooking_times = array('q'), array('q'), array('I')
+        groups = {name: defaultdict(list) for name in self.GROUPS}
+        recipes = Recipe.objects.values_list(
+            'id', 'author_id', 'cooking_time').order_by('id')
+        for recipe_id, author_id, cooking_time in recipes.iterator(
+                chunk_size=10000):
+            groups['authors'][author_id].append(len(recipe_ids))
+            groups['cooking_times'][cooking_time].append(len(recipe_ids))
+            recipe_ids.append(recipe_id)
+            authors.append(author_id)
+            cooking_times.append(cooking_time)
+
+        for position, slug in self.with_positions(
+                Recipe.tags.through.objects.values_list(
+                    'recipe_id', 'tag__slug'), recipe_ids):
+            groups['tags'][slug].append(position)
+        for position, ingredient_id in self.with_positions(
+                IngredientsAmount.objects.values_list(
+                    'recipe_id', 'ingredient_id'), recipe_ids):
+            groups['ingredients'][ingredient_id].append(position)
+
+        size = len(recipe_ids)
+        data = {
+            name: {key: to_container(positions, size)
+                   for key, positions in group.items()}
+            for name, group in groups.items()
+        }
+        data.update({
+            'recipe_ids': recipe_ids,
+            'recipe_authors': authors,
+            'recipe_cooking_times': cooking_times,
+            'all': (1 << size) - 1,
+        })
+        return data
+
+    def update(self, data, recipe_ids):
+        recipes = {
+            recipe_id: (author_id, cooking_time)
+            for recipe_id, author_id, cooking_time in Recipe.objects.filter(
+                id__in=recipe_ids).values_list(
+                    'id', 'author_id', 'cooking_time')
+        }
+        tags = defaultdict(set)
+        for recipe_id, slug in Recipe.tags.through.objects.filter(
+                recipe_id__in=recipes).values_list('recipe_id', 'tag__slug'):
+            tags[recipe_id].add(slug)
+        ingredients = defaultdict(set)
+        for recipe_id, ingredient_id in IngredientsAmount.objects.filter(
+                recipe_id__in=recipes).values_list(
+                    'recipe_id', 'ingredient_id'):
+            ingredients[recipe_id].add(ingredient_id)
+
+        data = dict(data)
+        for name in ('recipe_ids', 'recipe_authors', 'recipe_cooking_times'):
+            data[name] = array(data[name].typecode, data[name])
+        for name in self.GROUPS:
+            data[name] = dict(data[name])
+        ids = data['recipe_ids']
+        copied = set()
+
+        def add(name, key, position):
+            container = data[name].get(key)
+            if isinstance(container, int):
+                data[name][key] = container | 1 << position
+                return
+            if (name, key) not in copied:
+                container = data[name][key] = array('I', container or ())
+                copied.add((name, key))
+            container.insert(bisect_left(container, position), position)
+
+        def discard(name, key, position):
+            container = data[name].get(key)
+            if isinstance(container, int):
+                data[name][key] = container & ~(1 << position)
+                return
+            index = self.find(container or (), position)
+            if index is None:
+                return
+            if (name, key) not in copied:
+                container = data[name][key] = array('I', container)
+                copied.add((name, key))
+            del container[index]
+
+        for recipe_id in sorted(recipe_ids):
+            position = self.find(ids, recipe_id)
+            if position is None:
+                if recipe_id not in recipes:
+                    continue
+                if ids and recipe_id < ids[-1]:
+                    return None
+                ids.append(recipe_id)
+                data['recipe_authors'].append(0)
+                data['recipe_cooking_times'].append(0)
+                position = len(ids) - 1
+            elif data['all'] >> position & 1:
+                discard('authors', data['recipe_authors'][position], position)
+                discard('cooking_times',
+                        data['recipe_cooking_times'][position], position)
+                for name in ('tags', 'ingredients'):
+                    for key in list(data[name]):
+                        discard(name, key, position)
+                data['all'] &= ~(1 << position)
+
+            if recipe_id not in recipes:
+                continue
+            author_id, cooking_time = recipes[recipe_id]
+            data['recipe_authors'][position] = author_id
+            data['recipe_cooking_times'][position] = cooking_time
+            add('authors', author_id, position)
+            add('cooking_times', cooking_time, position)
+            for slug in tags[recipe_id]:
+                add('tags', slug, position)
+            for ingredient_id in ingredients[recipe_id]:
+                add('ingredients', ingredient_id, position)
+            data['all'] |= 1 << position
+        return data
+
+    def user_bitmap(self, model, user):
+        """Карта рецептов из избранного или корзины пользователя."""
+
+        recipe_ids = self.data['recipe_ids']
+        positions = (
+            self.find(recipe_ids, pk)
+            for pk in model.objects.filter(user=user).values_list(
+                'recipe_id', flat=True)
+        )
+        return to_bitmap(
+            (position for position in positions if position is not None),
+            len(recipe_ids))
+
+    def filter(self, params, user):
+        """Применяем очищенные параметры RecipeFilter.
+
+        Возвращает BitmapIds или None, если запрос нельзя
+        выполнить по индексу.
+        """
+
+        if params.get('search'):
+            return None
+        self.load()
+        data = self.data
+        size = len(data['recipe_ids'])
+        result = data['all']
+
+        def bitmap(name, key):
+            return union((data[name].get(key, ()),), size)
+
+        if params.get('tags'):
+            result &= union(
+                (data['tags'].get(tag.slug, ()) for tag in params['tags']),
+                size)
+        if params.get('author') is not None:
+            result &= bitmap('authors', params['author'].pk)
+        for ingredient in params.get('ingredients') or ():
+            result &= bitmap('ingredients', ingredient.pk)
+        for ingredient in params.get('exclude_ingredients') or ():
+            result &= ~bitmap('ingredients', ingredient.pk)
+
+        low = params.get('cooking_time_min')
+        high = params.get('cooking_time_max')
+        if low is not None or high is not None:
+            result &= union(
+                (container
+                 for minutes, container in data['cooking_times'].items()
+                 if (low is None or minutes >= low)
+                 and (high is None or minutes <= high)),
+                size)
+
+        if user.is_authenticated:
+            if params.get('is_favorited'):
+                result &= self.user_bitmap(Favourite, user)
+            if params.get('is_in_shopping_cart'):
+                result &= self.user_bitmap(ShoppingCart, user)
+
+        return BitmapIds(result, data['recipe_ids'])
+
+
+recipe_filter_index = RecipeFilterIndex()
@@ -0,0 +1,212 @@
+import asyncio
+import logging
+import time
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import connections
+from django.utils.decorators import sync_and_async_middleware
+from rest_framework.permissions import SAFE_METHODS
+
+from .db_router import RoutingState, mark_sticky, routing
+
+logger = logging.getLogger(__name__)
+
+
+class QueryBudgetExceeded(Exception):
+    """Представление выполнило больше запросов, чем указано в бюджете."""
+
+
+budget_exempt = ContextVar('query_budget_exempt', default=False)
+
+
+@contextmanager
+def exempt_from_budget():
+    """Запросы внутри блока не входят в бюджет представления.
+
+    Используется для обслуживания индексов в памяти воркера: первая
+    сборка и применение журнала изменений выполняются в том запросе,
+    который их застал, и не зависят от самого представления.
+    """
+
+    token = budget_exempt.set(True)
+    try:
+        yield
+    finally:
+        budget_exempt.reset(token)
+
+
+class QueryCounter:
+    """Обертка курсора для connection.execute_wrapper.
+
+    Считает количество запросов и суммарное время их выполнения.
+    Запросы из exempt_from_budget() учитываются отдельно.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.exempt = 0
+        self.duration = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - start
+            if budget_exempt.get():
+                self.exempt += 1
+            else:
+                self.count += 1
+
+
+def get_query_budget(view_func):
+    """Достаем бюджет запросов для действия ViewSet.
+
+    Бюджет объявляется на ViewSet атрибутом query_budgets:
+    словарем {действие: максимальное количество запросов}.
+    """
+
+    view_class = getattr(view_func, 'cls', None)
+    actions = getattr(view_func, 'actions', None)
+    budgets = getattr(view_class, 'query_budgets', None)
+    if not budgets or not actions:
+        return None, None
+    return actions, budgets
+
+
+class QueryBudgetMiddleware:
+    """Учет SQL запросов на каждый запрос к API.
+
+    Добавляет в ответ заголовки Server-Timing и X-DB-Queries,
+    сверяет количество запросов с бюджетом представления
+    и пишет предупреждение в лог при его превышении.
+    Если QUERY_BUDGET_RAISE = True, превышение бюджета
+    выбрасывает QueryBudgetExceeded (используется в тестах).
+    Запросы внутри exempt_from_budget() в бюджет не входят.
+
+    У потоковых ответов запросы выполняются при отдаче тела, после
+    отправки заголовков: они считаются во время чтения тела,
+    а бюджет сверяется после него, без заголовков X-DB-Queries
+    и Server-Timing.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        counter = QueryCounter()
+        request.query_budget = None
+        start = time.perf_counter()
+
+        with self.count_queries(counter):
+            response = self.get_response(request)
+
+        budget = request.query_budget
+        if budget is not None:
+            response['X-DB-Query-Budget'] = str(budget)
+
+        if response.streaming:
+            response.streaming_content = self.count_stream(
+                request, response.streaming_content, counter)
+            return response
+
+        total = time.perf_counter() - start
+        response['X-DB-Queries'] = str(counter.count)
+        response['Server-Timing'] = (
+            f'db;dur={counter.duration * 1000:.1f};'
+            f'desc="{counter.count} queries, {counter.exempt} exempt", '
+            f'app;dur={total * 1000:.1f}'
+        )
+        self.check_budget(request, counter.count)
+        return response
+
+    @staticmethod
+    def count_queries(counter):
+        stack = ExitStack()
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(counter))
+        return stack
+
+    def count_stream(self, request, content, counter):
+        with self.count_queries(counter):
+            yield from content
+        self.check_budget(request, counter.count)
+
+    def check_budget(self, request, count):
+        budget = request.query_budget
+        if budget is not None and count > budget:
+            self.budget_exceeded(request, count, budget)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        actions, budgets = get_query_budget(view_func)
+        if budgets:
+            action = actions.get(request.method.lower())
+            request.query_budget = budgets.get(action)
+
+    def budget_exceeded(self, request, count, budget):
+        message = (f'{request.method} {request.path}: '
+                   f'{count} SQL запросов при бюджете {budget}.')
+        logger.warning(message)
+        if getattr(settings, 'QUERY_BUDGET_RAISE', False):
+            raise QueryBudgetExceeded(message)
+
+
+def sticky_user_id(state, response):
+    """Пользователь, который только что успешно что-то изменил."""
+
+    if state.safe or response.status_code >= 400:
+        return None
+    return state.user_id()
+
+
+@sync_and_async_middleware
+def replica_routing_middleware(get_response):
+    """Состояние маршрутизации запросов между основной базой и репликами.
+
+    Безопасные запросы могут читать с реплик (см. PrimaryReplicaRouter).
+    После успешного изменяющего запроса пользователь на время
+    REPLICA_STICKY_SECONDS читает только с основной базы.
+    В режиме ASGI работает асинхронно и не переводит запрос
+    в синхронный поток. Без реплик ничего не делает.
+    """
+
+    if asyncio.iscoroutinefunction(get_response):
+
+        async def middleware(request):
+            if not settings.DATABASE_REPLICAS:
+                return await get_response(request)
+
+            state = RoutingState(request, request.method in SAFE_METHODS)
+            token = routing.set(state)
+            try:
+                response = await get_response(request)
+            finally:
+                routing.reset(token)
+
+            user_id = sticky_user_id(state, response)
+            if user_id is not None:
+                await sync_to_async(mark_sticky)(user_id)
+            return response
+
+    else:
+
+        def middleware(request):
+            if not settings.DATABASE_REPLICAS:
+                return get_response(request)
+
+            state = RoutingState(request, request.method in SAFE_METHODS)
+            token = routing.set(state)
+            try:
+                response = get_response(request)
+            finally:
+                routing.reset(token)
+
+            user_id = sticky_user_id(state, response)
+            if user_id is not None:
+                mark_sticky(user_id)
+            return response
+
+    return middleware
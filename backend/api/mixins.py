@@ -0,0 +1,73 @@
+import hashlib
+
+from django.utils.cache import patch_cache_control
+from django.utils.http import (http_date, parse_etags, parse_http_date_safe,
+                               quote_etag)
+from rest_framework import status
+from rest_framework.response import Response
+
+from recipes.catalog import get_catalog_version
+
+
+class CatalogConditionalMixin:
+    """Условные GET запросы для справочников (теги, ингредиенты).
+
+    ETag и Last-Modified вычисляются по версии справочника
+    (см. recipes.catalog), поэтому на If-None-Match и If-Modified-Since
+    отвечаем 304 без обращения к сериализатору и базе данных.
+    """
+
+    catalog_name = None
+    cache_max_age = 0
+
+    def get_etag(self, request, version, media_type):
+        """Сильный ETag: версия справочника, адрес запроса и формат."""
+
+        key = (f'{self.catalog_name}:{version}:{request.get_full_path()}:'
+               f'{media_type}')
+        return quote_etag(hashlib.md5(key.encode()).hexdigest())
+
+    def get_validators(self, request, version, media_type):
+        """ETag и Last-Modified для версии справочника version."""
+
+        return (self.get_etag(request, version, media_type),
+                version // 10 ** 9)
+
+    def is_not_modified(self, request, etag, last_modified):
+        if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+        if if_none_match:
+            etags = parse_etags(if_none_match)
+            return '*' in etags or etag in etags
+
+        if_modified_since = parse_http_date_safe(
+            request.META.get('HTTP_IF_MODIFIED_SINCE', ''))
+        return (if_modified_since is not None
+                and last_modified <= if_modified_since)
+
+    def set_validators(self, response, etag, last_modified):
+        if response.status_code in (status.HTTP_200_OK,
+                                    status.HTTP_304_NOT_MODIFIED):
+            response['ETag'] = etag
+            response['Last-Modified'] = http_date(last_modified)
+            patch_cache_control(response, public=True,
+                                max_age=self.cache_max_age,
+                                must_revalidate=True)
+
+    def conditional(self, request, handler, *args, **kwargs):
+        version = get_catalog_version(self.catalog_name)
+        etag, last_modified = self.get_validators(
+            request, version, request.accepted_media_type)
+
+        if self.is_not_modified(request, etag, last_modified):
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            response = handler(request, *args, **kwargs)
+
+        self.set_validators(response, etag, last_modified)
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional(request, super().list, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional(request, super().retrieve, *args, **kwargs)
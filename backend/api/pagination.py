@@ -1,5 +1,49 @@
-from rest_framework.pagination import PageNumberPagination
+from rest_framework.pagination import CursorPagination, PageNumberPagination
 
 
 class CustomLimitPaginanation(PageNumberPagination):
     page_size_query_param = 'limit'
+
+
+class LimitCursorPagination(CursorPagination):
+    """Keyset пагинация по убыванию id с параметром limit."""
+
+    ordering = '-id'
+    page_size_query_param = 'limit'
+
+    def get_page_size(self, request):
+        page_size = super().get_page_size(request)
+        return int(page_size) if page_size else page_size
+
+
+class RecipePagination(CustomLimitPaginanation):
+    """Пагинация ленты рецептов.
+
+    По умолчанию постраничная (?page=N&limit=M).
+    С параметром ?pagination=cursor переключается на keyset пагинацию:
+    без COUNT(*) и OFFSET, поэтому глубокие страницы стоят столько же,
+    сколько первая. Ссылки next/previous содержат параметр cursor.
+    """
+
+    cursor_query_param = 'cursor'
+    mode_query_param = 'pagination'
+
+    def __init__(self):
+        self.cursor_paginator = None
+
+    def use_cursor(self, request):
+        return (self.cursor_query_param in request.query_params
+                or request.query_params.get(self.mode_query_param)
+                == 'cursor')
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if self.use_cursor(request):
+            self.cursor_paginator = LimitCursorPagination()
+            return self.cursor_paginator.paginate_queryset(
+                queryset, request, view)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.cursor_paginator is not None:
+            return self.cursor_paginator.get_paginated_response(data)
+        return super().get_paginated_response(data)
@@ -0,0 +1,75 @@
+import csv
+import json
+
+from rest_framework.renderers import BaseRenderer
+
+
+class Echo:
+    """Псевдо-буфер для csv.writer: возвращает записанную строку."""
+
+    def write(self, value):
+        return value
+
+
+class ShoppingListRenderer(BaseRenderer):
+    """Базовый рендерер списка покупок.
+
+    Строки списка приходят из базы уже агрегированными
+    (ingredient__name, ingredient__measurement_unit, amount)
+    и отдаются по частям методом stream(), чтобы не собирать
+    весь файл в памяти.
+
+    Ответы с ошибками (словарь вместо списка строк)
+    отдаются как JSON.
+    """
+
+    charset = 'utf-8'
+
+    def stream(self, rows):
+        raise NotImplementedError
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if isinstance(data, dict):
+            return json.dumps(data, ensure_ascii=False).encode(self.charset)
+        return ''.join(self.stream(data or ())).encode(self.charset)
+
+
+class ShoppingListTextRenderer(ShoppingListRenderer):
+    media_type = 'text/plain'
+    format = 'txt'
+
+    def stream(self, rows):
+        for row in rows:
+            yield (f'{row["ingredient__name"]}: {row["amount"]} '
+                   f'{row["ingredient__measurement_unit"]}\n')
+
+
+class ShoppingListCSVRenderer(ShoppingListRenderer):
+    media_type = 'text/csv'
+    format = 'csv'
+
+    def stream(self, rows):
+        writer = csv.writer(Echo())
+        yield writer.writerow(('name', 'amount', 'measurement_unit'))
+        for row in rows:
+            yield writer.writerow((row['ingredient__name'],
+                                   row['amount'],
+                                   row['ingredient__measurement_unit']))
+
+
+class ShoppingListJSONRenderer(ShoppingListRenderer):
+    media_type = 'application/json'
+    format = 'json'
+
+    def stream(self, rows):
+        yield '['
+        separator = ''
+        for row in rows:
+            item = {
+                'name': row['ingredient__name'],
+                'amount': row['amount'],
+                'measurement_unit': row['ingredient__measurement_unit'],
+            }
+            yield separator + json.dumps(item, ensure_ascii=False)
+            separator = ','
+        yield ']'
@@ -1,11 +1,18 @@
 import base64
+import os
 
-from django.core.files.base import ContentFile
+from django.conf import settings
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.core.files.base import ContentFile, File
+from django.db import transaction
 from django.forms import ValidationError
 from rest_framework import serializers, status
 
-from recipes.models import (Favourite, Follow, Ingredient, IngredientsAmount,
-                            Recipe, ShoppingCart, Tag, User)
+from recipes.images import CARD_WIDTH, DETAIL_WIDTH
+from recipes.models import (Favourite, Follow, ImageUpload, Ingredient,
+                            IngredientsAmount, Recipe, ShoppingCart,
+                            ShoppingListItem, Tag, User)
+from recipes.tasks import process_recipe_image
 
 MIN_INGREDIENT_AMOUNT = 1
 MAX_INGREDIENT_AMOUNT = 1500
@@ -14,11 +21,51 @@ MIN_COOKING_TIME = 1
 MAX_COOKING_TIME = 240
 
 
+class UploadedImageFile(File):
+    """Файл завершенной загрузки.
+
+    Хранилище видит temporary_file_path() и переносит файл на место
+    без копирования, как временный файл обычной загрузки. Файл
+    открывается при первом чтении (хранилище считает хеш содержимого),
+    поэтому, если рецепт не прошел проверку, открытых файлов
+    не остается.
+    """
+
+    def __init__(self, upload):
+        super().__init__(None, name=f'{upload.token}.{upload.format.lower()}')
+        self.upload = upload
+        self.size = os.path.getsize(upload.path)
+
+    @property
+    def file(self):
+        if self._file is None:
+            self._file = open(self.upload.path, 'rb')
+        return self._file
+
+    @file.setter
+    def file(self, value):
+        self._file = value
+
+    @property
+    def closed(self):
+        return self._file is None or self._file.closed
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+
+    def temporary_file_path(self):
+        return self.upload.path
+
+
 class Base64ImageField(serializers.ImageField):
     """Преобразовывает бинарные данные в текстовый формат,
     затем передает получившуюся текстовую строку через JSON,
     а при получении превращает строку обратно в бинарные данные,
     то есть в файл.
+
+    Вместо base64 строки можно передать токен завершенной загрузки
+    (POST /api/uploads/), тогда файл берется с диска.
     """
 
     def to_internal_value(self, data):
@@ -26,8 +73,56 @@ class Base64ImageField(serializers.ImageField):
             format, imgstr = data.split(';base64,')
             ext = format.split('/')[-1]
             data = ContentFile(base64.b64decode(imgstr), name='temp.' + ext)
+        elif isinstance(data, str):
+            # Завершенная загрузка уже проверена Pillow
+            # (api.uploads.complete_upload), повторно файл не читаем.
+            return serializers.FileField.to_internal_value(
+                self, self.get_uploaded_file(data))
         return super().to_internal_value(data)
 
+    def get_uploaded_file(self, token):
+        """Открываем файл завершенной загрузки текущего пользователя."""
+
+        request = self.context.get('request')
+        try:
+            upload = ImageUpload.objects.get(
+                token=token, user=request.user, completed=True)
+            return UploadedImageFile(upload)
+        except (ImageUpload.DoesNotExist, DjangoValidationError, TypeError,
+                FileNotFoundError):
+            raise serializers.ValidationError('Загрузка не найдена.')
+
+
+class RecipeImageField(Base64ImageField):
+    """Изображение рецепта с выдачей уменьшенной копии.
+
+    Отдает ссылку на производную нужной ширины и формата
+    из Recipe.image_renditions. Если ширина не задана, она берется
+    из context['image_width'] (карточка или страница рецепта).
+    Пока производные не построены, отдается оригинал.
+    """
+
+    def __init__(self, width=None, ext='jpeg', **kwargs):
+        self.width = width
+        self.ext = ext
+        super().__init__(**kwargs)
+
+    def to_representation(self, value):
+        if not value:
+            return None
+
+        width = self.width or self.context.get('image_width', DETAIL_WIDTH)
+        renditions = getattr(value.instance, 'image_renditions', None) or {}
+        name = renditions.get(str(width), {}).get(self.ext)
+        if name is None:
+            return super().to_representation(value)
+
+        url = value.storage.url(name)
+        request = self.context.get('request')
+        if request is not None:
+            return request.build_absolute_uri(url)
+        return url
+
 
 class UserCreateSerializer(serializers.ModelSerializer):
     """Регистрация пользователя.
@@ -58,12 +153,18 @@ class UserListSerializer(serializers.ModelSerializer):
                   )
 
     def get_is_subscribed(self, obj):
-        """Определяем подписан ли пользоваиель."""
+        """Определяем подписан ли пользоваиель.
+
+        Если флаг уже вычислен в queryset (аннотация is_subscribed),
+        используем его без дополнительного запроса.
+        """
 
         user = self.context.get('request').user
         if user.is_anonymous or (user == obj):
             return False
-        return user.following.filter(user=obj).exists()
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
+        return user.follower.filter(following=obj).exists()
 
 
 class FollowingSerializer(serializers.ModelSerializer):
@@ -78,7 +179,7 @@ class FollowingSerializer(serializers.ModelSerializer):
     POST /api/users/1/subscribe/
     """
 
-    recipes_count = serializers.SerializerMethodField()
+    recipes_count = serializers.ReadOnlyField()
     is_subscribed = serializers.SerializerMethodField()
     recipes = serializers.SerializerMethodField()
 
@@ -95,16 +196,15 @@ class FollowingSerializer(serializers.ModelSerializer):
                             )
 
     def validate(self, data):
-        """Проверяем подписки."""
+        """Проверяем подписки.
+
+        Повторная подписка отсекается уникальным ограничением
+        (user, following) при вставке.
+        """
 
         following = self.instance
         user = self.context.get('request').user
 
-        if user.follower.filter(following=following).exists():
-            raise ValidationError(
-                'Вы уже подписаны.',
-                code=status.HTTP_400_BAD_REQUEST)
-
         if user == following:
             raise ValidationError(
                 'Нельзя подписаться на самого себя!',
@@ -115,6 +215,8 @@ class FollowingSerializer(serializers.ModelSerializer):
     def get_is_subscribed(self, obj):
         """Подписан ли пользователь."""
 
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
         request = self.context.get('request')
         if request and request.user.is_authenticated:
             return Follow.objects.filter(
@@ -123,21 +225,26 @@ class FollowingSerializer(serializers.ModelSerializer):
         return False
 
     def get_recipes(self, obj):
-        """Получаем рецепты и устанавливаем лимит в отображении странице."""
+        """Получаем рецепты и устанавливаем лимит в отображении странице.
+
+        Если рецепты уже загружены для всей страницы (context['recipes']),
+        берем их оттуда без дополнительного запроса.
+        """
+
+        if 'recipes' in self.context:
+            recipes = self.context['recipes'].get(obj.id, ())
+            serializer = BriefRecipeSerializer(
+                recipes, many=True, read_only=True)
+            return serializer.data
 
         request = self.context.get('request')
         limit = request.GET.get('recipes_limit')
-        recipes = obj.recipes.all()
+        recipes = obj.recipes.order_by('-id')
         if limit:
             recipes = recipes[: int(limit)]
         serializer = BriefRecipeSerializer(recipes, many=True, read_only=True)
         return serializer.data
 
-    def get_recipes_count(self, obj):
-        """Определяем кол-во рецептов."""
-
-        return obj.recipes.count()
-
 
 class TagSerializer(serializers.ModelSerializer):
     """Tag Serializer.
@@ -156,15 +263,21 @@ class TagSerializer(serializers.ModelSerializer):
 class BriefRecipeSerializer(serializers.ModelSerializer):
     """Необходимые поля для отображения в подписках и в списке избранного."""
 
-    image = Base64ImageField(
+    image = RecipeImageField(
+        width=CARD_WIDTH,
         required=False,
         allow_null=True)
+    image_webp = RecipeImageField(
+        width=CARD_WIDTH,
+        ext='webp',
+        source='image',
+        read_only=True)
     name = serializers.ReadOnlyField()
     cooking_time = serializers.ReadOnlyField()
 
     class Meta:
         model = Recipe
-        fields = ('id', 'name', 'image',
+        fields = ('id', 'name', 'image', 'image_webp',
                   'cooking_time'
                   )
 
@@ -220,20 +333,33 @@ class GetRecipeSerializer(serializers.ModelSerializer):
         source='recipes_amount')
     is_favorited = serializers.SerializerMethodField()
     is_in_shopping_cart = serializers.SerializerMethodField()
-    image = Base64ImageField(
+    image = RecipeImageField(
         required=False,
         allow_null=True)
+    image_webp = RecipeImageField(
+        ext='webp',
+        source='image',
+        read_only=True)
 
     class Meta:
         model = Recipe
         fields = ('id', 'tags', 'author', 'ingredients', 'is_favorited',
-                  'is_in_shopping_cart', 'name', 'image', 'text',
-                  'cooking_time'
+                  'is_in_shopping_cart', 'name', 'image', 'image_webp',
+                  'image_status', 'text', 'cooking_time'
                   )
 
+    def to_representation(self, instance):
+        """Передаем автору флаг подписки, вычисленный в queryset."""
+
+        if hasattr(instance, 'is_author_subscribed'):
+            instance.author.is_subscribed = instance.is_author_subscribed
+        return super().to_representation(instance)
+
     def get_is_favorited(self, obj):
         """Находится ли в избранном."""
 
+        if hasattr(obj, 'is_favorited'):
+            return obj.is_favorited
         return (self.context.get('request').user.is_authenticated
                 and Favourite.objects
                 .filter(user=self.context['request'].user,
@@ -242,6 +368,8 @@ class GetRecipeSerializer(serializers.ModelSerializer):
     def get_is_in_shopping_cart(self, obj):
         """Находится ли в списке покупок."""
 
+        if hasattr(obj, 'is_in_shopping_cart'):
+            return obj.is_in_shopping_cart
         return (self.context.get('request').user.is_authenticated
                 and ShoppingCart.objects
                 .filter(user=self.context['request'].user,
@@ -262,6 +390,30 @@ class AddIngredientsSerializer(serializers.ModelSerializer):
         fields = ('id', 'amount')
 
 
+class PantryRecipeSerializer(GetRecipeSerializer):
+    """Рецепт в результатах поиска по продуктам пользователя."""
+
+    matched_count = serializers.ReadOnlyField()
+    missing_count = serializers.ReadOnlyField()
+
+    class Meta(GetRecipeSerializer.Meta):
+        fields = GetRecipeSerializer.Meta.fields + (
+            'matched_count', 'missing_count')
+
+
+class PantryQuerySerializer(serializers.Serializer):
+    """Параметры поиска по продуктам: ?ingredients=1&ingredients=2."""
+
+    ingredients = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        min_length=1,
+        max_length=500)
+    min_coverage = serializers.FloatField(
+        min_value=0,
+        max_value=1,
+        default=0)
+
+
 class PostRecipeSerializer(serializers.ModelSerializer):
     """Recipe Serializer для POST запросов.
 
@@ -346,6 +498,31 @@ class PostRecipeSerializer(serializers.ModelSerializer):
             )for ingredient in ingredients]
         )
 
+    def release_upload(self, image):
+        """Удаляем загрузку, из которой взято изображение,
+        после фиксации транзакции.
+        """
+
+        upload = getattr(image, 'upload', None)
+        if upload is not None:
+            image.close()
+            transaction.on_commit(upload.discard)
+
+    def update_renditions(self, recipe):
+        """Ставим изображение рецепта в очередь на построение
+        уменьшенных копий и WebP.
+
+        Обработка запускается после фиксации транзакции
+        в пуле процессов (recipes.tasks) и не задерживает ответ.
+        """
+
+        recipe.image_renditions = {}
+        recipe.image_status = (
+            Recipe.IMAGE_PENDING if recipe.image else Recipe.IMAGE_READY)
+        recipe.save(update_fields=('image_renditions', 'image_status'))
+        if recipe.image:
+            transaction.on_commit(lambda: process_recipe_image(recipe))
+
     def create(self, validated_data):
         """Создаем рецепт на основе валидированных данных.
 
@@ -363,15 +540,36 @@ class PostRecipeSerializer(serializers.ModelSerializer):
 
         recipe = Recipe.objects.create(**validated_data)
         recipe.tags.set(tags)
+        self.release_upload(validated_data['image'])
 
         self.add_items(ingredients, recipe)
+        self.update_renditions(recipe)
         return recipe
 
+    def update_shopping_lists(self, instance, ingredients):
+        """Переносим изменение ингредиентов рецепта в списки покупок
+        пользователей, у которых рецепт лежит в корзине.
+        """
+
+        deltas = {}
+        for ingredient_id, amount in instance.recipes_amount.values_list(
+                'ingredient_id', 'amount'):
+            deltas[ingredient_id] = deltas.get(ingredient_id, 0) - amount
+        for ingredient in ingredients:
+            ingredient_id = ingredient.get('id')
+            deltas[ingredient_id] = (deltas.get(ingredient_id, 0)
+                                     + ingredient.get('amount'))
+
+        ShoppingListItem.objects.apply(
+            instance.shop_recipe.values_list('user_id', flat=True), deltas)
+
+    @transaction.atomic
     def update(self, instance, validated_data):
         """Обновление рецепта на основе валидированных данных."""
 
         if 'ingredients' in validated_data:
             ingredients = validated_data.pop('ingredients')
+            self.update_shopping_lists(instance, ingredients)
             instance.ingredients.clear()
             self.add_items(ingredients, instance)
         else:
@@ -384,7 +582,11 @@ class PostRecipeSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError(
                 'Поле "tags" обязательно.')
 
-        return super().update(instance, validated_data)
+        instance = super().update(instance, validated_data)
+        if 'image' in validated_data:
+            self.release_upload(validated_data['image'])
+            self.update_renditions(instance)
+        return instance
 
     def to_representation(self, instance):
         """После создания рецепта, показываем
@@ -410,3 +612,24 @@ class FavouriteSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError(
                 'Рецепт уже в избранном.')
         return data
+
+
+class ImageUploadSerializer(serializers.ModelSerializer):
+    """Состояние загрузки изображения.
+
+    POST /api/uploads/ начать загрузку по частям ({"size": ...})
+    или загрузить файл целиком (multipart, поле file)
+    """
+
+    class Meta:
+        model = ImageUpload
+        fields = ('token', 'size', 'offset', 'format', 'width', 'height',
+                  'completed')
+        read_only_fields = ('token', 'offset', 'format', 'width', 'height',
+                            'completed')
+        extra_kwargs = {'size': {'required': True, 'min_value': 1}}
+
+    def validate_size(self, value):
+        if value > settings.IMAGE_UPLOAD_MAX_SIZE:
+            raise serializers.ValidationError('Файл слишком большой.')
+        return value
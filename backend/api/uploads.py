@@ -0,0 +1,153 @@
+import os
+
+from django.conf import settings
+from django.core.files.uploadhandler import FileUploadHandler
+from django.core.files.uploadedfile import UploadedFile
+from PIL import Image, ImageFile
+from rest_framework.exceptions import ValidationError
+
+ALLOWED_FORMATS = ('JPEG', 'PNG', 'GIF', 'WEBP')
+
+HEADER_LIMIT = 1024 ** 2
+
+CHUNK_SIZE = 64 * 1024
+
+
+class ImageStreamWriter:
+    """Пишет поступающие байты в файл загрузки и проверяет ограничения.
+
+    Размер файла проверяется на каждом куске, размеры изображения —
+    как только из потока удается разобрать заголовок, поэтому
+    слишком большие файлы и «бомбы декомпрессии» отклоняются
+    до того, как будут приняты целиком. В памяти держится
+    не больше одного куска и заголовка изображения.
+    """
+
+    def __init__(self, upload):
+        self.upload = upload
+        self.parser = None
+        os.makedirs(settings.UPLOAD_ROOT, exist_ok=True)
+        mode = 'r+b' if upload.offset else 'wb'
+        self.file = open(upload.path, mode)
+
+        if not upload.format:
+            self.parser = ImageFile.Parser()
+            if upload.offset:
+                self.feed(self.file.read(min(upload.offset, HEADER_LIMIT)))
+        self.file.seek(upload.offset)
+
+    def feed(self, data):
+        """Передаем данные парсеру, пока не разобран заголовок."""
+
+        if self.parser is None:
+            return
+        try:
+            self.parser.feed(data)
+        except Image.DecompressionBombError:
+            self.fail('Изображение слишком большое.')
+        except OSError:
+            self.fail('Файл не является изображением.')
+
+        image = self.parser.image
+        if image is None:
+            if self.upload.offset + len(data) > HEADER_LIMIT:
+                self.fail('Файл не является изображением.')
+            return
+
+        self.parser = None
+        try:
+            check_image(image)
+        except ValidationError:
+            self.close()
+            self.upload.discard()
+            raise
+        self.upload.format = image.format
+        self.upload.width, self.upload.height = image.size
+
+    def write(self, data):
+        max_size = self.upload.size or settings.IMAGE_UPLOAD_MAX_SIZE
+        if self.upload.offset + len(data) > max_size:
+            self.fail('Файл больше заявленного размера.')
+        self.feed(data)
+        self.file.write(data)
+        self.upload.offset += len(data)
+
+    def close(self):
+        self.file.close()
+
+    def fail(self, message):
+        self.close()
+        self.upload.discard()
+        raise ValidationError({'file': [message]})
+
+
+def check_image(image):
+    """Проверяем формат и размеры по заголовку изображения."""
+
+    if image.format not in ALLOWED_FORMATS:
+        raise ValidationError(
+            {'file': [f'Формат {image.format} не поддерживается.']})
+    width, height = image.size
+    if width * height > settings.IMAGE_MAX_PIXELS:
+        raise ValidationError({'file': ['Изображение слишком большое.']})
+
+
+def complete_upload(upload):
+    """Завершаем загрузку: полностью проверяем файл и отмечаем готовым."""
+
+    try:
+        with Image.open(upload.path) as image:
+            image.verify()
+    except (OSError, Image.DecompressionBombError):
+        upload.discard()
+        raise ValidationError({'file': ['Файл изображения поврежден.']})
+
+    upload.size = upload.offset
+    upload.completed = True
+    upload.save()
+
+
+class ImageUploadHandler(FileUploadHandler):
+    """Обработчик multipart загрузки: пишет поле file сразу в файл
+    загрузки через ImageStreamWriter, минуя память и временные файлы.
+    """
+
+    chunk_size = CHUNK_SIZE
+
+    def __init__(self, upload, request=None):
+        super().__init__(request)
+        self.upload = upload
+        self.writer = None
+
+    def new_file(self, field_name, *args, **kwargs):
+        super().new_file(field_name, *args, **kwargs)
+        if field_name == 'file' and self.writer is None:
+            self.writer = ImageStreamWriter(self.upload)
+
+    def receive_data_chunk(self, raw_data, start):
+        if self.writer is not None and self.field_name == 'file':
+            self.writer.write(raw_data)
+            return None
+        return raw_data
+
+    def file_complete(self, file_size):
+        if self.writer is None or self.field_name != 'file':
+            return None
+        self.writer.close()
+        return UploadedFile(name=self.file_name, size=file_size)
+
+
+def read_stream(request, writer):
+    """Читаем тело запроса кусками и передаем их в writer."""
+
+    stream = request.stream
+    if stream is None:
+        raise ValidationError({'file': ['Пустое тело запроса.']})
+    try:
+        while True:
+            chunk = stream.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            writer.write(chunk)
+    finally:
+        writer.close()
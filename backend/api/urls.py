@@ -1,8 +1,10 @@
+from django.conf import settings
 from django.urls import include, path
 from rest_framework.routers import DefaultRouter
 
-from .views import (CustomUserViewSet, IngredientViewSet, RecipeViewSet,
-                    TagViewSet)
+from .async_views import async_urlpatterns
+from .views import (CustomUserViewSet, ImageUploadViewSet, IngredientViewSet,
+                    RecipeViewSet, TagViewSet)
 
 router = DefaultRouter()
 
@@ -10,10 +12,15 @@ router.register('users', CustomUserViewSet, basename='users')
 router.register('recipes', RecipeViewSet, basename='recipes')
 router.register('tags', TagViewSet, basename='tags')
 router.register('ingredients', IngredientViewSet, basename='ingredients')
+router.register('uploads', ImageUploadViewSet, basename='uploads')
 
 
+router_urls = router.urls
+if settings.ASYNC_VIEWS:
+    router_urls = async_urlpatterns(router_urls)
+
 urlpatterns = [
-    path('', include(router.urls)),
+    path('', include(router_urls)),
     path('', include('djoser.urls')),
     path('auth/', include('djoser.urls.authtoken')),
 ]
@@ -1,25 +1,37 @@
-import io
-
-from django.http import HttpResponse
+from django.db import IntegrityError, transaction
+from django.db.models import Exists, F, OuterRef, Prefetch, Value, Window
+from django.db.models.functions import RowNumber
+from django.http import StreamingHttpResponse
 from django.shortcuts import get_object_or_404
 from django_filters.rest_framework import DjangoFilterBackend
+from django_filters.utils import translate_validation
 from djoser.views import UserViewSet
-from rest_framework import status, viewsets
+from rest_framework import mixins, status, viewsets
 from rest_framework.decorators import action
 from rest_framework.permissions import SAFE_METHODS, IsAuthenticated
 from rest_framework.response import Response
 
-from rest_framework.exceptions import PermissionDenied
+from rest_framework.exceptions import PermissionDenied, ValidationError
+from rest_framework.parsers import JSONParser, MultiPartParser
 
 from .filters import RecipeFilter, SearchIngredientFilter
-from .pagination import CustomLimitPaginanation
+from .indexes import ingredient_index, pantry_index, recipe_filter_index
+from .mixins import CatalogConditionalMixin
+from .pagination import CustomLimitPaginanation, RecipePagination
 from .permissions import IsUserOrAdmin
+from .renderers import (ShoppingListCSVRenderer, ShoppingListJSONRenderer,
+                        ShoppingListTextRenderer)
 from .serializers import (BriefRecipeSerializer, FollowingSerializer,
-                          GetRecipeSerializer, IngredientSerializer,
-                          PostRecipeSerializer, TagSerializer,
-                          UserListSerializer)
-from recipes.models import (Favourite, Follow, Ingredient, IngredientsAmount,
-                            Recipe, ShoppingCart, Tag, User)
+                          GetRecipeSerializer, ImageUploadSerializer,
+                          IngredientSerializer, PantryQuerySerializer,
+                          PantryRecipeSerializer, PostRecipeSerializer,
+                          TagSerializer, UserListSerializer)
+from .uploads import (ImageStreamWriter, ImageUploadHandler, complete_upload,
+                      read_stream)
+from recipes.images import CARD_WIDTH, DETAIL_WIDTH
+from recipes.models import (Favourite, Follow, ImageUpload, Ingredient,
+                            IngredientsAmount, Recipe, ShoppingCart,
+                            ShoppingListItem, Tag, TimelineEntry, User)
 
 
 class CustomUserViewSet(UserViewSet):
@@ -33,6 +45,9 @@ class CustomUserViewSet(UserViewSet):
     queryset = User.objects.all()
     pagination_class = CustomLimitPaginanation
     serializer_class = UserListSerializer
+    query_budgets = {
+        'subscriptions': 4,
+    }
 
     @action(detail=False,
             permission_classes=(IsAuthenticated,))
@@ -61,18 +76,28 @@ class CustomUserViewSet(UserViewSet):
             serializer = FollowingSerializer(
                 author, data=request.data, context={'request': request})
             serializer.is_valid(raise_exception=True)
-            Follow.objects.create(user=user, following=author)
-            return Response(serializer.data, status=status.HTTP_201_CREATED)
-
-        if request.method == 'DELETE':
             try:
-                subscription = Follow.objects.get(user=user,
-                                                  following=author)
-            except Follow.DoesNotExist:
-                return Response({'errors': 'Подписка не существует.'},
+                with transaction.atomic():
+                    Follow.objects.create(user=user, following=author)
+                    User.objects.filter(pk=author.pk).update(
+                        followers_count=F('followers_count') + 1)
+                    TimelineEntry.objects.backfill(user, author)
+            except IntegrityError:
+                return Response({'errors': 'Вы уже подписаны.'},
                                 status=status.HTTP_400_BAD_REQUEST)
+            return Response(serializer.data, status=status.HTTP_201_CREATED)
 
-            subscription.delete()
+        if request.method == 'DELETE':
+            with transaction.atomic():
+                deleted, _ = Follow.objects.filter(
+                    user=user, following=author).delete()
+                if not deleted:
+                    return Response({'errors': 'Подписка не существует.'},
+                                    status=status.HTTP_400_BAD_REQUEST)
+                User.objects.filter(
+                    pk=author.pk, followers_count__gt=0).update(
+                        followers_count=F('followers_count') - 1)
+                TimelineEntry.objects.prune(user, author)
             return Response(status=status.HTTP_204_NO_CONTENT)
 
         return Response(status=status.HTTP_400_BAD_REQUEST)
@@ -87,24 +112,66 @@ class CustomUserViewSet(UserViewSet):
         Страница 'Мои подписки'
         """
 
-        user_following_ids_set = set(
-            Follow
-            .objects
-            .filter(user=request.user)
-            .values_list('following', flat=True)
-        )
-
-        queryset = self.paginate_queryset(
-            User.objects.filter(pk__in=user_following_ids_set)
+        queryset = (
+            User.objects
+            .filter(following__user=request.user)
+            .annotate(is_subscribed=Value(True))
+            .order_by('id')
         )
+        page = self.paginate_queryset(queryset)
+        authors = list(queryset) if page is None else page
 
         serializer = FollowingSerializer(
-            queryset,
+            authors,
             many=True,
-            context={'request': request})
-
+            context={
+                'request': request,
+                'recipes': self.get_authors_recipes(
+                    authors, request.query_params.get('recipes_limit')),
+            })
+
+        if page is None:
+            return Response(serializer.data)
         return self.get_paginated_response(serializer.data)
 
+    def get_authors_recipes(self, authors, limit):
+        """Достаем последние рецепты сразу для всех авторов страницы.
+
+        Ограничение recipes_limit применяется через оконную функцию
+        ROW_NUMBER() с разбиением по автору, поэтому на всю страницу
+        выполняется один запрос.
+
+        Возвращает словарь {id автора: список рецептов}.
+        """
+
+        if not authors:
+            # Запрос с пустым author__in не строится в SQL
+            # (EmptyResultSet), а рецептов все равно нет.
+            return {}
+
+        recipes = Recipe.objects.filter(author__in=authors)
+        try:
+            limit = int(limit)
+        except (TypeError, ValueError):
+            recipes = recipes.order_by('author_id', '-id')
+        else:
+            ranked = recipes.annotate(row_number=Window(
+                expression=RowNumber(),
+                partition_by=F('author_id'),
+                order_by=F('id').desc(),
+            )).values('id', 'name', 'image', 'image_renditions',
+                      'cooking_time', 'author_id', 'row_number')
+            sql, params = ranked.query.sql_with_params()
+            recipes = Recipe.objects.raw(
+                f'SELECT * FROM ({sql}) ranked WHERE row_number <= %s '
+                f'ORDER BY author_id, id DESC',
+                (*params, limit))
+
+        authors_recipes = {author.id: [] for author in authors}
+        for recipe in recipes:
+            authors_recipes[recipe.author_id].append(recipe)
+        return authors_recipes
+
 
 class RecipeViewSet(viewsets.ModelViewSet):
     """Получаем список рецептов (api/recipes/)
@@ -114,24 +181,126 @@ class RecipeViewSet(viewsets.ModelViewSet):
         /download_shopping_cart
         /shopping_cart
         /favorite
+        /feed
+        /similar
+        /pantry
     """
 
-    pagination_class = CustomLimitPaginanation
+    pagination_class = RecipePagination
     permission_classes = (IsUserOrAdmin,)
     filter_backends = (DjangoFilterBackend, )
     filterset_class = RecipeFilter
+    # С токеном. list с is_favorited и is_in_shopping_cart читает
+    # избранное и корзину пользователя. Сборка индексов в памяти
+    # в бюджет не входит (см. api.middleware.exempt_from_budget).
+    query_budgets = {
+        'list': 6,
+        'retrieve': 4,
+        'download_shopping_cart': 3,
+        'feed': 5,
+        'similar': 3,
+        'pantry': 5,
+    }
 
     def get_queryset(self):
-        queryset = Recipe.objects.all().order_by('-id')
-        return queryset
+        """Собираем рецепты одним запросом.
 
+        Флаги избранного, списка покупок и подписки на автора
+        вычисляются в базе через Exists(), автор подтягивается
+        через select_related, а теги и ингредиенты — через Prefetch.
+        Количество запросов на страницу не зависит от ее размера.
+        """
+
+        user = self.request.user
+        queryset = Recipe.objects.select_related('author').prefetch_related(
+            'tags',
+            Prefetch(
+                'recipes_amount',
+                queryset=IngredientsAmount.objects.select_related(
+                    'ingredient')),
+        )
+
+        if user.is_authenticated:
+            queryset = queryset.annotate(
+                is_favorited=Exists(Favourite.objects.filter(
+                    user=user, recipe=OuterRef('pk'))),
+                is_in_shopping_cart=Exists(ShoppingCart.objects.filter(
+                    user=user, recipe=OuterRef('pk'))),
+                is_author_subscribed=Exists(Follow.objects.filter(
+                    user=user, following=OuterRef('author'))),
+            )
+        else:
+            queryset = queryset.annotate(
+                is_favorited=Value(False),
+                is_in_shopping_cart=Value(False),
+                is_author_subscribed=Value(False),
+            )
+
+        return queryset.order_by('-id')
+
+    @transaction.atomic
     def perform_create(self, serializer):
         """Определяем текущего пользователя."""
 
         if not self.request.user.is_authenticated:
             raise PermissionDenied(
                 'Только авторизованный пользователь может создать рецепт.')
-        serializer.save(author=self.request.user)
+        recipe = serializer.save(author=self.request.user)
+        User.objects.filter(pk=self.request.user.pk).update(
+            recipes_count=F('recipes_count') + 1)
+        transaction.on_commit(
+            lambda: TimelineEntry.objects.fan_out(recipe))
+
+    @transaction.atomic
+    def perform_destroy(self, instance):
+        """Перед удалением рецепта убираем его ингредиенты
+        из списков покупок.
+        """
+
+        ShoppingListItem.objects.remove_recipe(
+            instance.shop_recipe.values_list('user_id', flat=True),
+            instance)
+        User.objects.filter(
+            pk=instance.author_id, recipes_count__gt=0).update(
+                recipes_count=F('recipes_count') - 1)
+        instance.delete()
+
+    def list(self, request, *args, **kwargs):
+        """Список рецептов с фильтрами по битовым картам.
+
+        Параметры проверяются RecipeFilter, а набор id рецептов
+        вычисляется по recipe_filter_index, после чего из базы
+        читается только текущая страница. Keyset пагинация и поиск
+        по тексту выполняются фильтрами django-filter в базе.
+        """
+
+        if self.paginator.use_cursor(request):
+            return super().list(request, *args, **kwargs)
+
+        filterset = RecipeFilter(request.query_params,
+                                 queryset=Recipe.objects.none(),
+                                 request=request)
+        if not filterset.is_valid():
+            raise translate_validation(filterset.errors)
+        recipe_ids = recipe_filter_index.filter(
+            filterset.form.cleaned_data, request.user)
+        if recipe_ids is None:
+            return super().list(request, *args, **kwargs)
+
+        page = self.paginate_queryset(recipe_ids)
+        if page is None:
+            serializer = self.get_serializer(
+                self.get_recipes_in_order(list(recipe_ids)), many=True)
+            return Response(serializer.data)
+        serializer = self.get_serializer(
+            self.get_recipes_in_order(page), many=True)
+        return self.get_paginated_response(serializer.data)
+
+    def get_recipes_in_order(self, recipe_ids):
+        """Рецепты с заданными id в порядке списка, одним запросом."""
+
+        recipes = self.get_queryset().in_bulk(recipe_ids)
+        return [recipes[pk] for pk in recipe_ids if pk in recipes]
 
     def create(self, request, *args, **kwargs):
         """Даем право на создание рецепта только
@@ -145,13 +314,39 @@ class RecipeViewSet(viewsets.ModelViewSet):
 
         return super().create(request, *args, **kwargs)
 
+    def get_serializer_context(self):
+        """В списке рецептов отдаем изображения для карточек,
+        на странице рецепта — крупные.
+        """
+
+        context = super().get_serializer_context()
+        context['image_width'] = (
+            CARD_WIDTH if self.action in ('list', 'feed', 'pantry')
+            else DETAIL_WIDTH)
+        return context
+
     def get_serializer_class(self):
         """Выбираем сериализатор в зависимости от типа запроса."""
 
-        if self.action in SAFE_METHODS:
+        if self.request.method in SAFE_METHODS:
             return GetRecipeSerializer
         return PostRecipeSerializer
 
+    def update_counters(self, model, user, recipe, sign):
+        """Обновляем счетчик избранного или список покупок
+        после добавления (sign=1) или удаления (sign=-1) рецепта.
+        """
+
+        if model is Favourite:
+            recipes = Recipe.objects.filter(pk=recipe.pk)
+            if sign < 0:
+                # Счетчик беззнаковый: не уходим ниже нуля,
+                # даже если он разошелся с таблицей избранного.
+                recipes = recipes.filter(favorites_count__gt=0)
+            recipes.update(favorites_count=F('favorites_count') + sign)
+        if model is ShoppingCart:
+            ShoppingListItem.objects.add_recipe((user.id,), recipe, sign)
+
     def add_or_remove(self, request, model, recipe, message):
         """Общая функция создания/удаления для
         списка избранного и списка покупок.
@@ -159,8 +354,8 @@ class RecipeViewSet(viewsets.ModelViewSet):
         Настроена проверка на существование рецепта перед
         созданием и удалением.
 
-        Проверка на наличие рецепта в корзине или в избранном,
-        для избежания повторного добавления.
+        Повторное добавление отсекается уникальным ограничением
+        (user, recipe) в базе: добавление выполняется одним INSERT.
         """
 
         if request.method == 'POST':
@@ -174,24 +369,30 @@ class RecipeViewSet(viewsets.ModelViewSet):
                 return Response({'errors': 'Рецепт не существует.'},
                                 status=status.HTTP_400_BAD_REQUEST)
 
-            if not model.objects.filter(user=request.user,
-                                        recipe=recipe).exists():
-
-                model.objects.create(user=request.user, recipe=recipe)
-                return Response(serializer.data,
-                                status=status.HTTP_201_CREATED)
-
-            return Response({'errors': 'Уже в списке.'},
-                            status=status.HTTP_400_BAD_REQUEST)
+            with transaction.atomic():
+                # IntegrityError ловим только от INSERT: ошибки
+                # обновления счетчиков не должны выглядеть как повтор.
+                try:
+                    with transaction.atomic():
+                        model.objects.create(
+                            user=request.user, recipe=recipe)
+                except IntegrityError:
+                    return Response({'errors': 'Уже в списке.'},
+                                    status=status.HTTP_400_BAD_REQUEST)
+                self.update_counters(model, request.user, recipe, 1)
+
+            return Response(serializer.data,
+                            status=status.HTTP_201_CREATED)
 
         if request.method == 'DELETE':
-            if not model.objects.filter(user=request.user,
-                                        recipe=recipe).exists():
-                return Response({'errors': 'Рецепт не существует.'},
-                                status=status.HTTP_400_BAD_REQUEST)
+            with transaction.atomic():
+                deleted, _ = model.objects.filter(
+                    user=request.user, recipe=recipe).delete()
+                if not deleted:
+                    return Response({'errors': 'Рецепт не существует.'},
+                                    status=status.HTTP_400_BAD_REQUEST)
+                self.update_counters(model, request.user, recipe, -1)
 
-            get_object_or_404(model, user=request.user,
-                              recipe=recipe).delete()
             return Response({'detail': message},
                             status=status.HTTP_204_NO_CONTENT)
 
@@ -233,64 +434,243 @@ class RecipeViewSet(viewsets.ModelViewSet):
 
     @action(detail=False,
             methods=('GET',),
-            permission_classes=(IsAuthenticated,))
+            permission_classes=(IsAuthenticated,),
+            renderer_classes=(ShoppingListTextRenderer,
+                              ShoppingListCSVRenderer,
+                              ShoppingListJSONRenderer))
     def download_shopping_cart(self, request, pk=None):
         """Из рецептов находящихся в списке покупок достаем ингридиенты,
-        сумируем их количество если ингридиенты совпадают, записываем
-        полученные данные в фаил .txt и отдаем пользователю.
+        сумируем их количество если ингридиенты совпадают и отдаем
+        пользователю файл.
+
+        Суммы хранятся в ShoppingListItem и обновляются при
+        изменении корзины, поэтому здесь они только читаются.
+        Файл отдается потоком. Формат выбирается параметром
+        ?format=txt|csv|json (по умолчанию txt).
+
+        Строки читаются из базы здесь, а не при отдаче файла: в режиме
+        ASGI Django перебирает потоковый ответ в цикле событий, где
+        обращаться к ORM нельзя. Строк в списке не больше, чем
+        ингредиентов в справочнике.
         """
 
-        ingredients_amounts = IngredientsAmount.objects.select_related(
-            'recipe', 'ingredient'
-        ).filter(recipe__shop_recipe__user=request.user)
-
-        receips_in_cart_ids = set(
-            ShoppingCart
-            .objects
+        rows = list(
+            ShoppingListItem.objects
             .filter(user=request.user)
-            .values_list('recipe__id', flat=True)
+            .values('ingredient__name', 'ingredient__measurement_unit',
+                    'amount')
+            .order_by('ingredient__name', 'ingredient__measurement_unit')
         )
 
-        dict_of_ingredients = {}
-
-        for item in ingredients_amounts:
-            if item.recipe.id not in receips_in_cart_ids:
-                continue
-            ingredient_name = item.ingredient.name
-            measurement_unit = item.ingredient.measurement_unit
-            if ingredient_name not in dict_of_ingredients:
-                dict_of_ingredients[ingredient_name] = {
-                    'amount': 0,
-                    'measurement_unit': measurement_unit
-                }
-            dict_of_ingredients[ingredient_name]['amount'] += item.amount
-
-        output = io.StringIO()
-        for key, item in dict_of_ingredients.items():
-            output.write(f'{key}: {item["amount"]} {item["measurement_unit"]}')
-            output.write('\n')
-        output.seek(0)
-
-        response = HttpResponse(content_type='text/plain')
-        response['Content-Disposition'] = 'attachment; filename="list.txt"'
-        response.write(output.getvalue())
+        renderer = request.accepted_renderer
+        response = StreamingHttpResponse(
+            renderer.stream(rows),
+            content_type=f'{renderer.media_type}; charset={renderer.charset}')
+        response['Content-Disposition'] = (
+            f'attachment; filename="list.{renderer.format}"')
 
         return response
 
+    @action(detail=False,
+            methods=('GET',),
+            permission_classes=(IsAuthenticated,))
+    def feed(self, request):
+        """Лента рецептов авторов, на которых подписан пользователь.
+
+        Читается из TimelineEntry, которая заполняется при публикации
+        рецепта и при подписке, поэтому запрос не зависит от количества
+        подписок и рецептов у авторов.
+        """
 
-class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
-    """ViewSet Ingredient."""
+        queryset = self.filter_queryset(
+            self.get_queryset().filter(timeline_entries__user=request.user))
+        page = self.paginate_queryset(queryset)
+        if page is None:
+            serializer = self.get_serializer(queryset, many=True)
+            return Response(serializer.data)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
+    @action(detail=True,
+            methods=('GET',))
+    def similar(self, request, pk):
+        """Рецепты с наиболее похожим набором ингредиентов.
+
+        Соседи рассчитываются заранее командой build_similar_recipes,
+        здесь они только читаются.
+        """
+
+        recipe = get_object_or_404(Recipe, id=pk)
+        recipes = (
+            Recipe.objects
+            .filter(similar_to__recipe=recipe)
+            .order_by('-similar_to__score', 'id')
+        )
+        serializer = BriefRecipeSerializer(
+            recipes, many=True, context={'request': request})
+        return Response(serializer.data)
+
+    @action(detail=False,
+            methods=('GET',))
+    def pantry(self, request):
+        """Рецепты, которые можно приготовить из продуктов пользователя.
+
+        ?ingredients=1&ingredients=2&min_coverage=0.5
+        Рецепты ранжируются по доле ингредиентов, которые есть
+        у пользователя. Ранжирование выполняется по индексу в памяти
+        (pantry_index), из базы читается только текущая страница.
+        """
+
+        params = PantryQuerySerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        results = pantry_index.search(
+            params.validated_data['ingredients'],
+            params.validated_data['min_coverage'])
+
+        paginator = CustomLimitPaginanation()
+        page = paginator.paginate_queryset(results, request, view=self)
+        # Без размера страницы (limit, PAGE_SIZE) отдаем все результаты.
+        rows = results if page is None else page
+        counts = {
+            recipe_id: (matched, total) for recipe_id, matched, total in rows
+        }
+        page_recipes = self.get_recipes_in_order(list(counts))
+        for recipe in page_recipes:
+            matched, total = counts[recipe.pk]
+            recipe.matched_count = matched
+            recipe.missing_count = total - matched
+
+        serializer = PantryRecipeSerializer(
+            page_recipes, many=True, context=self.get_serializer_context())
+        if page is None:
+            return Response(serializer.data)
+        return paginator.get_paginated_response(serializer.data)
+
+
+class IngredientViewSet(CatalogConditionalMixin,
+                        viewsets.ReadOnlyModelViewSet):
+    """ViewSet Ingredient.
+
+    Справочник одинаков для всех пользователей,
+    поэтому аутентификация не выполняется.
+    """
 
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
     filter_backends = (DjangoFilterBackend,)
     filterset_class = SearchIngredientFilter
     pagination_class = None
+    authentication_classes = ()
+    catalog_name = 'ingredients'
+    query_budgets = {
+        'list': 1,
+        'retrieve': 1,
+    }
+
+    def list(self, request, *args, **kwargs):
+        """Список ингредиентов и поиск по началу названия (?name=).
+
+        Отвечаем из индекса в памяти воркера, без запроса к базе.
+        """
+
+        return self.conditional(request, self.search_ingredients)
+
+    def search_ingredients(self, request):
+        return Response(ingredient_index.search(request.query_params.get(
+            'name')))
 
 
-class TagViewSet(viewsets.ReadOnlyModelViewSet):
-    """ViewSet Tag."""
+class TagViewSet(CatalogConditionalMixin, viewsets.ReadOnlyModelViewSet):
+    """ViewSet Tag.
+
+    Справочник одинаков для всех пользователей,
+    поэтому аутентификация не выполняется.
+    """
 
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
     pagination_class = None
+    authentication_classes = ()
+    catalog_name = 'tags'
+    query_budgets = {
+        'list': 1,
+        'retrieve': 1,
+    }
+
+
+class ImageUploadViewSet(mixins.CreateModelMixin,
+                         mixins.RetrieveModelMixin,
+                         viewsets.GenericViewSet):
+    """Загрузка изображений рецептов без base64.
+
+    POST /api/uploads/ multipart с полем file: файл пишется на диск
+    по мере поступления и сразу проверяется.
+    POST /api/uploads/ {"size": N}: начать загрузку по частям.
+    PUT /api/uploads/{token}/ с заголовком Upload-Offset: дописать часть.
+    GET /api/uploads/{token}/: узнать, сколько байт уже получено.
+
+    Токен завершенной загрузки передается в поле image рецепта.
+    """
+
+    serializer_class = ImageUploadSerializer
+    permission_classes = (IsAuthenticated,)
+    parser_classes = (JSONParser, MultiPartParser)
+    lookup_field = 'token'
+
+    def get_queryset(self):
+        queryset = ImageUpload.objects.filter(user=self.request.user)
+        if self.action in ('update', 'partial_update'):
+            queryset = queryset.select_for_update()
+        return queryset
+
+    def create(self, request, *args, **kwargs):
+        if not request.content_type.startswith('multipart/'):
+            return super().create(request, *args, **kwargs)
+
+        upload = ImageUpload.objects.create(user=request.user)
+        request._request.upload_handlers = [
+            ImageUploadHandler(upload, request._request)]
+        if 'file' not in request.FILES:
+            upload.discard()
+            return Response({'file': ['Файл не передан.']},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        complete_upload(upload)
+        return Response(self.get_serializer(upload).data,
+                        status=status.HTTP_201_CREATED)
+
+    def perform_create(self, serializer):
+        serializer.save(user=self.request.user)
+
+    def update(self, request, *args, **kwargs):
+        """Дописываем часть загрузки с позиции Upload-Offset.
+
+        Строка загрузки заблокирована (select_for_update) до конца
+        записи, поэтому два PUT с одним Upload-Offset не пишут в файл
+        одновременно: второй дождется первого и получит 409.
+        Ошибка проверки транзакцию не откатывает: к этому моменту
+        загрузка уже удалена вместе с файлом (ImageUpload.discard).
+        """
+
+        error = None
+        with transaction.atomic():
+            upload = self.get_object()
+            if upload.completed:
+                return Response({'errors': 'Загрузка уже завершена.'},
+                                status=status.HTTP_400_BAD_REQUEST)
+
+            if request.headers.get('Upload-Offset') != str(upload.offset):
+                return Response(self.get_serializer(upload).data,
+                                status=status.HTTP_409_CONFLICT)
+
+            try:
+                read_stream(request, ImageStreamWriter(upload))
+                if upload.offset == upload.size:
+                    complete_upload(upload)
+                else:
+                    upload.save()
+            except ValidationError as exc:
+                error = exc
+        if error is not None:
+            raise error
+        return Response(self.get_serializer(upload).data)
@@ -1,4 +1,5 @@
 import os
+import tempfile
 from pathlib import Path
 
 from dotenv import load_dotenv
@@ -37,8 +38,16 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'api.middleware.replica_routing_middleware',
 ]
 
+QUERY_BUDGET_ENABLED = os.getenv('QUERY_BUDGET_ENABLED') == 'True'
+
+QUERY_BUDGET_RAISE = os.getenv('QUERY_BUDGET_RAISE') == 'True'
+
+if QUERY_BUDGET_ENABLED:
+    MIDDLEWARE.insert(0, 'api.middleware.QueryBudgetMiddleware')
+
 ROOT_URLCONF = 'foodgram_project.urls'
 
 TEMPLATES = [
@@ -71,6 +80,41 @@ DATABASES = {
     }
 }
 
+# Реплики для чтения: DB_REPLICA_HOSTS=host1,host2.
+DATABASE_REPLICAS = []
+for index, host in enumerate(
+        filter(None, os.getenv('DB_REPLICA_HOSTS', '').split(',')), 1):
+    DATABASES[f'replica{index}'] = dict(
+        DATABASES['default'], HOST=host.strip(), TEST={'MIRROR': 'default'})
+    DATABASE_REPLICAS.append(f'replica{index}')
+
+DATABASE_ROUTERS = ['api.db_router.PrimaryReplicaRouter']
+
+REPLICA_STICKY_SECONDS = int(os.getenv('REPLICA_STICKY_SECONDS', 10))
+
+REPLICA_RETRY_SECONDS = int(os.getenv('REPLICA_RETRY_SECONDS', 30))
+
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND',
+            'django.core.cache.backends.filebased.FileBasedCache'),
+        'LOCATION': os.getenv(
+            'CACHE_LOCATION',
+            os.path.join(tempfile.gettempdir(), 'foodgram_cache')),
+    },
+    # Метки чтения с основной базы после записи (см. api.db_router).
+    'replica_sticky': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND',
+            'django.core.cache.backends.filebased.FileBasedCache'),
+        'LOCATION': os.getenv(
+            'STICKY_CACHE_LOCATION',
+            os.path.join(tempfile.gettempdir(), 'foodgram_sticky')),
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    },
+}
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -104,6 +148,27 @@ STATIC_ROOT = BASE_DIR / 'static'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+IMAGE_WORKERS = int(os.getenv('IMAGE_WORKERS', 2))
+
+IMAGE_QUEUE_SIZE = int(os.getenv('IMAGE_QUEUE_SIZE', 16))
+
+UPLOAD_ROOT = BASE_DIR / 'uploads'
+
+IMAGE_UPLOAD_MAX_SIZE = int(os.getenv('IMAGE_UPLOAD_MAX_SIZE', 20 * 1024 ** 2))
+
+IMAGE_MAX_PIXELS = int(os.getenv('IMAGE_MAX_PIXELS', 40_000_000))
+
+TIMELINE_BATCH_SIZE = int(os.getenv('TIMELINE_BATCH_SIZE', 1000))
+
+# Сколько секунд хранятся записи журнала изменений рецептов.
+RECIPE_CHANGES_TTL = int(os.getenv('RECIPE_CHANGES_TTL', 60 * 60))
+
+SERVER_MODE = os.getenv('SERVER_MODE', 'wsgi')
+
+ASYNC_VIEWS = SERVER_MODE == 'asgi'
+
+ASGI_THREADS = int(os.getenv('ASGI_THREADS', 16))
+
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 AUTH_USER_MODEL = 'recipes.User'
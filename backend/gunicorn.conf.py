@@ -0,0 +1,15 @@
+import os
+
+# SERVER_MODE=wsgi: синхронные воркеры gunicorn (как раньше).
+# SERVER_MODE=asgi: воркеры uvicorn под управлением gunicorn.
+server_mode = os.getenv('SERVER_MODE', 'wsgi')
+
+bind = os.getenv('GUNICORN_BIND', '0.0.0.0:9099')
+workers = int(os.getenv('GUNICORN_WORKERS', 1))
+
+if server_mode == 'asgi':
+    wsgi_app = 'foodgram_project.asgi:application'
+    worker_class = 'uvicorn.workers.UvicornWorker'
+else:
+    wsgi_app = 'foodgram_project.wsgi:application'
+    worker_class = 'sync'
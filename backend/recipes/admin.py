@@ -2,7 +2,7 @@ from django.contrib import admin
 from django.contrib.admin import display
 
 from .models import (Favourite, Follow, Ingredient, IngredientsAmount, Recipe,
-                     ShoppingCart, Tag, User)
+                     ShoppingCart, ShoppingListItem, Tag, User)
 
 
 class UserAdmin(admin.ModelAdmin):
@@ -18,7 +18,7 @@ class RecipeAdmin(admin.ModelAdmin):
     def in_favorites_amount(self, obj):
         """Отображаем общее число добавлений этого рецепта в избранное"""
 
-        return obj.favourites.count()
+        return obj.favorites_count
 
 
 class IngredientAdmin(admin.ModelAdmin):
@@ -39,6 +39,10 @@ class ShoppingCartAdmin(admin.ModelAdmin):
     list_display = ('recipe', 'user')
 
 
+class ShoppingListItemAdmin(admin.ModelAdmin):
+    list_display = ('user', 'ingredient', 'amount')
+
+
 class FavouriteAdmin(admin.ModelAdmin):
     list_display = ('recipe', 'user')
 
@@ -53,5 +57,6 @@ admin.site.register(Tag, TagAdmin)
 admin.site.register(User, UserAdmin)
 admin.site.register(IngredientsAmount, IngredientsAmountAdmin)
 admin.site.register(ShoppingCart, ShoppingCartAdmin)
+admin.site.register(ShoppingListItem, ShoppingListItemAdmin)
 admin.site.register(Favourite, FavouriteAdmin)
 admin.site.register(Follow, FollowAdmin)
@@ -0,0 +1,151 @@
+import http.client
+import math
+import os
+import subprocess
+import threading
+import time
+from collections import defaultdict
+from itertools import islice
+from urllib.parse import quote, urlsplit
+
+from django.conf import settings
+
+
+def percentile(values, fraction):
+    """Перцентиль по отсортированному списку (метод ближайшего ранга)."""
+
+    if not values:
+        return 0.0
+    return values[max(0, math.ceil(fraction * len(values)) - 1)]
+
+
+class LoadStats:
+    """Задержки и ошибки запросов, сгруппированные по имени запроса."""
+
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.queries = defaultdict(int)
+        self.lock = threading.Lock()
+
+    def add(self, name, latency, ok, queries=0):
+        with self.lock:
+            self.latencies[name].append(latency)
+            self.queries[name] += queries
+            if not ok:
+                self.errors[name] += 1
+
+    def summary(self, name, duration):
+        """Итоги по одному запросу: rps, перцентили в мс, доля ошибок."""
+
+        values = sorted(self.latencies[name])
+        count = len(values)
+        return {
+            'name': name,
+            'requests': count,
+            'rps': count / duration if duration else 0.0,
+            'p50': percentile(values, 0.50) * 1000,
+            'p95': percentile(values, 0.95) * 1000,
+            'p99': percentile(values, 0.99) * 1000,
+            'errors': self.errors[name] / count if count else 0.0,
+            'queries': self.queries[name] / count if count else 0.0,
+        }
+
+    def total(self):
+        stats = LoadStats()
+        for name, values in self.latencies.items():
+            stats.latencies['total'].extend(values)
+            stats.errors['total'] += self.errors[name]
+            stats.queries['total'] += self.queries[name]
+        return stats
+
+
+def run_load(base_url, scenarios, concurrency, duration=None,
+             iterations=None):
+    """Нагрузка на сервер из concurrency потоков.
+
+    scenarios(index) возвращает итератор сценариев для потока index;
+    сценарий — список запросов (имя, метод, путь, заголовки, тело).
+    Поток выполняет сценарии до истечения duration секунд или
+    iterations сценариев и держит свое keep-alive соединение.
+    Возвращает LoadStats и фактическую длительность прогона.
+    """
+
+    url = urlsplit(base_url)
+    stats = LoadStats()
+    deadline = time.perf_counter() + duration if duration else None
+
+    def send(connection, method, path, headers, body):
+        connection.request(method, quote(url.path.rstrip('/') + path,
+                                         safe='/?&=%:,'),
+                           body=body, headers=headers or {})
+        response = connection.getresponse()
+        response.read()
+        return (response.status < 400,
+                int(response.getheader('X-DB-Queries') or 0))
+
+    def worker(index):
+        connection = http.client.HTTPConnection(url.hostname, url.port,
+                                                timeout=30)
+        for scenario in islice(scenarios(index), iterations):
+            if deadline is not None and time.perf_counter() >= deadline:
+                break
+            for name, method, path, headers, body in scenario:
+                start = time.perf_counter()
+                try:
+                    ok, queries = send(connection, method, path,
+                                       headers, body)
+                except (OSError, http.client.HTTPException):
+                    connection.close()
+                    ok, queries = False, 0
+                stats.add(name, time.perf_counter() - start, ok, queries)
+        connection.close()
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=worker, args=(index,))
+               for index in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return stats, time.perf_counter() - started
+
+
+def git_revision():
+    """Текущая ревизия, чтобы прогоны можно было сравнивать."""
+
+    try:
+        return subprocess.run(
+            ('git', 'rev-parse', '--short', 'HEAD'),
+            capture_output=True, text=True, check=True,
+            cwd=settings.BASE_DIR).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def process_tree_rss(pid):
+    """Суммарный RSS процесса и его потомков в МБ (Linux, /proc)."""
+
+    children = defaultdict(list)
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/stat') as stat:
+                parent = int(stat.read().rsplit(')', 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        children[parent].append(int(entry))
+
+    total, stack = 0, [pid]
+    while stack:
+        current = stack.pop()
+        stack.extend(children[current])
+        try:
+            with open(f'/proc/{current}/status') as status:
+                for line in status:
+                    if line.startswith('VmRSS:'):
+                        total += int(line.split()[1])
+        except OSError:
+            continue
+    return total / 1024
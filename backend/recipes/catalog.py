@@ -0,0 +1,98 @@
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Max, Q
+from django.utils import timezone
+
+from .models import RecipeChange
+
+CATALOG_VERSION_KEY = 'catalog-version:{}'
+
+
+def get_catalog_version(name):
+    """Возвращаем версию справочника (время последнего изменения в нс).
+
+    Версия хранится в общем кеше, чтобы все воркеры видели
+    изменения, сделанные в любом из них.
+    """
+
+    key = CATALOG_VERSION_KEY.format(name)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, time.time_ns(), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def bump_catalog_version(name):
+    """Отмечаем изменение справочника новой версией."""
+
+    cache.set(CATALOG_VERSION_KEY.format(name), time.time_ns(), timeout=None)
+
+
+RECIPE_CHANGE_KEY = 'recipe-change'
+# Через сколько секунд запись журнала считается видимой всем: вставки
+# с соседними id могут зафиксироваться не в порядке id.
+SETTLE_SECONDS = 5
+MAX_CHANGES = 1000
+PRUNE_EVERY = 100
+
+
+def record_recipe_change(recipe_id):
+    """Записываем изменение рецепта в журнал (RecipeChange).
+
+    Метка в кеше отличается после каждой записи, поэтому воркеры
+    обращаются к журналу, только когда в нем что-то появилось.
+    """
+
+    change = RecipeChange.objects.create(recipe_id=recipe_id)
+    cache.set(RECIPE_CHANGE_KEY, change.pk, timeout=None)
+    if change.pk % PRUNE_EVERY == 0:
+        RecipeChange.objects.filter(
+            created__lt=change.created - timedelta(
+                seconds=settings.RECIPE_CHANGES_TTL)).delete()
+
+
+def get_recipe_change_marker():
+    return cache.get(RECIPE_CHANGE_KEY)
+
+
+def get_settled_change():
+    """id последней записи журнала, которая точно видна всем,
+    и устоялись ли все записи.
+    """
+
+    border = timezone.now() - timedelta(seconds=SETTLE_SECONDS)
+    result = RecipeChange.objects.aggregate(
+        last=Max('id', filter=Q(created__lt=border)),
+        unsettled=Count('id', filter=Q(created__gte=border)))
+    return result['last'] or 0, not result['unsettled']
+
+
+def get_recipe_changes(since):
+    """id рецептов, измененных после записи журнала since.
+
+    Возвращает (id рецептов, новое значение since, все ли записи
+    устоялись) или None, если изменений слишком много и индекс
+    дешевле перестроить. Неустоявшиеся записи применяются, но since
+    за них не сдвигается: они будут прочитаны еще раз.
+    """
+
+    rows = list(
+        RecipeChange.objects
+        .filter(id__gt=since)
+        .order_by('id')
+        .values_list('id', 'recipe_id', 'created')[:MAX_CHANGES + 1])
+    if len(rows) > MAX_CHANGES:
+        return None
+
+    border = timezone.now() - timedelta(seconds=SETTLE_SECONDS)
+    settled = True
+    for change_id, _, created in rows:
+        if created >= border:
+            settled = False
+            break
+        since = change_id
+    return {recipe_id for _, recipe_id, _ in rows}, since, settled
@@ -0,0 +1,83 @@
+import io
+import os
+
+from django.core.files.base import ContentFile
+from PIL import Image, features
+
+RENDITION_WIDTHS = (320, 640, 1280)
+CARD_WIDTH = 640
+DETAIL_WIDTH = 1280
+
+RENDITION_FORMATS = {
+    'jpeg': {'format': 'JPEG', 'quality': 82, 'optimize': True,
+             'progressive': True},
+}
+if features.check('webp'):
+    RENDITION_FORMATS['webp'] = {'format': 'WEBP', 'quality': 80,
+                                 'method': 4}
+
+
+def rendition_name(name, width, ext):
+    """Имя файла производной: images/foo.png -> images/foo.w640.jpeg."""
+
+    root, _ = os.path.splitext(name)
+    return f'{root}.w{width}.{ext}'
+
+
+def render(source, widths=RENDITION_WIDTHS):
+    """Строим уменьшенные копии изображения в JPEG и WebP.
+
+    source: путь к файлу или файловый объект.
+    Ширины больше исходной пропускаются, чтобы не увеличивать картинку.
+    Возвращает словарь {ширина: {расширение: байты}}.
+    """
+
+    with Image.open(source) as image:
+        image.load()
+        if image.mode in ('RGBA', 'LA', 'P'):
+            image = image.convert('RGBA')
+            background = Image.new('RGB', image.size, (255, 255, 255))
+            background.paste(image, mask=image.getchannel('A'))
+            image = background
+        elif image.mode != 'RGB':
+            image = image.convert('RGB')
+
+        renditions = {}
+        for width in widths:
+            if width >= image.width:
+                continue
+            height = round(image.height * width / image.width)
+            resized = image.resize((width, height), Image.LANCZOS)
+            renditions[width] = {}
+            for ext, options in RENDITION_FORMATS.items():
+                buffer = io.BytesIO()
+                resized.save(buffer, **options)
+                renditions[width][ext] = buffer.getvalue()
+        return renditions
+
+
+def save_renditions(storage, name, renditions):
+    """Сохраняем производные в хранилище рядом с оригиналом.
+
+    Возвращает описание для Recipe.image_renditions:
+    {'640': {'jpeg': имя файла, 'webp': имя файла}, ...}.
+    """
+
+    saved = {}
+    for width, files in renditions.items():
+        saved[str(width)] = {}
+        for ext, content in files.items():
+            target = rendition_name(name, width, ext)
+            if storage.exists(target):
+                storage.delete(target)
+            saved[str(width)][ext] = storage.save(
+                target, ContentFile(content))
+    return saved
+
+
+def make_renditions(image):
+    """Строим и сохраняем производные для поля ImageField рецепта."""
+
+    with image.storage.open(image.name) as source:
+        renditions = render(source)
+    return save_renditions(image.storage, image.name, renditions)
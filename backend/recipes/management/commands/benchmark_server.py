@@ -0,0 +1,109 @@
+import itertools
+import os
+import subprocess
+import sys
+import time
+import urllib.request
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from recipes.benchmark import process_tree_rss, run_load
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    help = ('Сравнение пропускной способности и задержек gunicorn '
+            'в режимах WSGI и ASGI при одинаковом числе воркеров.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--modes',
+                            nargs='+',
+                            default=('wsgi', 'asgi'),
+                            choices=('wsgi', 'asgi'),
+                            help='Режимы сервера для сравнения.')
+        parser.add_argument('--workers',
+                            default=2,
+                            type=int,
+                            help='Количество воркеров gunicorn.')
+        parser.add_argument('--concurrency',
+                            default=32,
+                            type=int,
+                            help='Количество одновременных клиентов.')
+        parser.add_argument('--duration',
+                            default=20,
+                            type=float,
+                            help='Длительность прогона, секунд.')
+        parser.add_argument('--warmup',
+                            default=3,
+                            type=float,
+                            help='Прогрев перед замером, секунд.')
+        parser.add_argument('--port',
+                            default=8765,
+                            type=int,
+                            help='Порт, на котором запускается сервер.')
+
+    def hot_paths(self):
+        """Горячие пути чтения: справочники, лента и страница рецепта."""
+
+        paths = ['/api/ingredients/?name=а', '/api/tags/',
+                 '/api/recipes/?limit=6']
+        recipe = Recipe.objects.order_by('-id').first()
+        if recipe is not None:
+            paths.append(f'/api/recipes/{recipe.pk}/')
+        return paths
+
+    def wait_ready(self, base_url, process, timeout=60):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if process.poll() is not None:
+                raise CommandError('Сервер завершился при запуске.')
+            try:
+                urllib.request.urlopen(base_url + '/api/tags/', timeout=1)
+                return
+            except OSError:
+                time.sleep(0.2)
+        raise CommandError('Сервер не ответил за отведенное время.')
+
+    def run_mode(self, mode, paths, options):
+        base_url = f'http://127.0.0.1:{options["port"]}'
+        env = dict(os.environ, SERVER_MODE=mode,
+                   GUNICORN_WORKERS=str(options['workers']),
+                   GUNICORN_BIND=f'127.0.0.1:{options["port"]}')
+        process = subprocess.Popen(
+            [sys.executable, '-m', 'gunicorn', '--config', 'gunicorn.conf.py'],
+            cwd=settings.BASE_DIR, env=env,
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            self.wait_ready(base_url, process)
+
+            def scenarios(index):
+                start = index % len(paths)
+                for path in itertools.cycle(paths[start:] + paths[:start]):
+                    yield [(path, 'GET', path, None, None)]
+
+            run_load(base_url, scenarios, options['concurrency'],
+                     options['warmup'])
+            stats, elapsed = run_load(base_url, scenarios,
+                                      options['concurrency'],
+                                      options['duration'])
+            rss = process_tree_rss(process.pid)
+        finally:
+            process.terminate()
+            process.wait(timeout=30)
+        return stats.total().summary('total', elapsed), rss
+
+    def handle(self, *args, **options):
+        paths = self.hot_paths()
+        self.stdout.write(
+            f'Воркеров: {options["workers"]}, клиентов: '
+            f'{options["concurrency"]}, пути: {", ".join(paths)}')
+        self.stdout.write(
+            f'{"режим":<6} {"RSS, МБ":>8} {"rps":>8} {"p50, мс":>8} '
+            f'{"p99, мс":>8} {"ошибки":>7}')
+        for mode in options['modes']:
+            result, rss = self.run_mode(mode, paths, options)
+            self.stdout.write(
+                f'{mode:<6} {rss:>8.0f} {result["rps"]:>8.1f} '
+                f'{result["p50"]:>8.1f} {result["p99"]:>8.1f} '
+                f'{result["errors"]:>7.1%}')
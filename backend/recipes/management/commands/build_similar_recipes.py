@@ -0,0 +1,58 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from recipes.models import IngredientsAmount, SimilarRecipe
+from recipes.similarity import TOP_K, load_ingredient_sets, similar_recipes
+
+
+class Command(BaseCommand):
+    help = ('Расчет похожих рецептов по наборам ингредиентов '
+            'для /api/recipes/{id}/similar/.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top-k',
+                            default=TOP_K,
+                            type=int,
+                            help='Количество похожих рецептов.')
+        parser.add_argument('--batch-size',
+                            default=1000,
+                            type=int,
+                            help='Количество рецептов в одной пачке.')
+
+    def store(self, batch):
+        """Заменяем соседей пачки рецептов в одной транзакции."""
+
+        with transaction.atomic():
+            SimilarRecipe.objects.filter(
+                recipe_id__in=[recipe_id for recipe_id, _ in batch]).delete()
+            SimilarRecipe.objects.bulk_create(
+                SimilarRecipe(recipe_id=recipe_id, similar_id=similar_id,
+                              score=score)
+                for recipe_id, neighbours in batch
+                for similar_id, score in neighbours)
+
+    def handle(self, *args, **options):
+        rows = (
+            IngredientsAmount.objects
+            .values_list('recipe_id', 'ingredient_id')
+            .order_by('recipe_id')
+        )
+        recipes, postings = load_ingredient_sets(
+            rows.iterator(chunk_size=10000))
+
+        batch = []
+        for recipe_id in sorted(recipes):
+            batch.append((recipe_id, similar_recipes(
+                recipe_id, recipes, postings, top_k=options['top_k'])))
+            if len(batch) >= options['batch_size']:
+                self.store(batch)
+                batch = []
+        if batch:
+            self.store(batch)
+
+        SimilarRecipe.objects.exclude(
+            recipe_id__in=IngredientsAmount.objects.values('recipe_id')
+        ).delete()
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Похожие рецепты рассчитаны для {len(recipes)} рецептов.'))
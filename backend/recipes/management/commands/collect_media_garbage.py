@@ -0,0 +1,108 @@
+import os
+import shutil
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from recipes.models import ImageUpload, Recipe
+
+MEDIA_DIRS = ('images',)
+
+
+class Command(BaseCommand):
+    help = ('Удаление файлов изображений, на которые не ссылается '
+            'ни один рецепт, и незавершенных загрузок.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run',
+                            action='store_true',
+                            help='Только показать, что будет удалено.')
+        parser.add_argument('--grace-hours',
+                            default=24,
+                            type=int,
+                            help='Не трогать файлы моложе этого срока.')
+        parser.add_argument('--quarantine',
+                            help='Переносить файлы в этот каталог '
+                                 'вместо удаления.')
+        parser.add_argument('--batch-size',
+                            default=2000,
+                            type=int,
+                            help='Размер пачки при чтении рецептов.')
+
+    def referenced_names(self, batch_size):
+        """Имена файлов оригиналов и производных всех рецептов."""
+
+        names = set()
+        recipes = Recipe.objects.values_list('image', 'image_renditions')
+        for image, renditions in recipes.iterator(chunk_size=batch_size):
+            if image:
+                names.add(os.path.normpath(image))
+            for files in (renditions or {}).values():
+                names.update(os.path.normpath(name)
+                             for name in files.values())
+        return names
+
+    def scan(self, root):
+        """Обходим дерево каталогов через os.scandir без рекурсии."""
+
+        stack = [root]
+        while stack:
+            try:
+                entries = os.scandir(stack.pop())
+            except FileNotFoundError:
+                continue
+            with entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(entry.path)
+                    elif entry.is_file(follow_symlinks=False):
+                        yield entry
+
+    def remove(self, path, relative, quarantine):
+        if quarantine:
+            target = os.path.join(quarantine, relative)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            shutil.move(path, target)
+        else:
+            os.remove(path)
+
+    def handle(self, *args, **options):
+        dry_run = options['dry_run']
+        quarantine = options['quarantine']
+        cutoff = time.time() - options['grace_hours'] * 3600
+        media_root = str(settings.MEDIA_ROOT)
+
+        referenced = self.referenced_names(options['batch_size'])
+        files = reclaimed = 0
+
+        for directory in MEDIA_DIRS:
+            for entry in self.scan(os.path.join(media_root, directory)):
+                relative = os.path.relpath(entry.path, media_root)
+                if relative in referenced:
+                    continue
+                stat = entry.stat(follow_symlinks=False)
+                if stat.st_mtime > cutoff:
+                    continue
+
+                files += 1
+                reclaimed += stat.st_size
+                if dry_run:
+                    self.stdout.write(f'{relative} ({stat.st_size} байт)')
+                    continue
+                self.remove(entry.path, relative, quarantine)
+
+        uploads = ImageUpload.objects.filter(
+            created__lt=timezone.now() - timedelta(
+                hours=options['grace_hours']))
+        stale_uploads = uploads.count()
+        if not dry_run:
+            for upload in uploads.iterator():
+                upload.discard()
+
+        action = 'Будет освобождено' if dry_run else 'Освобождено'
+        self.stdout.write(self.style.SUCCESS(
+            f'{action}: {reclaimed} байт в {files} файлах, '
+            f'устаревших загрузок: {stale_uploads}.'))
@@ -0,0 +1,415 @@
+import io
+import json
+import random
+import time
+from array import array
+from datetime import datetime, timedelta, timezone
+from itertools import accumulate, islice
+
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from PIL import Image
+
+from recipes.catalog import bump_catalog_version
+from recipes.images import render, save_renditions
+from recipes.models import (Favourite, Follow, Ingredient, IngredientsAmount,
+                            Recipe, ShoppingCart, Tag, TimelineEntry, User)
+from recipes.storage import recipe_image_storage
+
+FIRST_NAMES = ('Анна', 'Иван', 'Мария', 'Петр', 'Ольга', 'Сергей',
+               'Елена', 'Дмитрий', 'Наталья', 'Алексей')
+LAST_NAMES = ('Иванов', 'Смирнов', 'Кузнецов', 'Попов', 'Соколов',
+              'Лебедев', 'Козлов', 'Новиков', 'Морозов', 'Волков')
+DISHES = ('Суп', 'Салат', 'Пирог', 'Рагу', 'Запеканка', 'Омлет', 'Паста',
+          'Каша', 'Плов', 'Соус', 'Десерт', 'Котлеты')
+AMOUNTS = (1, 2, 3, 5, 10, 20, 50, 100, 150, 200, 250, 300, 500, 1000)
+TAGS = (
+    ('Завтрак', Tag.GREEN, 'breakfast'),
+    ('Обед', Tag.RED, 'lunch'),
+    ('Ужин', Tag.BLUE, 'dinner'),
+)
+IMAGE_COLORS = ((200, 80, 40), (90, 160, 60), (230, 190, 60),
+                (120, 60, 40), (240, 120, 120), (60, 120, 200))
+IMAGE_SIZE = (1600, 1200)
+
+EPOCH = datetime(2023, 1, 1, tzinfo=timezone.utc)
+
+
+def zipf_weights(count, exponent):
+    """Накопленные веса закона Ципфа для рангов 1..count."""
+
+    return list(accumulate(
+        1 / rank ** exponent for rank in range(1, count + 1)))
+
+
+def copy_value(value):
+    """Значение в текстовом формате COPY PostgreSQL."""
+
+    if value is None:
+        return '\\N'
+    if isinstance(value, bool):
+        return 't' if value else 'f'
+    if isinstance(value, dict):
+        value = json.dumps(value, ensure_ascii=False)
+    elif isinstance(value, datetime):
+        value = value.isoformat()
+    return (str(value).replace('\\', '\\\\').replace('\t', '\\t')
+            .replace('\n', '\\n').replace('\r', '\\r'))
+
+
+class Command(BaseCommand):
+    help = ('Генерация большого детерминированного набора данных '
+            'для нагрузочного тестирования.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users',
+                            default=100000,
+                            type=int,
+                            help='Количество пользователей.')
+        parser.add_argument('--recipes',
+                            default=1000000,
+                            type=int,
+                            help='Количество рецептов.')
+        parser.add_argument('--seed',
+                            default=0,
+                            type=int,
+                            help='Зерно генератора: одинаковое зерно дает '
+                                 'одинаковые данные.')
+        parser.add_argument('--zipf',
+                            default=1.0,
+                            type=float,
+                            help='Показатель закона Ципфа для авторов, '
+                                 'ингредиентов и популярности рецептов.')
+        parser.add_argument('--follows',
+                            default=10,
+                            type=float,
+                            help='Среднее количество подписок пользователя.')
+        parser.add_argument('--favourites',
+                            default=20,
+                            type=float,
+                            help='Среднее количество избранных рецептов.')
+        parser.add_argument('--carts',
+                            default=0.3,
+                            type=float,
+                            help='Доля пользователей с непустой корзиной.')
+        parser.add_argument('--prefix',
+                            default='bench',
+                            help='Префикс имен и адресов пользователей.')
+        parser.add_argument('--password',
+                            default='bench-password',
+                            help='Пароль всех пользователей.')
+        parser.add_argument('--batch-size',
+                            default=10000,
+                            type=int,
+                            help='Количество строк в одной вставке.')
+        parser.add_argument('--no-copy',
+                            action='store_true',
+                            help='Не использовать COPY на PostgreSQL.')
+        parser.add_argument('--timelines',
+                            action='store_true',
+                            help='Заполнить ленты подписок (может быть '
+                                 'очень много строк).')
+        parser.add_argument('--skip-search-index',
+                            action='store_true',
+                            help='Не строить поисковый индекс.')
+
+    def random(self, stream):
+        """Отдельный генератор для каждого вида данных.
+
+        Повторный вызов с тем же именем дает ту же последовательность,
+        поэтому связи можно сгенерировать дважды: сначала посчитать
+        счетчики, потом вставить строки.
+        """
+
+        return random.Random(f'{self.seed}:{stream}')
+
+    def count(self, rng, mean, limit):
+        return min(int(rng.expovariate(1 / mean)), limit) if mean else 0
+
+    def stage(self, message):
+        self.stdout.write(f'[{time.monotonic() - self.started:7.1f} с] '
+                          f'{message}')
+
+    def insert(self, model, fields, rows):
+        """Вставка строк пачками: COPY на PostgreSQL, иначе bulk_create.
+
+        fields — имена атрибутов (author_id, а не author).
+        Возвращает количество вставленных строк.
+        """
+
+        rows = iter(rows)
+        total = 0
+        while True:
+            batch = list(islice(rows, self.batch_size))
+            if not batch:
+                return total
+            total += len(batch)
+            if self.use_copy:
+                self.copy(model, fields, batch)
+                continue
+            with transaction.atomic():
+                model.objects.bulk_create(
+                    model(**dict(zip(fields, row))) for row in batch)
+
+    def copy(self, model, fields, rows):
+        columns = ', '.join(
+            connection.ops.quote_name(model._meta.get_field(field).column)
+            for field in fields)
+        buffer = io.StringIO()
+        for row in rows:
+            buffer.write('\t'.join(map(copy_value, row)))
+            buffer.write('\n')
+        buffer.seek(0)
+        with connection.cursor() as cursor:
+            cursor.copy_expert(
+                f'COPY {connection.ops.quote_name(model._meta.db_table)} '
+                f'({columns}) FROM STDIN', buffer)
+
+    def reset_sequences(self, *models):
+        """После вставки с явными id сдвигаем последовательности."""
+
+        with connection.cursor() as cursor:
+            for sql in connection.ops.sequence_reset_sql(no_style(), models):
+                cursor.execute(sql)
+
+    def prepare_catalog(self):
+        """Теги и ингредиенты: настоящий справочник из data/."""
+
+        if not Ingredient.objects.exists():
+            call_command('import', stdout=io.StringIO())
+        if not Tag.objects.exists():
+            for name, color, slug in TAGS:
+                Tag.objects.create(name=name, color=color, slug=slug)
+        self.tag_ids = list(Tag.objects.order_by('pk').values_list(
+            'pk', flat=True))
+        ingredients = list(Ingredient.objects.order_by('pk').values_list(
+            'pk', 'name'))
+        self.random('ingredients').shuffle(ingredients)
+        self.ingredients = ingredients
+        self.ingredient_weights = zipf_weights(len(ingredients), self.zipf)
+
+    def prepare_images(self):
+        """Несколько заглушек с производными: хранилище хранит одинаковое
+        содержимое один раз, а рецепты ссылаются на эти файлы.
+        """
+
+        self.images = []
+        for color in IMAGE_COLORS:
+            buffer = io.BytesIO()
+            image = Image.new('RGB', IMAGE_SIZE, color)
+            image.paste((255, 255, 255), (0, IMAGE_SIZE[1] * 3 // 4,
+                                          *IMAGE_SIZE))
+            image.save(buffer, 'PNG')
+            name = recipe_image_storage.save(
+                'images/dataset.png', ContentFile(buffer.getvalue()))
+            with recipe_image_storage.open(name) as source:
+                renditions = save_renditions(
+                    recipe_image_storage, name, render(source))
+            self.images.append((name, renditions))
+
+    def plan(self):
+        """Авторы рецептов и счетчики, которые хранятся денормализованно."""
+
+        rng = self.random('authors')
+        self.popular_users = list(range(self.users))
+        rng.shuffle(self.popular_users)
+        self.user_weights = zipf_weights(self.users, self.zipf)
+        self.authors = array('l', rng.choices(
+            self.popular_users, cum_weights=self.user_weights,
+            k=self.recipes))
+
+        self.popular_recipes = list(range(self.recipes))
+        self.random('popularity').shuffle(self.popular_recipes)
+        self.recipe_weights = zipf_weights(self.recipes, self.zipf)
+
+        self.recipes_count = array('l', [0]) * self.users
+        for author in self.authors:
+            self.recipes_count[author] += 1
+        self.followers_count = array('l', [0]) * self.users
+        for _, author in self.follows():
+            self.followers_count[author] += 1
+        self.favorites_count = array('l', [0]) * self.recipes
+        for _, recipe in self.favourites():
+            self.favorites_count[recipe] += 1
+
+    def follows(self):
+        rng = self.random('follows')
+        for user in range(self.users):
+            authors = set(rng.choices(
+                self.popular_users, cum_weights=self.user_weights,
+                k=self.count(rng, self.mean_follows, self.users)))
+            authors.discard(user)
+            for author in sorted(authors):
+                yield user, author
+
+    def picked_recipes(self, rng, count):
+        return sorted(set(rng.choices(
+            self.popular_recipes, cum_weights=self.recipe_weights, k=count)))
+
+    def favourites(self):
+        rng = self.random('favourites')
+        for user in range(self.users):
+            count = self.count(rng, self.mean_favourites, self.recipes)
+            for recipe in self.picked_recipes(rng, count):
+                yield user, recipe
+
+    def carts(self):
+        rng = self.random('carts')
+        for user in range(self.users):
+            if rng.random() >= self.cart_share:
+                continue
+            for recipe in self.picked_recipes(rng, rng.randint(1, 5)):
+                yield user, recipe
+
+    def user_rows(self, options):
+        password = make_password(options['password'])
+        rng = self.random('users')
+        prefix = options['prefix']
+        for index in range(self.users):
+            yield (
+                self.user_base + index + 1, password,
+                f'{prefix}{index}', f'{prefix}{index}@example.com',
+                rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES),
+                True, False, False, EPOCH + timedelta(minutes=index),
+                self.recipes_count[index], self.followers_count[index],
+            )
+
+    def recipe_rows(self, rng, start, stop, amounts, tags):
+        """Рецепты [start, stop). Ингредиенты и теги рецептов
+        добавляются в списки amounts и tags.
+        """
+
+        for index in range(start, stop):
+            recipe_id = self.recipe_base + index + 1
+            picked = dict(rng.choices(
+                self.ingredients, cum_weights=self.ingredient_weights,
+                k=rng.randint(3, 12)))
+            for ingredient_id in picked:
+                amounts.append((recipe_id, ingredient_id,
+                                rng.choice(AMOUNTS)))
+            for tag_id in rng.sample(
+                    self.tag_ids, rng.randint(1, min(3, len(self.tag_ids)))):
+                tags.append((recipe_id, tag_id))
+
+            names = list(picked.values())
+            name = f'{rng.choice(DISHES)} ({names[0]})'[:200]
+            cooking_time = max(1, min(240, int(rng.lognormvariate(3.3, 0.6))))
+            image, renditions = rng.choice(self.images)
+            yield (
+                recipe_id, self.user_base + self.authors[index] + 1, image,
+                renditions, Recipe.IMAGE_READY, name,
+                f'{name}: {", ".join(names)}. Время приготовления: '
+                f'{cooking_time} мин.'[:500],
+                cooking_time, self.favorites_count[index],
+            )
+
+    def insert_recipes(self):
+        recipe_tags = Recipe.tags.through
+        rng = self.random('recipes')
+        for start in range(0, self.recipes, self.batch_size):
+            stop = min(start + self.batch_size, self.recipes)
+            amounts, tags = [], []
+            self.insert(
+                Recipe,
+                ('id', 'author_id', 'image', 'image_renditions',
+                 'image_status', 'name', 'text', 'cooking_time',
+                 'favorites_count'),
+                self.recipe_rows(rng, start, stop, amounts, tags))
+            self.insert(IngredientsAmount,
+                        ('recipe_id', 'ingredient_id', 'amount'), amounts)
+            self.insert(recipe_tags, ('recipe_id', 'tag_id'), tags)
+
+    def pairs(self, pairs, user_base, target_base):
+        for user, target in pairs:
+            yield user_base + user + 1, target_base + target + 1
+
+    def insert_timelines(self):
+        """Материализуем ленты подписок, как fan_out при публикации."""
+
+        user_ids = range(self.user_base + 1, self.user_base + self.users + 1)
+        total = 0
+        for start in range(0, len(user_ids), 100):
+            batch = user_ids[start:start + 100]
+            rows = (
+                Recipe.objects
+                .filter(author__following__user__in=batch)
+                .values_list('author__following__user', 'pk', 'author')
+                .order_by()
+            )
+            total += self.insert(TimelineEntry,
+                                 ('user_id', 'recipe_id', 'author_id'),
+                                 rows.iterator(chunk_size=self.batch_size))
+        return total
+
+    def handle(self, *args, **options):
+        self.started = time.monotonic()
+        self.seed = options['seed']
+        self.users = options['users']
+        self.recipes = options['recipes']
+        self.zipf = options['zipf']
+        self.mean_follows = options['follows']
+        self.mean_favourites = options['favourites']
+        self.cart_share = options['carts']
+        self.batch_size = options['batch_size']
+        self.use_copy = (connection.vendor == 'postgresql'
+                         and not options['no_copy'])
+        if self.users < 1 or self.recipes < 1:
+            raise CommandError('Нужен хотя бы один пользователь и рецепт.')
+        if User.objects.filter(
+                username__startswith=options['prefix']).exists():
+            raise CommandError(
+                f'Пользователи с префиксом {options["prefix"]} уже есть: '
+                f'укажите другой --prefix или очистите базу.')
+
+        self.prepare_catalog()
+        self.prepare_images()
+        self.user_base = User.objects.order_by('-pk').values_list(
+            'pk', flat=True).first() or 0
+        self.recipe_base = Recipe.objects.order_by('-pk').values_list(
+            'pk', flat=True).first() or 0
+        self.plan()
+        self.stage('Счетчики рассчитаны.')
+
+        self.insert(
+            User,
+            ('id', 'password', 'username', 'email', 'first_name',
+             'last_name', 'is_active', 'is_staff', 'is_superuser',
+             'date_joined', 'recipes_count', 'followers_count'),
+            self.user_rows(options))
+        self.reset_sequences(User)
+        self.stage(f'Пользователей: {self.users}.')
+
+        self.insert_recipes()
+        self.reset_sequences(Recipe)
+        self.stage(f'Рецептов: {self.recipes}.')
+
+        pairs = (
+            (Follow, ('user_id', 'following_id'), self.follows(),
+             self.user_base),
+            (Favourite, ('user_id', 'recipe_id'), self.favourites(),
+             self.recipe_base),
+            (ShoppingCart, ('user_id', 'recipe_id'), self.carts(),
+             self.recipe_base),
+        )
+        for model, fields, rows, target_base in pairs:
+            total = self.insert(model, fields,
+                                self.pairs(rows, self.user_base, target_base))
+            self.stage(f'{model.__name__}: {total}.')
+
+        call_command('rebuild_shopping_lists', stdout=io.StringIO())
+        self.stage('Списки покупок построены.')
+        if options['timelines']:
+            self.stage(f'Записей в лентах: {self.insert_timelines()}.')
+        if not options['skip_search_index']:
+            call_command('rebuild_search_index', stdout=io.StringIO())
+            self.stage('Поисковый индекс построен.')
+
+        # bulk_create и COPY не вызывают сигналы, поэтому сбрасываем
+        # версии справочников вручную.
+        for name in ('ingredients', 'tags', 'recipes'):
+            bump_catalog_version(name)
+        self.stdout.write(self.style.SUCCESS('Набор данных сгенерирован.'))
@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from recipes.images import make_renditions
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    help = ('Построение уменьшенных копий и WebP для изображений '
+            'уже существующих рецептов.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force',
+                            action='store_true',
+                            help='Перестроить производные для всех рецептов.')
+        parser.add_argument('--batch-size',
+                            default=100,
+                            type=int,
+                            help='Количество рецептов в одной пачке.')
+
+    def handle(self, *args, **options):
+        recipes = Recipe.objects.exclude(image='').only(
+            'pk', 'image', 'image_renditions', 'image_status').order_by('pk')
+        if not options['force']:
+            recipes = recipes.filter(
+                Q(image_renditions={}) | ~Q(image_status=Recipe.IMAGE_READY))
+
+        done = failed = 0
+        for recipe in recipes.iterator(chunk_size=options['batch_size']):
+            try:
+                recipe.image_renditions = make_renditions(recipe.image)
+            except (OSError, ValueError) as error:
+                failed += 1
+                self.stderr.write(f'Рецепт {recipe.pk}: {error}')
+                recipe.image_status = Recipe.IMAGE_FAILED
+            else:
+                done += 1
+                recipe.image_status = Recipe.IMAGE_READY
+            recipe.save(update_fields=('image_renditions', 'image_status'))
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Обработано изображений: {done}, с ошибками: {failed}.'))
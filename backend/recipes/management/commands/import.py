@@ -5,6 +5,7 @@ from django.conf import settings
 from django.core.management.base import BaseCommand
 from django.db import transaction
 
+from recipes.catalog import bump_catalog_version
 from recipes.models import Ingredient
 
 DATA_ROOT = os.path.join(settings.BASE_DIR, 'data')
@@ -39,6 +40,7 @@ class Command(BaseCommand):
 
             with transaction.atomic():
                 Ingredient.objects.bulk_create(ingredients_list)
+            bump_catalog_version('ingredients')
 
             self.stdout.write(
                 self.style.SUCCESS(f'Данные из {filename} импортированны.'))
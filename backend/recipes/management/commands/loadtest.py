@@ -0,0 +1,237 @@
+import json
+import random
+import re
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.authtoken.models import Token
+
+from recipes.benchmark import git_revision, run_load
+from recipes.models import Ingredient, Recipe, Tag, User
+
+COLLECTION = (settings.BASE_DIR.parent / 'postman-collection'
+              / 'diploma.postman_collection.json')
+
+# Сценарий: вес и запросы коллекции Postman, выполняемые подряд.
+SCENARIOS = {
+    'browse_recipes': (50, (
+        'get_recipes_list // No Auth',
+        'get_recipes_list_with_limit_param // User',
+        'get_recipe_detail // User',
+    )),
+    'filter_by_tag': (20, (
+        'get_recipes_list_with_two_tags_param // User',
+    )),
+    'autocomplete_ingredients': (20, (
+        'get_ingredients_list_with_name_filter // User',
+    )),
+    'toggle_favorite': (7, (
+        'add_to_favorite // User',
+        'remove_from_favorite // User',
+    )),
+    'download_shopping_list': (3, (
+        'add_to_shopping_cart // User',
+        'download_shopping_cart // User',
+        'remove_from_shopping_cart // User',
+    )),
+}
+
+VARIABLE = re.compile(r'{{(\w+)}}')
+
+SAMPLE_SIZE = 1000
+
+
+def load_requests(path):
+    """Запросы коллекции Postman по имени (первое вхождение)."""
+
+    with open(path, encoding='utf-8') as collection:
+        items = json.load(collection)['item']
+    requests = {}
+    while items:
+        item = items.pop(0)
+        if 'item' in item:
+            items.extend(item['item'])
+            continue
+        requests.setdefault(item['name'], item['request'])
+    return requests
+
+
+class Command(BaseCommand):
+    help = ('Нагрузочный тест: взвешенные сценарии из коллекции Postman '
+            'против запущенного сервера.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url',
+                            default='http://127.0.0.1:8000',
+                            help='Адрес запущенного сервера.')
+        parser.add_argument('--collection',
+                            default=str(COLLECTION),
+                            help='Файл коллекции Postman.')
+        parser.add_argument('--concurrency',
+                            default=16,
+                            type=int,
+                            help='Количество одновременных клиентов.')
+        parser.add_argument('--duration',
+                            default=30,
+                            type=float,
+                            help='Длительность прогона, секунд.')
+        parser.add_argument('--iterations',
+                            type=int,
+                            help='Количество сценариев на клиента '
+                                 'вместо ограничения по времени.')
+        parser.add_argument('--weights',
+                            help='Веса сценариев: browse_recipes=50,...')
+        parser.add_argument('--seed',
+                            default=0,
+                            type=int,
+                            help='Зерно генератора сценариев.')
+        parser.add_argument('--output',
+                            help='Сохранить результаты в JSON.')
+        parser.add_argument('--compare',
+                            help='Сравнить с ранее сохраненным JSON.')
+
+    def get_weights(self, value):
+        weights = {name: weight for name, (weight, _) in SCENARIOS.items()}
+        for pair in filter(None, (value or '').split(',')):
+            name, _, weight = pair.partition('=')
+            if name not in weights:
+                raise CommandError(f'Неизвестный сценарий: {name}.')
+            weights[name] = int(weight)
+        return weights
+
+    def get_variables(self, seed):
+        """Значения переменных коллекции из базы, на которую смотрит
+        сервер. Переменные выбираются случайно для каждого сценария.
+
+        Выборка ингредиентов зависит только от seed, поэтому прогоны
+        с одним seed на одной базе отправляют одинаковые запросы.
+        """
+
+        recipe_ids = list(Recipe.objects.order_by('-id').values_list(
+            'id', flat=True)[:SAMPLE_SIZE])
+        author_ids = list(Recipe.objects.order_by('author_id').values_list(
+            'author_id', flat=True).distinct()[:SAMPLE_SIZE])
+        slugs = list(Tag.objects.values_list('slug', flat=True))
+        names = list(Ingredient.objects.order_by('id').values_list(
+            'name', flat=True))
+        names = random.Random(seed).sample(
+            names, min(SAMPLE_SIZE, len(names)))
+        if not recipe_ids or not slugs or not names:
+            raise CommandError('Для нагрузочного теста нужны рецепты, теги '
+                               'и ингредиенты (см. generate_dataset).')
+
+        def variables(rng):
+            return {
+                'firstRecipeId': rng.choice(recipe_ids),
+                'recipeId': rng.choice(recipe_ids),
+                'userId': rng.choice(author_ids),
+                'secondTagSlug': rng.choice(slugs),
+                'thirdTagSlug': rng.choice(slugs),
+                'ingredientNameFirstLatter': rng.choice(names)[:2],
+            }
+        return variables
+
+    def get_tokens(self, count):
+        """Токены отдельных пользователей для каждого клиента, чтобы
+        сценарии с избранным и корзиной не мешали друг другу.
+        """
+
+        users = list(User.objects.filter(is_active=True).order_by('id')[
+            :count])
+        if len(users) < count:
+            raise CommandError(f'Нужно не меньше {count} пользователей.')
+        return [Token.objects.get_or_create(user=user)[0].key
+                for user in users]
+
+    def build_request(self, name, request, values, token):
+        def substitute(text):
+            return VARIABLE.sub(lambda match: str(values.get(
+                match.group(1), match.group(0))), text)
+
+        url = request['url']
+        raw = url['raw'] if isinstance(url, dict) else url
+        path = substitute(raw).replace('{{baseUrl}}', '')
+        headers = {'Accept': 'application/json'}
+        if (request.get('auth') or {}).get('type') == 'apikey':
+            headers['Authorization'] = f'Token {token}'
+        body = (request.get('body') or {}).get('raw') or None
+        if body:
+            body = substitute(body).encode()
+            headers['Content-Type'] = 'application/json'
+        return name, request['method'], path, headers, body
+
+    def handle(self, *args, **options):
+        requests = load_requests(options['collection'])
+        for _, names in SCENARIOS.values():
+            missing = [name for name in names if name not in requests]
+            if missing:
+                raise CommandError(
+                    f'В коллекции нет запросов: {", ".join(missing)}.')
+
+        weights = self.get_weights(options['weights'])
+        variables = self.get_variables(options['seed'])
+        tokens = self.get_tokens(options['concurrency'])
+        scenario_names = [name for name in SCENARIOS if weights[name] > 0]
+        scenario_weights = [weights[name] for name in scenario_names]
+
+        def scenarios(index):
+            rng = random.Random(options['seed'] * 1000 + index)
+            while True:
+                scenario = rng.choices(scenario_names, scenario_weights)[0]
+                values = variables(rng)
+                yield [self.build_request(name, requests[name], values,
+                                          tokens[index])
+                       for name in SCENARIOS[scenario][1]]
+
+        duration = None if options['iterations'] else options['duration']
+        stats, elapsed = run_load(options['url'], scenarios,
+                                  options['concurrency'], duration,
+                                  options['iterations'])
+
+        results = {
+            'revision': git_revision(),
+            'options': {key: options[key] for key in (
+                'url', 'concurrency', 'duration', 'iterations', 'seed')},
+            'weights': weights,
+            'elapsed': elapsed,
+            'endpoints': [stats.summary(name, elapsed)
+                          for name in sorted(stats.latencies)],
+            'total': stats.total().summary('total', elapsed),
+        }
+        self.report(results)
+
+        if options['compare']:
+            with open(options['compare'], encoding='utf-8') as baseline:
+                self.compare(json.load(baseline), results)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as output:
+                json.dump(results, output, ensure_ascii=False, indent=2)
+
+    def report(self, results):
+        self.stdout.write(
+            f'Ревизия: {results["revision"]}, '
+            f'длительность: {results["elapsed"]:.1f} с')
+        self.stdout.write(
+            f'{"запрос":<48} {"кол-во":>7} {"rps":>7} {"p50":>7} '
+            f'{"p95":>7} {"p99":>7} {"ошибки":>7} {"SQL":>5}')
+        for row in results['endpoints'] + [results['total']]:
+            self.stdout.write(
+                f'{row["name"]:<48} {row["requests"]:>7} '
+                f'{row["rps"]:>7.1f} {row["p50"]:>7.1f} {row["p95"]:>7.1f} '
+                f'{row["p99"]:>7.1f} {row["errors"]:>7.1%} '
+                f'{row["queries"]:>5.1f}')
+
+    def compare(self, baseline, results):
+        """Изменение rps и p95 относительно сохраненного прогона."""
+
+        self.stdout.write(f'Сравнение с ревизией {baseline["revision"]}:')
+        before = {row['name']: row for row in
+                  baseline['endpoints'] + [baseline['total']]}
+        for row in results['endpoints'] + [results['total']]:
+            old = before.get(row['name'])
+            if not old or not old['rps'] or not old['p95']:
+                continue
+            self.stdout.write(
+                f'{row["name"]:<48} '
+                f'rps {row["rps"] / old["rps"] - 1:>+7.1%} '
+                f'p95 {row["p95"] / old["p95"] - 1:>+7.1%}')
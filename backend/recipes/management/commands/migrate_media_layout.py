@@ -0,0 +1,87 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from recipes.models import Recipe
+from recipes.storage import HASHED_NAME
+
+
+class Command(BaseCommand):
+    help = ('Перенос изображений рецептов в раскладку по хешу содержимого '
+            'с обновлением Recipe.image и производных.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size',
+                            default=200,
+                            type=int,
+                            help='Количество рецептов в одной пачке.')
+        parser.add_argument('--keep-originals',
+                            action='store_true',
+                            help='Не удалять файлы со старыми именами.')
+
+    def rehash(self, storage, name, moved):
+        """Сохраняем файл под именем по хешу и запоминаем старое имя."""
+
+        if HASHED_NAME.search(name):
+            return name
+        with storage.open(name) as content:
+            new_name = storage.save(name, content)
+        moved.append(name)
+        return new_name
+
+    def migrate_recipe(self, recipe, moved):
+        storage = recipe.image.storage
+        recipe.image.name = self.rehash(storage, recipe.image.name, moved)
+        recipe.image_renditions = {
+            width: {
+                ext: self.rehash(storage, name, moved)
+                for ext, name in files.items()
+            }
+            for width, files in recipe.image_renditions.items()
+        }
+
+    def handle(self, *args, **options):
+        recipes = (
+            Recipe.objects
+            .exclude(image='')
+            .only('pk', 'image', 'image_renditions')
+            .order_by('pk')
+        )
+        storage = Recipe._meta.get_field('image').storage
+        batch_size = options['batch_size']
+        last_pk = 0
+        migrated = failed = 0
+
+        while True:
+            batch = list(recipes.filter(pk__gt=last_pk)[:batch_size])
+            if not batch:
+                break
+            last_pk = batch[-1].pk
+
+            changed, moved = [], []
+            for recipe in batch:
+                if (HASHED_NAME.search(recipe.image.name)
+                        and all(HASHED_NAME.search(name)
+                                for files in recipe.image_renditions.values()
+                                for name in files.values())):
+                    continue
+                recipe_moved = []
+                try:
+                    self.migrate_recipe(recipe, recipe_moved)
+                except OSError as error:
+                    failed += 1
+                    self.stderr.write(f'Рецепт {recipe.pk}: {error}')
+                    continue
+                changed.append(recipe)
+                moved.extend(recipe_moved)
+
+            with transaction.atomic():
+                Recipe.objects.bulk_update(
+                    changed, ('image', 'image_renditions'))
+            migrated += len(changed)
+
+            if not options['keep_originals']:
+                for name in moved:
+                    storage.delete(name)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Перенесено рецептов: {migrated}, с ошибками: {failed}.'))
@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from recipes.models import Recipe
+from recipes.search import update_search_index
+
+
+class Command(BaseCommand):
+    help = ('Пересчет поискового индекса рецептов, например после '
+            'загрузки данных через bulk_create.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size',
+                            default=1000,
+                            type=int,
+                            help='Количество рецептов в одной пачке.')
+
+    def handle(self, *args, **options):
+        recipe_ids = Recipe.objects.order_by('pk').values_list('pk', flat=True)
+        batch_size = options['batch_size']
+        last_pk = 0
+        total = 0
+
+        while True:
+            batch = list(recipe_ids.filter(pk__gt=last_pk)[:batch_size])
+            if not batch:
+                break
+            last_pk = batch[-1]
+            with transaction.atomic():
+                update_search_index(batch)
+            total += len(batch)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Проиндексировано рецептов: {total}.'))
@@ -0,0 +1,81 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Sum
+
+from recipes.models import IngredientsAmount, ShoppingListItem, User
+
+
+class Command(BaseCommand):
+    help = ('Пересчет списков покупок (ShoppingListItem) '
+            'по содержимому корзин и проверка на расхождения.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check',
+                            action='store_true',
+                            help='Только найти расхождения, не исправлять.')
+        parser.add_argument('--batch-size',
+                            default=500,
+                            type=int,
+                            help='Количество пользователей в одной пачке.')
+
+    def expected(self, user_ids):
+        """Считаем списки покупок заново по корзинам пользователей."""
+
+        totals = (
+            IngredientsAmount.objects
+            .filter(recipe__shop_recipe__user__in=user_ids)
+            .values('recipe__shop_recipe__user', 'ingredient')
+            .annotate(total=Sum('amount'))
+            .order_by()
+        )
+        return {
+            (row['recipe__shop_recipe__user'], row['ingredient']):
+            row['total']
+            for row in totals
+        }
+
+    def handle(self, *args, **options):
+        check = options['check']
+        batch_size = options['batch_size']
+        user_ids = User.objects.order_by('pk').values_list('pk', flat=True)
+        drifted_users = 0
+
+        for start in range(0, user_ids.count(), batch_size):
+            batch = list(user_ids[start:start + batch_size])
+            expected = self.expected(batch)
+            actual = {
+                (item['user'], item['ingredient']): item['amount']
+                for item in ShoppingListItem.objects
+                .filter(user__in=batch)
+                .values('user', 'ingredient', 'amount')
+            }
+            drifted = {
+                user_id for (user_id, _), _ in
+                set(expected.items()) ^ set(actual.items())
+            }
+            if not drifted:
+                continue
+
+            drifted_users += len(drifted)
+            for user_id in sorted(drifted):
+                self.stdout.write(
+                    f'Расхождение в списке покупок пользователя {user_id}.')
+            if check:
+                continue
+
+            with transaction.atomic():
+                ShoppingListItem.objects.filter(user__in=drifted).delete()
+                ShoppingListItem.objects.bulk_create(
+                    ShoppingListItem(user_id=user_id,
+                                     ingredient_id=ingredient_id,
+                                     amount=amount)
+                    for (user_id, ingredient_id), amount in expected.items()
+                    if user_id in drifted
+                )
+
+        if check and drifted_users:
+            raise CommandError(
+                f'Расхождения найдены у {drifted_users} пользователей.')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Списки покупок проверены, исправлено: {drifted_users}.'))
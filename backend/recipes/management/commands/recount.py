@@ -0,0 +1,91 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from recipes.models import Favourite, Follow, Recipe, User
+
+
+def count_subquery(model, field):
+    """Коррелированный подзапрос с количеством строк model,
+    ссылающихся на объект через field.
+
+    В отличие от нескольких Count() в одном annotate не соединяет
+    связанные таблицы между собой.
+    """
+
+    return Coalesce(Subquery(
+        model.objects
+        .filter(**{field: OuterRef('pk')})
+        .order_by()
+        .values(field)
+        .annotate(total=Count('pk'))
+        .values('total')
+    ), 0)
+
+
+class Command(BaseCommand):
+    help = ('Пересчет счетчиков избранного, рецептов и подписчиков '
+            'с исправлением расхождений.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size',
+                            default=1000,
+                            type=int,
+                            help='Количество объектов в одной пачке.')
+
+    def recount(self, queryset, counters, batch_size):
+        """Сверяем счетчики с фактическими значениями пачками по pk.
+
+        counters: словарь {поле счетчика: (модель, поле связи)}.
+        Возвращает количество исправленных объектов.
+        """
+
+        annotations = {
+            f'actual_{field}': count_subquery(model, relation)
+            for field, (model, relation) in counters.items()
+        }
+        last_pk = 0
+        fixed = 0
+
+        while True:
+            batch = list(
+                queryset
+                .filter(pk__gt=last_pk)
+                .order_by('pk')
+                .annotate(**annotations)[:batch_size]
+            )
+            if not batch:
+                return fixed
+            last_pk = batch[-1].pk
+
+            changed = []
+            for obj in batch:
+                drift = False
+                for field in counters:
+                    actual = getattr(obj, f'actual_{field}')
+                    if getattr(obj, field) != actual:
+                        setattr(obj, field, actual)
+                        drift = True
+                if drift:
+                    changed.append(obj)
+
+            with transaction.atomic():
+                queryset.model.objects.bulk_update(changed, tuple(counters))
+            fixed += len(changed)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+
+        recipes = self.recount(
+            Recipe.objects.only('pk', 'favorites_count'),
+            {'favorites_count': (Favourite, 'recipe')},
+            batch_size)
+        users = self.recount(
+            User.objects.only('pk', 'recipes_count', 'followers_count'),
+            {'recipes_count': (Recipe, 'author'),
+             'followers_count': (Follow, 'following')},
+            batch_size)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Исправлено рецептов: {recipes}, пользователей: {users}.'))
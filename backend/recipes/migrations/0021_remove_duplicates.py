@@ -0,0 +1,95 @@
+from django.db import migrations
+from django.db.models import Count, Min, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+BATCH_SIZE = 1000
+
+
+def remove_duplicates(model, fields):
+    """Удаляем повторы пачками, оставляя строку с наименьшим id.
+
+    Возвращает id пользователей, у которых были повторы.
+    """
+
+    duplicates = (
+        model.objects
+        .values(*fields)
+        .annotate(keep=Min('id'), total=Count('id'))
+        .filter(total__gt=1)
+        .order_by()
+    )
+    user_ids = set()
+    to_delete = []
+
+    for group in duplicates.iterator():
+        user_ids.add(group['user'])
+        to_delete.extend(
+            model.objects
+            .filter(**{field: group[field] for field in fields})
+            .exclude(id=group['keep'])
+            .values_list('id', flat=True)
+        )
+        if len(to_delete) >= BATCH_SIZE:
+            model.objects.filter(id__in=to_delete).delete()
+            to_delete = []
+
+    model.objects.filter(id__in=to_delete).delete()
+    return user_ids
+
+
+def count_subquery(model, field):
+    return Coalesce(Subquery(
+        model.objects
+        .filter(**{field: OuterRef('pk')})
+        .order_by()
+        .values(field)
+        .annotate(total=Count('pk'))
+        .values('total')
+    ), 0)
+
+
+def deduplicate(apps, schema_editor):
+    User = apps.get_model('recipes', 'User')
+    Recipe = apps.get_model('recipes', 'Recipe')
+    Favourite = apps.get_model('recipes', 'Favourite')
+    Follow = apps.get_model('recipes', 'Follow')
+    ShoppingCart = apps.get_model('recipes', 'ShoppingCart')
+    IngredientsAmount = apps.get_model('recipes', 'IngredientsAmount')
+    ShoppingListItem = apps.get_model('recipes', 'ShoppingListItem')
+
+    if remove_duplicates(Favourite, ('user', 'recipe')):
+        Recipe.objects.update(
+            favorites_count=count_subquery(Favourite, 'recipe'))
+
+    if remove_duplicates(Follow, ('user', 'following')):
+        User.objects.update(
+            followers_count=count_subquery(Follow, 'following'))
+
+    cart_users = list(remove_duplicates(ShoppingCart, ('user', 'recipe')))
+    for start in range(0, len(cart_users), BATCH_SIZE):
+        batch = cart_users[start:start + BATCH_SIZE]
+        ShoppingListItem.objects.filter(user__in=batch).delete()
+        totals = (
+            IngredientsAmount.objects
+            .filter(recipe__shop_recipe__user__in=batch)
+            .values('recipe__shop_recipe__user', 'ingredient')
+            .annotate(total=Sum('amount'))
+            .order_by()
+        )
+        ShoppingListItem.objects.bulk_create(
+            ShoppingListItem(user_id=row['recipe__shop_recipe__user'],
+                             ingredient_id=row['ingredient'],
+                             amount=row['total'])
+            for row in totals
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0020_auto_20261018_0552'),
+    ]
+
+    operations = [
+        migrations.RunPython(deduplicate, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,65 @@
+# Generated by Django 3.2.3 on 2026-10-18 03:05
+
+import django.contrib.postgres.search
+from django.contrib.postgres.search import SearchVector
+from django.db import migrations
+
+import recipes.search
+
+
+class SQLiteRunSQL(migrations.RunSQL):
+    """RunSQL только для SQLite: таблица FTS5 для поиска рецептов.
+
+    В остальных СУБД ничего не делает, как операции
+    django.contrib.postgres вне Postgres.
+    """
+
+    def database_forwards(self, app_label, schema_editor, from_state,
+                          to_state):
+        if schema_editor.connection.vendor == 'sqlite':
+            super().database_forwards(app_label, schema_editor,
+                                      from_state, to_state)
+
+    def database_backwards(self, app_label, schema_editor, from_state,
+                           to_state):
+        if schema_editor.connection.vendor == 'sqlite':
+            super().database_backwards(app_label, schema_editor,
+                                       from_state, to_state)
+
+
+def fill_search_vector(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    Recipe = apps.get_model('recipes', 'Recipe')
+    Recipe.objects.update(search_vector=(
+        SearchVector('name', weight='A', config='russian')
+        + SearchVector('text', weight='B', config='russian')))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0026_alter_recipe_image'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True, verbose_name='Поисковый вектор'),
+        ),
+        migrations.RunPython(fill_search_vector, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=recipes.search.SearchVectorIndex(fields=['search_vector'], name='recipe_search_vector_gin'),
+        ),
+        SQLiteRunSQL(
+            sql=[
+                'CREATE VIRTUAL TABLE recipes_recipe_fts USING fts5('
+                'name, text, tokenize="unicode61 remove_diacritics 2")',
+                'INSERT INTO recipes_recipe_fts (rowid, name, text) '
+                'SELECT id, name, text FROM recipes_recipe',
+            ],
+            reverse_sql=['DROP TABLE recipes_recipe_fts'],
+        ),
+    ]
@@ -1,10 +1,17 @@
+import os
 import re
+import uuid
 
+from django.conf import settings
 from django.contrib.auth.models import AbstractUser
+from django.contrib.postgres.search import SearchVectorField
 from django.core.validators import MaxValueValidator, MinValueValidator
-from django.db import models
+from django.db import connections, models, router, transaction
+from django.db.models.functions import Greatest
 from django.forms import ValidationError
 
+from .search import SearchVectorIndex
+from .storage import recipe_image_storage
 from .validators import validate_username
 
 
@@ -38,6 +45,14 @@ class User(AbstractUser):
         max_length=150,
         blank=False,
         verbose_name='Пароль',)
+    recipes_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Количество рецептов',)
+    followers_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Количество подписчиков',)
 
     def __str__(self):
         return self.username
@@ -96,6 +111,15 @@ class Ingredient(models.Model):
 class Recipe(models.Model):
     """Recipe model."""
 
+    IMAGE_PENDING = 'pending'
+    IMAGE_READY = 'ready'
+    IMAGE_FAILED = 'failed'
+    IMAGE_STATUSES = [
+        (IMAGE_PENDING, 'Обрабатывается'),
+        (IMAGE_READY, 'Готово'),
+        (IMAGE_FAILED, 'Ошибка обработки'),
+    ]
+
     ingredients = models.ManyToManyField(
         Ingredient,
         through='IngredientsAmount',
@@ -110,7 +134,19 @@ class Recipe(models.Model):
         verbose_name='Имя автора')
     image = models.ImageField(
         upload_to='images/',
+        storage=recipe_image_storage,
         verbose_name='Изображение блюда')
+    image_renditions = models.JSONField(
+        default=dict,
+        blank=True,
+        editable=False,
+        verbose_name='Уменьшенные копии изображения')
+    image_status = models.CharField(
+        max_length=10,
+        choices=IMAGE_STATUSES,
+        default=IMAGE_READY,
+        editable=False,
+        verbose_name='Статус обработки изображения')
     name = models.CharField(
         max_length=200,
         verbose_name='Название рецепта')
@@ -123,6 +159,21 @@ class Recipe(models.Model):
             MinValueValidator(1),
             MaxValueValidator(240),),
         verbose_name='Время приготовления в минутах')
+    favorites_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Количество добавлений в избранное')
+    search_vector = SearchVectorField(
+        null=True,
+        editable=False,
+        verbose_name='Поисковый вектор')
+
+    class Meta:
+        indexes = (
+            SearchVectorIndex(
+                fields=('search_vector',),
+                name='recipe_search_vector_gin'),
+        )
 
     def __str__(self):
         return self.name
@@ -168,10 +219,138 @@ class ShoppingCart(models.Model):
         related_name='shop_recipe',
         verbose_name='Рецепт')
 
+    class Meta:
+        constraints = (
+            models.UniqueConstraint(
+                fields=('user', 'recipe'),
+                name='unique_shopping_cart'),
+        )
+        indexes = (
+            models.Index(
+                fields=('recipe', 'user'),
+                name='shopping_cart_recipe_user'),
+        )
+
     def __str__(self):
         return f'{self.user.username} - {self.recipe.name}'
 
 
+class ShoppingListQuerySet(models.QuerySet):
+    """Инкрементальное обновление списков покупок."""
+
+    def apply(self, user_ids, deltas):
+        """Прибавляем к спискам покупок пользователей изменения
+        количества ингредиентов.
+
+        deltas: словарь {id ингредиента: изменение количества}.
+        Строки с нулевым или отрицательным итогом удаляются.
+
+        Прибавление выполняется одним INSERT ... ON CONFLICT DO UPDATE,
+        поэтому одновременные добавления одного ингредиента не
+        конфликтуют: строку, которой еще нет, нельзя заблокировать
+        через SELECT ... FOR UPDATE.
+        """
+
+        user_ids = sorted(set(user_ids))
+        added = {key: value for key, value in deltas.items() if value > 0}
+        removed = {key: value for key, value in deltas.items() if value < 0}
+        if not user_ids or not (added or removed):
+            return
+
+        using = router.db_for_write(self.model)
+        with transaction.atomic(using=using):
+            if removed:
+                # UPDATE блокирует строки и пересчитывает значение после
+                # ожидания, поэтому одновременные вычитания не уводят
+                # количество ниже нуля.
+                items = self.using(using).filter(user_id__in=user_ids,
+                                                 ingredient_id__in=removed)
+                items.update(amount=Greatest(models.ExpressionWrapper(
+                    models.F('amount') + models.Case(
+                        *(models.When(ingredient_id=ingredient_id,
+                                      then=models.Value(delta))
+                          for ingredient_id, delta in removed.items())),
+                    output_field=models.IntegerField()), 0))
+                items.filter(amount=0).delete()
+            if added:
+                self.upsert([
+                    (user_id, ingredient_id, delta)
+                    for user_id in user_ids
+                    for ingredient_id, delta in sorted(added.items())
+                ], using)
+
+    def upsert(self, rows, using=None, batch_size=1000):
+        """Прибавляем amount к строкам (user_id, ingredient_id, amount),
+        создавая недостающие.
+        """
+
+        connection = connections[using or router.db_for_write(self.model)]
+        quote = connection.ops.quote_name
+        table = quote(self.model._meta.db_table)
+        with connection.cursor() as cursor:
+            for start in range(0, len(rows), batch_size):
+                batch = rows[start:start + batch_size]
+                values = ', '.join(['(%s, %s, %s)'] * len(batch))
+                cursor.execute(
+                    f'INSERT INTO {table} (user_id, ingredient_id, amount) '
+                    f'VALUES {values} '
+                    f'ON CONFLICT (user_id, ingredient_id) DO UPDATE '
+                    f'SET amount = {table}.amount + EXCLUDED.amount',
+                    [value for row in batch for value in row])
+
+    def add_recipe(self, user_ids, recipe, sign=1):
+        """Добавляем ингредиенты рецепта в списки покупок.
+
+        sign=-1 вычитает ингредиенты рецепта.
+        """
+
+        amounts = IngredientsAmount.objects.filter(
+            recipe=recipe).values_list('ingredient_id', 'amount')
+        deltas = {}
+        for ingredient_id, amount in amounts:
+            deltas[ingredient_id] = deltas.get(ingredient_id, 0) + (
+                sign * amount)
+        self.apply(user_ids, deltas)
+
+    def remove_recipe(self, user_ids, recipe):
+        """Вычитаем ингредиенты рецепта из списков покупок."""
+
+        self.add_recipe(user_ids, recipe, sign=-1)
+
+
+class ShoppingListItem(models.Model):
+    """Материализованный список покупок пользователя.
+
+    Хранит суммарное количество каждого ингредиента
+    по всем рецептам в корзине пользователя.
+    """
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='shopping_list',
+        verbose_name='Пользователь')
+    ingredient = models.ForeignKey(
+        Ingredient,
+        on_delete=models.CASCADE,
+        related_name='shopping_list',
+        verbose_name='Ингредиент')
+    amount = models.PositiveIntegerField(
+        verbose_name='Количество')
+
+    objects = ShoppingListQuerySet.as_manager()
+
+    class Meta:
+        constraints = (
+            models.UniqueConstraint(
+                fields=('user', 'ingredient'),
+                name='unique_shopping_list_item'),
+        )
+
+    def __str__(self):
+        return f'{self.user} - {self.ingredient}: {self.amount}'
+
+
 class Favourite(models.Model):
     """Favourites model."""
 
@@ -187,6 +366,18 @@ class Favourite(models.Model):
         related_name='favourites',
         verbose_name='Рецепт')
 
+    class Meta:
+        constraints = (
+            models.UniqueConstraint(
+                fields=('user', 'recipe'),
+                name='unique_favourite'),
+        )
+        indexes = (
+            models.Index(
+                fields=('recipe', 'user'),
+                name='favourite_recipe_user'),
+        )
+
     def __str__(self):
         return f'{self.user.username} - {self.recipe.name}'
 
@@ -203,5 +394,228 @@ class Follow(models.Model):
         related_name='following',
         verbose_name='На кого подписан')
 
+    class Meta:
+        constraints = (
+            models.UniqueConstraint(
+                fields=('user', 'following'),
+                name='unique_follow'),
+        )
+        indexes = (
+            models.Index(
+                fields=('following', 'user'),
+                name='follow_following_user'),
+        )
+
     def __str__(self):
         return f'{self.user.username} - {self.following.username}'
+
+
+class ImageUpload(models.Model):
+    """Загрузка изображения рецепта по частям или через multipart.
+
+    Файл пишется на диск по мере поступления данных, а после
+    завершения загрузки токен передается в поле image рецепта
+    вместо base64 строки.
+    """
+
+    token = models.UUIDField(
+        default=uuid.uuid4,
+        unique=True,
+        editable=False,
+        verbose_name='Токен загрузки')
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='image_uploads',
+        verbose_name='Пользователь')
+    size = models.PositiveBigIntegerField(
+        null=True,
+        blank=True,
+        verbose_name='Размер файла')
+    offset = models.PositiveBigIntegerField(
+        default=0,
+        verbose_name='Получено байт')
+    format = models.CharField(
+        max_length=10,
+        blank=True,
+        verbose_name='Формат изображения')
+    width = models.PositiveIntegerField(
+        null=True,
+        blank=True,
+        verbose_name='Ширина')
+    height = models.PositiveIntegerField(
+        null=True,
+        blank=True,
+        verbose_name='Высота')
+    completed = models.BooleanField(
+        default=False,
+        verbose_name='Загрузка завершена')
+    created = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name='Дата создания')
+
+    @property
+    def path(self):
+        return os.path.join(settings.UPLOAD_ROOT, str(self.token))
+
+    def discard(self):
+        """Удаляем загрузку вместе с файлом."""
+
+        if os.path.exists(self.path):
+            os.remove(self.path)
+        self.delete()
+
+    def __str__(self):
+        return f'{self.user} - {self.token}'
+
+
+class TimelineQuerySet(models.QuerySet):
+    """Заполнение ленты рецептов авторов, на которых подписан пользователь.
+
+    Лента материализуется при записи: новый рецепт раскладывается
+    по лентам подписчиков, подписка дозаполняет ленту рецептами автора,
+    отписка удаляет их.
+    """
+
+    def fan_out(self, recipe, batch_size=None):
+        """Добавляем рецепт в ленты всех подписчиков автора.
+
+        Подписчики обрабатываются пачками по TIMELINE_BATCH_SIZE,
+        каждая пачка вставляется отдельным запросом.
+        """
+
+        batch_size = batch_size or settings.TIMELINE_BATCH_SIZE
+        follower_ids = (
+            Follow.objects
+            .filter(following_id=recipe.author_id)
+            .order_by('user_id')
+            .values_list('user_id', flat=True)
+        )
+        last_id = 0
+        while True:
+            batch = list(follower_ids.filter(user_id__gt=last_id)[:batch_size])
+            if not batch:
+                break
+            last_id = batch[-1]
+            self.bulk_create(
+                [self.model(user_id=user_id,
+                            recipe_id=recipe.pk,
+                            author_id=recipe.author_id)
+                 for user_id in batch],
+                ignore_conflicts=True)
+
+    def backfill(self, user, author, batch_size=None):
+        """Добавляем в ленту пользователя рецепты автора."""
+
+        batch_size = batch_size or settings.TIMELINE_BATCH_SIZE
+        recipe_ids = (
+            Recipe.objects
+            .filter(author=author)
+            .order_by('pk')
+            .values_list('pk', flat=True)
+        )
+        last_id = 0
+        while True:
+            batch = list(recipe_ids.filter(pk__gt=last_id)[:batch_size])
+            if not batch:
+                break
+            last_id = batch[-1]
+            self.bulk_create(
+                [self.model(user=user, recipe_id=recipe_id, author=author)
+                 for recipe_id in batch],
+                ignore_conflicts=True)
+
+    def prune(self, user, author):
+        """Удаляем из ленты пользователя рецепты автора."""
+
+        return self.filter(user=user, author=author).delete()
+
+
+class TimelineEntry(models.Model):
+    """Запись ленты: рецепт автора, на которого подписан пользователь.
+
+    Лента читается одним проходом по индексу (user, recipe)
+    в порядке убывания id рецепта.
+    """
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='timeline',
+        verbose_name='Пользователь')
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='timeline_entries',
+        verbose_name='Рецепт')
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Автор')
+
+    objects = TimelineQuerySet.as_manager()
+
+    class Meta:
+        constraints = (
+            models.UniqueConstraint(
+                fields=('user', 'recipe'),
+                name='unique_timeline_entry'),
+        )
+        indexes = (
+            models.Index(
+                fields=('user', 'author'),
+                name='timeline_user_author_idx'),
+        )
+
+    def __str__(self):
+        return f'{self.user} - {self.recipe}'
+
+
+class SimilarRecipe(models.Model):
+    """Рецепт с похожим набором ингредиентов.
+
+    Заполняется командой build_similar_recipes.
+    """
+
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='similar_recipes',
+        verbose_name='Рецепт')
+    similar = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='similar_to',
+        verbose_name='Похожий рецепт')
+    score = models.FloatField(
+        verbose_name='Сходство')
+
+    class Meta:
+        constraints = (
+            models.UniqueConstraint(
+                fields=('recipe', 'similar'),
+                name='unique_similar_recipe'),
+        )
+
+    def __str__(self):
+        return f'{self.recipe} - {self.similar}: {self.score:.2f}'
+
+
+class RecipeChange(models.Model):
+    """Журнал изменений рецептов.
+
+    Индексы в памяти воркеров (api.indexes) читают из журнала id
+    измененных рецептов и обновляют только их, а не перестраиваются
+    целиком. Записи старше RECIPE_CHANGES_TTL удаляются.
+    """
+
+    recipe_id = models.BigIntegerField(
+        verbose_name='id рецепта')
+    created = models.DateTimeField(
+        auto_now_add=True,
+        db_index=True,
+        verbose_name='Время изменения')
+
+    def __str__(self):
+        return f'{self.recipe_id}: {self.created}'
@@ -0,0 +1,120 @@
+import re
+
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import (SearchQuery, SearchRank,
+                                            SearchVector)
+from django.db import connection
+from django.db.models import F, FloatField, Q
+from django.db.models.expressions import RawSQL
+
+SEARCH_CONFIG = 'russian'
+
+FTS_TABLE = 'recipes_recipe_fts'
+
+WORD = re.compile(r'\w+')
+
+
+class SearchVectorIndex(GinIndex):
+    """GIN индекс по поисковому вектору.
+
+    Создается только в Postgres: в SQLite поиск идет по таблице FTS5,
+    а GIN индексов там нет. Пустые инструкции позволяют SQLite
+    пересоздавать таблицу рецептов при изменении полей.
+    """
+
+    def create_sql(self, model, schema_editor, using='', **kwargs):
+        if schema_editor.connection.vendor != 'postgresql':
+            return ''
+        return super().create_sql(model, schema_editor, using=using,
+                                  **kwargs)
+
+    def remove_sql(self, model, schema_editor, **kwargs):
+        if schema_editor.connection.vendor != 'postgresql':
+            return ''
+        return super().remove_sql(model, schema_editor, **kwargs)
+
+
+def recipe_vector():
+    """Вектор рецепта: название весомее описания."""
+
+    return (SearchVector('name', weight='A', config=SEARCH_CONFIG)
+            + SearchVector('text', weight='B', config=SEARCH_CONFIG))
+
+
+def fts_query(value):
+    """Запрос FTS5 из слов строки поиска.
+
+    Каждое слово берется в кавычки и ищется по префиксу,
+    что отчасти заменяет стемминг, которого в SQLite нет.
+    """
+
+    return ' '.join(f'"{word}"*' for word in WORD.findall(value.lower()))
+
+
+def update_search_index(recipe_ids):
+    """Пересчитываем поисковый вектор рецептов после записи."""
+
+    from .models import Recipe
+
+    recipes = Recipe.objects.filter(pk__in=list(recipe_ids))
+    if connection.vendor == 'postgresql':
+        recipes.update(search_vector=recipe_vector())
+    elif connection.vendor == 'sqlite':
+        rows = list(recipes.values_list('pk', 'name', 'text'))
+        remove_from_search_index(pk for pk, _, _ in rows)
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f'INSERT INTO {FTS_TABLE} (rowid, name, text) '
+                f'VALUES (%s, %s, %s)', rows)
+
+
+def remove_from_search_index(recipe_ids):
+    """Удаляем рецепты из таблицы FTS5 в SQLite.
+
+    В Postgres вектор хранится в строке рецепта и удаляется вместе с ней.
+    """
+
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        cursor.executemany(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s',
+                           [(pk,) for pk in recipe_ids])
+
+
+def search_recipes(queryset, value):
+    """Полнотекстовый поиск по названию и описанию рецепта.
+
+    В Postgres используется поле search_vector с GIN индексом,
+    в SQLite — таблица FTS5, в остальных СУБД — поиск по вхождению.
+    Результат упорядочен по релевантности.
+    """
+
+    if connection.vendor == 'postgresql':
+        query = SearchQuery(value, config=SEARCH_CONFIG,
+                            search_type='websearch')
+        return (
+            queryset
+            .filter(search_vector=query)
+            .annotate(search_rank=SearchRank(F('search_vector'), query))
+            .order_by('-search_rank', '-id')
+        )
+
+    if connection.vendor != 'sqlite':
+        return queryset.filter(
+            Q(name__icontains=value) | Q(text__icontains=value))
+
+    match = fts_query(value)
+    if not match:
+        return queryset.none()
+    rank = RawSQL(
+        f'SELECT -bm25({FTS_TABLE}, 10.0, 1.0) FROM {FTS_TABLE} '
+        f'WHERE {FTS_TABLE} MATCH %s AND rowid = recipes_recipe.id',
+        (match,), output_field=FloatField())
+    return (
+        queryset
+        .filter(pk__in=RawSQL(
+            f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s',
+            (match,)))
+        .annotate(search_rank=rank)
+        .order_by('-search_rank', '-id')
+    )
@@ -0,0 +1,54 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .catalog import bump_catalog_version, record_recipe_change
+from .models import Ingredient, Recipe, Tag
+from .search import remove_from_search_index, update_search_index
+
+
+@receiver((post_save, post_delete), sender=Ingredient)
+def ingredient_changed(sender, **kwargs):
+    """Обновляем версию справочника ингредиентов."""
+
+    bump_catalog_version('ingredients')
+
+
+@receiver((post_save, post_delete), sender=Tag)
+def tag_changed(sender, **kwargs):
+    """Обновляем версию справочника тегов."""
+
+    bump_catalog_version('tags')
+
+
+def recipe_changed(recipe_id):
+    """Записываем изменение рецепта в журнал после фиксации транзакции.
+
+    Ингредиенты рецепта записываются уже после его сохранения,
+    поэтому индексы в памяти воркеров должны перечитывать рецепт
+    только после коммита.
+    """
+
+    transaction.on_commit(lambda: record_recipe_change(recipe_id))
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_saved(sender, instance, update_fields=None, **kwargs):
+    """Обновляем поисковый индекс, если изменились название или описание,
+    и журнал изменений, если рецепт сохранен целиком.
+    """
+
+    if update_fields:
+        if {'name', 'text'} & set(update_fields):
+            update_search_index((instance.pk,))
+        return
+    recipe_changed(instance.pk)
+    update_search_index((instance.pk,))
+
+
+@receiver(post_delete, sender=Recipe)
+def recipe_deleted(sender, instance, **kwargs):
+    """Удаляем рецепт из поискового индекса."""
+
+    recipe_changed(instance.pk)
+    remove_from_search_index((instance.pk,))
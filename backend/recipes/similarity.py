@@ -0,0 +1,74 @@
+import heapq
+from array import array
+from collections import defaultdict
+
+TOP_K = 10
+
+
+def load_ingredient_sets(rows):
+    """Разреженная матрица рецепт × ингредиент из пар (рецепт, ингредиент).
+
+    Возвращает множества ингредиентов рецептов и списки рецептов
+    каждого ингредиента (строки и столбцы матрицы). Списки рецептов
+    разбиты по числу ингредиентов рецепта: {длина: array id}.
+    """
+
+    recipes = defaultdict(set)
+    for recipe_id, ingredient_id in rows:
+        recipes[recipe_id].add(ingredient_id)
+    postings = defaultdict(lambda: defaultdict(lambda: array('q')))
+    for recipe_id, ingredients in recipes.items():
+        for ingredient_id in ingredients:
+            postings[ingredient_id][len(ingredients)].append(recipe_id)
+    return recipes, postings
+
+
+def jaccard(first, second):
+    shared = len(first & second)
+    return shared / (len(first) + len(second) - shared)
+
+
+def similar_recipes(recipe_id, recipes, postings, top_k=TOP_K):
+    """Top-k рецептов с наиболее похожим набором ингредиентов (Jaccard).
+
+    Результат точный, как при сравнении со всеми рецептами: строка
+    матрицы умножается на столбцы (списки рецептов ингредиентов),
+    начиная с самых редких ингредиентов. Рецепт, которого нет в уже
+    просмотренных списках, может разделять с этим рецептом только
+    оставшиеся r ингредиентов из n, и его оценка не больше r / n.
+    Когда k-я лучшая оценка больше этой границы, частые ингредиенты
+    (соль, вода) уже не просматриваются. Рецепты длины m, у которых
+    оценка не может быть выше k-й лучшей даже при min(r, m) общих
+    ингредиентах, пропускаются без сравнения.
+    Возвращает список пар (id рецепта, оценка) по убыванию оценки,
+    при равной оценке — по убыванию id.
+    """
+
+    if top_k <= 0:
+        return []
+    ingredients = recipes[recipe_id]
+    size = len(ingredients)
+    best = []
+    seen = {recipe_id}
+    order = sorted(ingredients, key=lambda pk: (
+        sum(map(len, postings[pk].values())), pk))
+    for index, ingredient_id in enumerate(order):
+        rest = size - index
+        threshold = best[0][0] if len(best) == top_k else 0
+        if threshold > rest / size:
+            break
+        for length, group in postings[ingredient_id].items():
+            shared = min(rest, length)
+            if shared / (size + length - shared) < threshold:
+                continue
+            for pk in group:
+                if pk in seen:
+                    continue
+                seen.add(pk)
+                item = (jaccard(ingredients, recipes[pk]), pk)
+                if len(best) < top_k:
+                    heapq.heappush(best, item)
+                elif item > best[0]:
+                    heapq.heapreplace(best, item)
+
+    return [(pk, score) for score, pk in sorted(best, reverse=True)]
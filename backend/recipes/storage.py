@@ -0,0 +1,52 @@
+import hashlib
+import os
+import re
+
+from django.core.files.storage import FileSystemStorage
+
+HASHED_NAME = re.compile(r'(^|/)[0-9a-f]{2}/[0-9a-f]{2}/[0-9a-f]{64}\.\w+$')
+
+SHARD_DIRS = re.compile(r'(^|/)[0-9a-f]{2}/[0-9a-f]{2}$')
+
+
+class ContentHashStorage(FileSystemStorage):
+    """Хранилище, которое называет файлы по sha256 содержимого.
+
+    images/temp.png -> images/ab/cd/abcd...ef.png
+
+    Производные, имена которых строятся от уже хешированного имени,
+    попадают в тот же корневой каталог, а не во вложенный.
+
+    Файлы раскладываются по вложенным каталогам по первым байтам хеша,
+    одинаковые загрузки хранятся один раз, а содержимое по одному
+    имени никогда не меняется, поэтому nginx может отдавать такие файлы
+    с Cache-Control: immutable. Файлы, на которые больше не ссылается
+    ни один рецепт, удаляет команда collect_media_garbage.
+    """
+
+    def hashed_name(self, name, content):
+        digest = hashlib.sha256()
+        content.seek(0)
+        for chunk in content.chunks():
+            digest.update(chunk)
+        content.seek(0)
+
+        hexdigest = digest.hexdigest()
+        directory = SHARD_DIRS.sub('', os.path.dirname(name))
+        ext = os.path.splitext(name)[1].lower()
+        return os.path.join(
+            directory, hexdigest[:2], hexdigest[2:4], hexdigest + ext)
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        name = self.hashed_name(name, content)
+        if self.exists(name):
+            # Обновляем время изменения, чтобы collect_media_garbage
+            # не удалил файл, на который только что снова сослались.
+            os.utime(self.path(name))
+            return name
+        return super().save(name, content, max_length)
+
+
+recipe_image_storage = ContentHashStorage()
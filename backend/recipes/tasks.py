@@ -0,0 +1,111 @@
+import io
+import logging
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections, connection
+
+from .images import render, save_renditions
+from .models import Recipe
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_lock = threading.Lock()
+_slots = None
+
+
+def get_executor():
+    """Пул процессов для обработки изображений, один на воркер.
+
+    Размер пула задается IMAGE_WORKERS, длина очереди — IMAGE_QUEUE_SIZE.
+    При IMAGE_WORKERS = 0 изображения обрабатываются в текущем потоке.
+    """
+
+    global _executor, _slots
+    if not settings.IMAGE_WORKERS:
+        return None
+    with _executor_lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(
+                max_workers=settings.IMAGE_WORKERS,
+                mp_context=multiprocessing.get_context('spawn'))
+            _slots = threading.BoundedSemaphore(settings.IMAGE_QUEUE_SIZE)
+    return _executor
+
+
+def read_source(image):
+    """Путь к файлу для дочернего процесса или содержимое файла,
+    если хранилище не работает с локальными путями.
+    """
+
+    try:
+        return image.path
+    except NotImplementedError:
+        with image.storage.open(image.name) as source:
+            return io.BytesIO(source.read())
+
+
+def store_result(recipe_id, name, storage, renditions=None, error=None):
+    """Сохраняем производные и статус обработки рецепта.
+
+    Обновление выполняется только если изображение рецепта
+    не сменилось, пока шла обработка.
+    """
+
+    if error is not None:
+        logger.error('Изображение рецепта %s не обработано: %s',
+                     recipe_id, error)
+        Recipe.objects.filter(pk=recipe_id, image=name).update(
+            image_status=Recipe.IMAGE_FAILED)
+        return
+    Recipe.objects.filter(pk=recipe_id, image=name).update(
+        image_renditions=save_renditions(storage, name, renditions),
+        image_status=Recipe.IMAGE_READY)
+
+
+def process_recipe_image(recipe):
+    """Строим производные изображения рецепта вне потока запроса.
+
+    Вызывается после фиксации транзакции. Если очередь пула заполнена,
+    рецепт остается в статусе pending и будет обработан командой
+    generate_renditions.
+    """
+
+    recipe_id, image = recipe.pk, recipe.image
+    executor = get_executor()
+
+    if executor is None:
+        try:
+            renditions = render(read_source(image))
+        except (OSError, ValueError) as error:
+            store_result(recipe_id, image.name, image.storage, error=error)
+        else:
+            store_result(recipe_id, image.name, image.storage, renditions)
+        return
+
+    if not _slots.acquire(blocking=False):
+        logger.warning('Очередь обработки изображений заполнена, '
+                       'рецепт %s ожидает generate_renditions.', recipe_id)
+        return
+
+    def done(future):
+        _slots.release()
+        close_old_connections()
+        try:
+            error = future.exception()
+            store_result(recipe_id, image.name, image.storage,
+                         renditions=None if error else future.result(),
+                         error=error)
+        finally:
+            connection.close()
+
+    try:
+        future = executor.submit(render, read_source(image))
+    except RuntimeError as error:
+        _slots.release()
+        store_result(recipe_id, image.name, image.storage, error=error)
+        return
+    future.add_done_callback(done)
@@ -0,0 +1,191 @@
+"""Микробенчмарки горячих путей на сгенерированных наборах данных.
+
+Базовый прогон хранится в репозитории, в benchmarks/baseline.json,
+и обновляется вместе с изменениями, которые меняют скорость намеренно:
+
+    pytest benchmarks/ --benchmark-json=benchmarks/baseline.json
+
+Сравнение с ним (так прогон запускается в CI):
+
+    pytest benchmarks/ --benchmark-compare=benchmarks/baseline.json
+
+Прогон падает, если минимальное время замера выросло больше чем
+на --regression-threshold процентов (по умолчанию 15) и больше порога
+шума (см. MinRegressionCheck). Сравнивается минимум из не менее чем
+50 замеров: он меньше всего зависит от шума машины. Базовый прогон
+и сравнение обычно выполняются на разных машинах, поэтому время
+сначала делится на медиану отношений минимумов по всем замерам
+прогона: так находятся пути, которые замедлились относительно
+остальных. Равномерное замедление всех путей эта проверка
+не замечает. Число запросов к базе проверяется отдельно и точно
+в tests/test_recipe_queries.py. Явный --benchmark-compare-fail
+заменяет эту проверку.
+Размеры наборов (количество рецептов) задаются параметром
+--dataset-sizes=1000,10000.
+"""
+import io
+import json
+import os
+import statistics
+
+import pytest
+from django.core.management import call_command
+from django.db.models import Count
+from django.test.utils import override_settings
+from pytest_benchmark.utils import RegressionCheck
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from recipes.models import Ingredient, Tag, User
+
+RECIPE_INGREDIENTS = 20
+
+
+class MinRegressionCheck(RegressionCheck):
+    """Замедление минимума в процентах с учетом порога шума.
+
+    Текущее время делится на медиану отношений минимумов текущего
+    и базового прогона (baseline: {fullname: минимум}) по всем
+    замерам из current_mins: это разница в скорости машин.
+    Шумом считается замедление не больше floor секунд и не больше
+    разброса (медиана минус минимум) базового или текущего прогона.
+    """
+
+    def __init__(self, threshold, floor, baseline, current_mins):
+        super().__init__('min', threshold)
+        self.floor = floor
+        self.baseline = baseline
+        self.current_mins = current_mins
+
+    def scale(self):
+        ratios = [current / self.baseline[name]
+                  for name, current in self.current_mins.items()
+                  if self.baseline.get(name)]
+        return statistics.median(ratios) if ratios else 1.0
+
+    def compute(self, current, compared):
+        scale = self.scale()
+        current_min = current['min'] / scale
+        noise = max(self.floor, compared['median'] - compared['min'],
+                    (current['median'] - current['min']) / scale)
+        if current_min - compared['min'] <= noise:
+            return 0
+        return current_min / compared['min'] * 100 - 100
+
+
+def baseline_mins(compare):
+    """Минимумы замеров из файла базового прогона."""
+
+    if not isinstance(compare, str) or not os.path.isfile(compare):
+        return {}
+    with open(compare, encoding='utf-8') as file:
+        benchmarks = json.load(file)['benchmarks']
+    return {bench['fullname']: bench['stats']['min'] for bench in benchmarks}
+
+
+def pytest_addoption(parser):
+    parser.addoption('--dataset-sizes',
+                     default='1000,10000',
+                     help='Количество рецептов в наборах данных.')
+    parser.addoption('--regression-threshold',
+                     default=15,
+                     type=float,
+                     help='Допустимое замедление минимума, в процентах.')
+    parser.addoption('--regression-floor',
+                     default=0.0005,
+                     type=float,
+                     help='Замедление минимума, которое считается шумом, '
+                          'в секундах.')
+
+
+def pytest_configure(config):
+    # Выполняется до pytest_configure плагина pytest-benchmark
+    # (trylast), который читает параметры сравнения.
+    config.benchmark_mins = {}
+    compare = config.getoption('benchmark_compare', None)
+    if compare and not config.getoption('benchmark_compare_fail'):
+        config.option.benchmark_compare_fail = [MinRegressionCheck(
+            config.getoption('regression_threshold'),
+            config.getoption('regression_floor'),
+            baseline_mins(compare), config.benchmark_mins)]
+
+
+@pytest.fixture(autouse=True)
+def record_min(request, benchmark):
+    """Минимумы замеров прогона для MinRegressionCheck."""
+
+    yield
+    if benchmark.stats is not None:
+        request.config.benchmark_mins[benchmark.fullname] = (
+            benchmark.stats['min'])
+
+
+def pytest_generate_tests(metafunc):
+    if 'dataset' in metafunc.fixturenames:
+        sizes = [int(size) for size in metafunc.config.getoption(
+            'dataset_sizes').split(',')]
+        metafunc.parametrize('dataset', sizes, indirect=True,
+                             scope='session', ids=str)
+
+
+@pytest.fixture(scope='session')
+def media_root(tmp_path_factory):
+    with override_settings(MEDIA_ROOT=tmp_path_factory.mktemp('media')):
+        yield
+
+
+@pytest.fixture(scope='session')
+def dataset(request, media_root, django_db_setup, django_db_blocker):
+    """Набор данных на request.param рецептов и участники замеров:
+    пользователи с наибольшим избранным, подписками и корзиной.
+    """
+
+    size = request.param
+    with django_db_blocker.unblock():
+        call_command('flush', interactive=False, verbosity=0)
+        call_command('generate_dataset', users=max(size // 10, 10),
+                     recipes=size, seed=0, skip_search_index=True,
+                     stdout=io.StringIO())
+
+        def top(relation):
+            return User.objects.annotate(
+                total=Count(relation)).order_by('-total', 'pk').first()
+
+        tags = list(Tag.objects.annotate(total=Count('recipe')).order_by(
+            '-total', 'pk').values_list('pk', 'slug')[:2])
+        ingredients = Ingredient.objects.annotate(
+            total=Count('ingredients_amount')).order_by('-total', 'pk')
+        yield {
+            'reader': top('favourites'),
+            'follower': top('follower'),
+            'shopper': top('shopping_list'),
+            'author': top('recipes'),
+            'tags': [slug for _, slug in tags],
+            'tag_ids': [pk for pk, _ in tags],
+            'ingredients': [
+                {'id': pk, 'amount': 100} for pk in
+                ingredients.values_list('pk', flat=True)[:RECIPE_INGREDIENTS]
+            ],
+        }
+
+
+@pytest.fixture
+def api_request():
+    factory = APIRequestFactory()
+
+    def make(user, path='/', **params):
+        request = factory.get(path, params)
+        force_authenticate(request, user)
+        return request
+    return make
+
+
+@pytest.fixture
+def api_view():
+    def make(viewset, action, request):
+        """Экземпляр представления DRF, как его готовит dispatch()."""
+
+        view = viewset(action_map={'get': action}, format_kwarg=None,
+                       args=(), kwargs={})
+        view.request = view.initialize_request(request)
+        return view
+    return make
@@ -0,0 +1,150 @@
+import base64
+import io
+
+import pytest
+from django.db import transaction
+from django.db.models import Value
+from PIL import Image
+
+from api.filters import RecipeFilter
+from api.indexes import recipe_filter_index
+from api.serializers import FollowingSerializer, PostRecipeSerializer
+from api.views import CustomUserViewSet, RecipeViewSet
+from recipes.models import Recipe, User
+
+PAGE_SIZE = 6
+
+pytestmark = [
+    pytest.mark.django_db,
+    pytest.mark.benchmark(min_rounds=50, warmup=True, disable_gc=True),
+]
+
+
+def test_get_recipe_serializer(benchmark, dataset, api_request, api_view):
+    view = api_view(RecipeViewSet, 'list',
+                    api_request(dataset['reader'], '/api/recipes/'))
+
+    def run():
+        return view.get_serializer(
+            view.get_queryset()[:PAGE_SIZE], many=True).data
+
+    assert len(benchmark(run)) == PAGE_SIZE
+
+
+def test_following_serializer(benchmark, dataset, api_request, api_view):
+    user = dataset['follower']
+    view = api_view(CustomUserViewSet, 'subscriptions',
+                    api_request(user, '/api/users/subscriptions/',
+                                recipes_limit=3))
+
+    def run():
+        authors = list(
+            User.objects
+            .filter(following__user=user)
+            .annotate(is_subscribed=Value(True))
+            .order_by('id')[:PAGE_SIZE])
+        return FollowingSerializer(authors, many=True, context={
+            'request': view.request,
+            'recipes': view.get_authors_recipes(authors, 3),
+        }).data
+
+    assert benchmark(run)
+
+
+def test_validate_ingredients(benchmark, dataset):
+    serializer = PostRecipeSerializer()
+    ingredients = dataset['ingredients']
+    benchmark(serializer.validate_ingredients, ingredients)
+
+
+def test_create_recipe(benchmark, dataset, api_request, api_view):
+    user = dataset['reader']
+    view = api_view(RecipeViewSet, 'create',
+                    api_request(user, '/api/recipes/'))
+    buffer = io.BytesIO()
+    Image.new('RGB', (64, 48), (200, 80, 40)).save(buffer, 'PNG')
+    payload = {
+        'ingredients': dataset['ingredients'],
+        'tags': dataset['tag_ids'],
+        'image': ('data:image/png;base64,'
+                  + base64.b64encode(buffer.getvalue()).decode()),
+        'name': 'Рецепт для замера',
+        'text': 'Описание рецепта для замера.',
+        'cooking_time': 30,
+    }
+
+    def run():
+        with transaction.atomic():
+            serializer = PostRecipeSerializer(
+                data=payload, context={'request': view.request})
+            serializer.is_valid(raise_exception=True)
+            serializer.save(author=user)
+            transaction.set_rollback(True)
+
+    benchmark(run)
+
+
+RECIPE_FILTERS = pytest.mark.parametrize('params', (
+    pytest.param(lambda data: {'tags': data['tags']}, id='tags'),
+    pytest.param(lambda data: {'author': data['author'].pk}, id='author'),
+    pytest.param(lambda data: {'is_favorited': 1}, id='favorited'),
+    pytest.param(lambda data: {'ingredients': [
+        item['id'] for item in data['ingredients'][:2]]}, id='ingredients'),
+    pytest.param(lambda data: {'cooking_time_max': 30}, id='cooking_time'),
+))
+
+
+@RECIPE_FILTERS
+def test_recipe_filter(benchmark, dataset, api_request, api_view, params):
+    """Фильтрация, как в RecipeViewSet.list: параметры проверяет
+    RecipeFilter, id рецептов дает recipe_filter_index.
+    """
+
+    request = api_view(
+        RecipeViewSet, 'list',
+        api_request(dataset['reader'], '/api/recipes/',
+                    **params(dataset))).request
+
+    def run():
+        filterset = RecipeFilter(request.query_params,
+                                 queryset=Recipe.objects.none(),
+                                 request=request)
+        assert filterset.is_valid()
+        recipe_ids = recipe_filter_index.filter(
+            filterset.form.cleaned_data, request.user)
+        return len(recipe_ids), recipe_ids[:PAGE_SIZE]
+
+    benchmark(run)
+
+
+@RECIPE_FILTERS
+def test_recipe_filter_db(benchmark, dataset, api_request, api_view, params):
+    """Та же фильтрация в базе (поиск по тексту, keyset пагинация)."""
+
+    request = api_view(
+        RecipeViewSet, 'list',
+        api_request(dataset['reader'], '/api/recipes/',
+                    **params(dataset))).request
+
+    def run():
+        queryset = RecipeFilter(
+            request.query_params,
+            queryset=Recipe.objects.order_by('-id'),
+            request=request).qs
+        return queryset.count(), list(
+            queryset.values_list('pk', flat=True)[:PAGE_SIZE])
+
+    benchmark(run)
+
+
+def test_download_shopping_cart(benchmark, dataset, api_request):
+    view = RecipeViewSet.as_view(
+        {'get': 'download_shopping_cart'},
+        **RecipeViewSet.download_shopping_cart.kwargs)
+    request = api_request(dataset['shopper'],
+                          '/api/recipes/download_shopping_cart/')
+
+    def run():
+        return b''.join(view(request).streaming_content)
+
+    assert benchmark(run)
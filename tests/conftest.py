@@ -0,0 +1,76 @@
+import io
+
+import pytest
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from PIL import Image
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from recipes.models import Ingredient, IngredientsAmount, Recipe, Tag
+
+
+@pytest.fixture(autouse=True)
+def media_root(settings, tmp_path):
+    settings.MEDIA_ROOT = tmp_path
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    # Версии справочников хранятся в кеше: индексы в памяти
+    # перестраиваются для базы каждого теста.
+    cache.clear()
+    yield
+    cache.clear()
+
+
+def image(name='recipe.png'):
+    buffer = io.BytesIO()
+    Image.new('RGB', (8, 8), (200, 10, 10)).save(buffer, 'PNG')
+    return SimpleUploadedFile(name, buffer.getvalue(), 'image/png')
+
+
+@pytest.fixture
+def user(django_user_model):
+    return django_user_model.objects.create_user(
+        email='cook@foodgram.ru', username='cook', first_name='Иван',
+        last_name='Петров', password='Test12345!')
+
+
+@pytest.fixture
+def user_client(user):
+    client = APIClient()
+    token, _ = Token.objects.get_or_create(user=user)
+    client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+    return client
+
+
+@pytest.fixture
+def tags():
+    return [Tag.objects.create(name=f'Тег {index}', color=Tag.GREEN,
+                               slug=f'tag{index}')
+            for index in range(3)]
+
+
+@pytest.fixture
+def ingredients():
+    return [Ingredient.objects.create(name=f'Продукт {index}',
+                                      measurement_unit='г')
+            for index in range(6)]
+
+
+@pytest.fixture
+def recipes(user, tags, ingredients):
+    result = []
+    for index in range(12):
+        recipe = Recipe.objects.create(
+            author=user, name=f'Рецепт {index}', text='Описание',
+            cooking_time=10 + index, image=image())
+        recipe.tags.set(tags[:1 + index % len(tags)])
+        IngredientsAmount.objects.bulk_create(
+            IngredientsAmount(recipe=recipe, ingredient=ingredient,
+                              amount=amount)
+            for amount, ingredient in enumerate(
+                ingredients[index % 3:index % 3 + 3], 1))
+        result.append(recipe)
+    return result
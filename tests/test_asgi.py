@@ -0,0 +1,169 @@
+import asyncio
+import importlib
+import json
+
+import pytest
+from asgiref.sync import async_to_sync
+from django.core.handlers.asgi import ASGIHandler
+from django.core.signals import request_finished
+from django.db import close_old_connections
+from django.urls import clear_url_caches, resolve
+from rest_framework.authtoken.models import Token
+
+from api import async_views
+from recipes.models import Ingredient, Tag
+
+
+def asgi_get(path, query='', token=None, extra=()):
+    """GET через ASGIHandler, как в воркере uvicorn.
+
+    В отличие от AsyncClient, обработчик перебирает тело потокового
+    ответа в цикле событий. Возвращает (статус, заголовки, тело).
+    """
+
+    headers = [(b'host', b'testserver')]
+    if token is not None:
+        headers.append((b'authorization', f'Token {token}'.encode()))
+    headers.extend((name.encode(), value.encode()) for name, value in extra)
+    scope = {
+        'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1',
+        'method': 'GET', 'scheme': 'http', 'path': path, 'root_path': '',
+        'query_string': query.encode(), 'headers': headers,
+        'client': ('127.0.0.1', 50000), 'server': ('testserver', 80),
+    }
+    messages = []
+
+    async def receive():
+        return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+    async def send(message):
+        messages.append(message)
+
+    # Как тестовый клиент: соединение с базой теста не закрываем.
+    request_finished.disconnect(close_old_connections)
+    try:
+        async_to_sync(ASGIHandler())(scope, receive, send)
+    finally:
+        request_finished.connect(close_old_connections)
+
+    start = messages[0]
+    body = b''.join(message.get('body', b'') for message in messages[1:])
+    headers = {name.lower(): value for name, value in start['headers']}
+    return start['status'], headers, body
+
+
+@pytest.mark.django_db
+class TestASGI:
+
+    @pytest.mark.parametrize('format, expected', (
+        ('txt', 'Продукт 0: 1 г'),
+        ('csv', 'Продукт 0,1,г'),
+        ('json', '"name": "Продукт 0"'),
+    ))
+    def test_download_shopping_cart(self, user, user_client, recipes,
+                                    format, expected):
+        assert user_client.post(
+            f'/api/recipes/{recipes[0].id}/shopping_cart/').status_code == 201
+        token = Token.objects.get(user=user).key
+
+        status, _, body = asgi_get('/api/recipes/download_shopping_cart/',
+                                   f'format={format}', token)
+        assert status == 200
+        assert expected in body.decode()
+
+
+@pytest.fixture
+def async_urls(settings):
+    """Маршруты в режиме ASGI_VIEWS, как у воркера uvicorn."""
+
+    def reload():
+        import api.urls
+        import foodgram_project.urls
+        importlib.reload(api.urls)
+        importlib.reload(foodgram_project.urls)
+        clear_url_caches()
+
+    settings.ASYNC_VIEWS = True
+    reload()
+    yield
+    settings.ASYNC_VIEWS = False
+    reload()
+
+
+@pytest.fixture
+def catalog_paths(tags, ingredients):
+    ingredient = Ingredient.objects.order_by('id').first()
+    tag = Tag.objects.order_by('id').first()
+    return (
+        '/api/ingredients/',
+        '/api/ingredients/?name=%D0%BF%D1%80%D0%BE%D0%B4%D1%83%D0%BA%D1%82%201',
+        f'/api/ingredients/{ingredient.id}/',
+        '/api/ingredients/0/',
+        '/api/tags/',
+        f'/api/tags/{tag.id}/',
+        '/api/tags/0/',
+    )
+
+
+def split(path):
+    path, _, query = path.partition('?')
+    return path, query
+
+
+# Индексы справочников загружаются в пуле потоков: им нужны
+# данные, закоммиченные в базу.
+@pytest.mark.django_db(transaction=True)
+class TestAsyncCatalog:
+
+    def test_views_are_async(self, async_urls):
+        for path in ('/api/ingredients/', '/api/tags/1/', '/api/recipes/'):
+            assert asyncio.iscoroutinefunction(resolve(path).func)
+
+    def test_same_as_sync(self, client, catalog_paths, async_urls):
+        for path in catalog_paths:
+            expected = client.get(path)
+            status, headers, body = asgi_get(*split(path))
+            assert status == expected.status_code, path
+            assert json.loads(body) == expected.json(), path
+            assert headers[b'content-type'] == b'application/json'
+            if status == 200:
+                assert headers[b'etag'] == expected['ETag'].encode()
+
+    def test_not_modified_in_event_loop(self, monkeypatch, catalog_paths,
+                                        async_urls):
+        for path in catalog_paths:
+            asgi_get(*split(path))
+
+        def submit(*args, **kwargs):
+            raise AssertionError('Запрос ушел в пул потоков.')
+
+        monkeypatch.setattr(async_views.executor, 'submit', submit)
+        for path in catalog_paths:
+            status, headers, _ = asgi_get(*split(path))
+            if status != 200:
+                continue
+            status, _, body = asgi_get(
+                *split(path), extra=[('if-none-match',
+                                      headers[b'etag'].decode())])
+            assert status == 304
+            assert body == b''
+
+    def test_reload_after_change(self, catalog_paths, async_urls):
+        status, _, body = asgi_get('/api/tags/')
+        assert len(json.loads(body)) == 3
+
+        Tag.objects.create(name='Новый', color='#000000', slug='new')
+        status, _, body = asgi_get('/api/tags/')
+        assert [tag['slug'] for tag in json.loads(body)][-1] == 'new'
+
+    def test_browsable_api_falls_back(self, catalog_paths, async_urls):
+        status, headers, body = asgi_get(
+            '/api/tags/', extra=[('accept', 'text/html')])
+        assert status == 200
+        assert headers[b'content-type'].startswith(b'text/html')
+
+    def test_recipes(self, client, recipes, async_urls):
+        expected = client.get('/api/recipes/?limit=6')
+        status, _, body = asgi_get('/api/recipes/', 'limit=6')
+        assert status == 200
+        assert json.loads(body) == expected.json()
@@ -0,0 +1,108 @@
+from contextlib import ExitStack
+
+import pytest
+from django.core.cache import caches
+from django.db import OperationalError, connections
+
+from api.db_router import STICKY_CACHE, replica_health
+from recipes.models import Favourite
+
+RECIPES_URL = '/api/recipes/'
+LIST_URL = RECIPES_URL + '?limit=6'
+
+
+class Queries:
+    """Алиасы баз, на которых выполнялись запросы."""
+
+    def __init__(self):
+        self.aliases = []
+
+    def __call__(self, execute, sql, params, many, context):
+        self.aliases.append(context['connection'].alias)
+        return execute(sql, params, many, context)
+
+    def run(self, request, *args, **kwargs):
+        self.aliases.clear()
+        with ExitStack() as stack:
+            for alias in ('default', 'replica'):
+                stack.enter_context(
+                    connections[alias].execute_wrapper(self))
+            response = request(*args, **kwargs)
+        return response, set(self.aliases)
+
+
+@pytest.fixture
+def replicas(settings):
+    settings.DATABASE_REPLICAS = ['replica']
+    replica_health.down_until.clear()
+    caches[STICKY_CACHE].clear()
+    yield
+    replica_health.down_until.clear()
+    caches[STICKY_CACHE].clear()
+
+
+# Реплика — второе соединение с той же тестовой базой: данные должны
+# быть закоммичены, чтобы она их видела.
+@pytest.mark.django_db(transaction=True, databases=['default', 'replica'])
+class TestPrimaryReplicaRouter:
+
+    def test_reads_go_to_replica(self, client, recipes, replicas):
+        queries = Queries()
+        response, aliases = queries.run(client.get, LIST_URL)
+        assert response.status_code == 200
+        assert response.json()['count'] == len(recipes)
+        assert aliases == {'replica'}
+
+    def test_token_is_read_from_primary(self, user_client, recipes,
+                                        replicas):
+        queries = Queries()
+        response, _ = queries.run(user_client.get, LIST_URL)
+        assert response.status_code == 200
+        assert queries.aliases[0] == 'default'
+        assert set(queries.aliases[1:]) == {'replica'}
+
+    def test_writes_and_following_reads_go_to_primary(
+            self, user, user_client, recipes, replicas):
+        queries = Queries()
+        response, aliases = queries.run(
+            user_client.post, f'{RECIPES_URL}{recipes[0].id}/favorite/')
+        assert response.status_code == 201
+        assert aliases == {'default'}
+        assert Favourite.objects.filter(user=user).exists()
+
+        response, aliases = queries.run(
+            user_client.get, LIST_URL + '&is_favorited=1')
+        assert response.status_code == 200
+        assert response.json()['count'] == 1
+        assert aliases == {'default'}
+
+    def test_without_replicas(self, client, recipes, settings):
+        settings.DATABASE_REPLICAS = []
+        queries = Queries()
+        response, aliases = queries.run(client.get, LIST_URL)
+        assert response.status_code == 200
+        assert aliases == {'default'}
+
+    def test_unhealthy_replica_falls_back_to_primary(
+            self, client, recipes, replicas, monkeypatch):
+        def ensure_connection():
+            raise OperationalError('Реплика недоступна.')
+
+        connections['replica'].close()
+        monkeypatch.setattr(connections['replica'], 'ensure_connection',
+                            ensure_connection)
+        queries = Queries()
+        response, aliases = queries.run(client.get, LIST_URL)
+        assert response.status_code == 200
+        assert response.json()['count'] == len(recipes)
+        assert aliases == {'default'}
+        assert 'replica' in replica_health.down_until
+
+        # Пока реплика исключена, подключение не проверяется.
+        monkeypatch.undo()
+        response, aliases = queries.run(client.get, LIST_URL)
+        assert aliases == {'default'}
+
+        replica_health.down_until.clear()
+        response, aliases = queries.run(client.get, LIST_URL)
+        assert aliases == {'replica'}
@@ -0,0 +1,47 @@
+import pytest
+from rest_framework.test import APIClient
+
+FEED_URL = '/api/recipes/feed/'
+
+
+@pytest.fixture
+def reader_client(django_user_model, user, recipes):
+    reader = django_user_model.objects.create_user(
+        email='reader@foodgram.ru', username='reader', first_name='Олег',
+        last_name='Иванов', password='Test12345!')
+    client = APIClient()
+    client.force_authenticate(reader)
+    response = client.post(f'/api/users/{user.id}/subscribe/')
+    assert response.status_code == 201
+    return client
+
+
+@pytest.mark.django_db
+class TestFeed:
+
+    def test_unpaginated(self, reader_client, recipes):
+        response = reader_client.get(FEED_URL)
+        assert response.status_code == 200
+        assert [recipe['id'] for recipe in response.json()] == sorted(
+            (recipe.id for recipe in recipes), reverse=True)
+
+    def test_paginated(self, reader_client, recipes):
+        response = reader_client.get(f'{FEED_URL}?limit=5&page=2')
+        assert response.status_code == 200
+        data = response.json()
+        assert data['count'] == len(recipes)
+        assert [recipe['id'] for recipe in data['results']] == sorted(
+            (recipe.id for recipe in recipes), reverse=True)[5:10]
+
+    def test_cursor(self, reader_client, recipes):
+        response = reader_client.get(f'{FEED_URL}?pagination=cursor&limit=5')
+        assert response.status_code == 200
+        data = response.json()
+        assert [recipe['id'] for recipe in data['results']] == sorted(
+            (recipe.id for recipe in recipes), reverse=True)[:5]
+        assert data['next']
+
+    def test_empty_without_subscriptions(self, user_client, recipes):
+        response = user_client.get(FEED_URL)
+        assert response.status_code == 200
+        assert response.json() == []
@@ -0,0 +1,56 @@
+import pytest
+
+from recipes.models import IngredientsAmount
+
+PANTRY_URL = '/api/recipes/pantry/'
+
+
+def expected_pantry(recipes, pantry, min_coverage=0):
+    """Результат поиска по продуктам, посчитанный по базе."""
+
+    rows = []
+    for recipe in recipes:
+        ingredient_ids = set(IngredientsAmount.objects.filter(
+            recipe=recipe).values_list('ingredient_id', flat=True))
+        matched = len(ingredient_ids & pantry)
+        total = len(ingredient_ids)
+        if matched and matched >= min_coverage * total:
+            rows.append((recipe.id, matched, total))
+    rows.sort(key=lambda row: (-row[1] / row[2], -row[1], -row[0]))
+    return rows
+
+
+def pantry_query(pantry, **params):
+    query = '&'.join(f'ingredients={pk}' for pk in sorted(pantry))
+    for key, value in params.items():
+        query += f'&{key}={value}'
+    return f'{PANTRY_URL}?{query}'
+
+
+def as_rows(results):
+    return [(recipe['id'], recipe['matched_count'],
+             recipe['matched_count'] + recipe['missing_count'])
+            for recipe in results]
+
+
+@pytest.mark.django_db
+class TestPantry:
+
+    def test_unpaginated(self, client, recipes, ingredients):
+        pantry = {ingredients[0].id, ingredients[1].id}
+        response = client.get(pantry_query(pantry))
+        assert response.status_code == 200
+        assert as_rows(response.json()) == expected_pantry(recipes, pantry)
+
+    def test_paginated(self, client, recipes, ingredients):
+        pantry = {ingredients[1].id, ingredients[2].id, ingredients[3].id}
+        expected = expected_pantry(recipes, pantry, 0.5)
+        response = client.get(pantry_query(pantry, limit=3,
+                                           min_coverage=0.5))
+        assert response.status_code == 200
+        data = response.json()
+        assert data['count'] == len(expected)
+        assert as_rows(data['results']) == expected[:3]
+
+    def test_requires_ingredients(self, client, recipes):
+        assert client.get(PANTRY_URL).status_code == 400
@@ -0,0 +1,75 @@
+import pytest
+
+from recipes.models import Follow
+
+# Все действия с query_budgets. Индексы в памяти не прогреваются:
+# их сборка не входит в бюджет (api.middleware.exempt_from_budget).
+BUDGETED_URLS = (
+    '/api/users/subscriptions/?limit=6&recipes_limit=2',
+    '/api/recipes/',
+    '/api/recipes/?limit=6',
+    '/api/recipes/?limit=6&tags=tag0&tags=tag1',
+    '/api/recipes/?limit=6&is_favorited=1&is_in_shopping_cart=1',
+    '/api/recipes/?limit=6&author={author}',
+    '/api/recipes/?limit=6&pagination=cursor',
+    '/api/recipes/{recipe}/',
+    '/api/recipes/download_shopping_cart/',
+    '/api/recipes/feed/?limit=6',
+    '/api/recipes/{recipe}/similar/',
+    '/api/recipes/pantry/?limit=6&ingredients={ingredient}',
+    '/api/ingredients/',
+    '/api/ingredients/?name=Прод',
+    '/api/ingredients/{ingredient}/',
+    '/api/tags/',
+    '/api/tags/{tag}/',
+)
+
+
+@pytest.fixture
+def query_budget(settings):
+    settings.MIDDLEWARE = [
+        'api.middleware.QueryBudgetMiddleware', *settings.MIDDLEWARE]
+    settings.QUERY_BUDGET_RAISE = True
+
+
+@pytest.fixture
+def cook_client(django_user_model, user_client, recipes):
+    """Клиент автора рецептов с подпиской, избранным и корзиной."""
+
+    baker = django_user_model.objects.create_user(
+        email='baker@foodgram.ru', username='baker', first_name='Анна',
+        last_name='Сидорова', password='Test12345!')
+    Follow.objects.create(user=recipes[0].author, following=baker)
+    for recipe in recipes[:3]:
+        assert user_client.post(
+            f'/api/recipes/{recipe.id}/favorite/').status_code == 201
+        assert user_client.post(
+            f'/api/recipes/{recipe.id}/shopping_cart/').status_code == 201
+    return user_client
+
+
+@pytest.mark.django_db
+@pytest.mark.usefixtures('query_budget')
+class TestQueryBudgets:
+
+    @pytest.mark.parametrize('url', BUDGETED_URLS)
+    def test_authenticated(self, cook_client, recipes, ingredients, tags,
+                           url):
+        self.check(cook_client, url, recipes, ingredients, tags)
+
+    @pytest.mark.parametrize('url', (
+        url for url in BUDGETED_URLS
+        if 'subscriptions' not in url and 'feed' not in url
+        and 'shopping' not in url))
+    def test_anonymous(self, client, recipes, ingredients, tags, url):
+        self.check(client, url, recipes, ingredients, tags)
+
+    @staticmethod
+    def check(client, url, recipes, ingredients, tags):
+        url = url.format(author=recipes[0].author_id, recipe=recipes[0].id,
+                         ingredient=ingredients[0].id, tag=tags[0].id)
+        response = client.get(url)
+        if response.streaming:
+            b''.join(response.streaming_content)
+        assert response.status_code == 200
+        assert 'X-DB-Query-Budget' in response
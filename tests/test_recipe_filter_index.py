@@ -0,0 +1,108 @@
+from itertools import product
+from types import SimpleNamespace
+
+import pytest
+from conftest import image
+from django.contrib.auth.models import AnonymousUser
+from django.http import QueryDict
+
+from api.filters import RecipeFilter
+from api.indexes import recipe_filter_index
+from recipes.models import Favourite, Recipe, ShoppingCart
+
+
+@pytest.fixture
+def catalog(django_user_model, user, tags, ingredients, recipes):
+    """Рецепты двух авторов, избранное и корзина пользователя."""
+
+    other = django_user_model.objects.create_user(
+        email='baker@foodgram.ru', username='baker', first_name='Анна',
+        last_name='Сидорова', password='Test12345!')
+    for index in range(8):
+        recipe = Recipe.objects.create(
+            author=other, name=f'Выпечка {index}', text='Описание',
+            cooking_time=5 * (index + 1), image=image())
+        recipe.tags.set(tags[index % 3:])
+        recipe.ingredients.set(ingredients[index % 6:index % 6 + 2],
+                               through_defaults={'amount': 1})
+    # Рецепт без тегов и ингредиентов.
+    Recipe.objects.create(author=other, name='Пустой', text='Описание',
+                          cooking_time=1, image=image())
+
+    for recipe in Recipe.objects.order_by('id')[::3]:
+        Favourite.objects.create(user=user, recipe=recipe)
+    for recipe in Recipe.objects.order_by('id')[::4]:
+        ShoppingCart.objects.create(user=user, recipe=recipe)
+    return SimpleNamespace(user=user, other=other, tags=tags,
+                           ingredients=ingredients)
+
+
+def query(**params):
+    result = QueryDict(mutable=True)
+    for name, value in params.items():
+        if value is None:
+            continue
+        if isinstance(value, (list, tuple)):
+            result.setlist(name, [str(item) for item in value])
+        else:
+            result[name] = str(value)
+    return result
+
+
+def compare(params, user):
+    """id рецептов по индексу и по RecipeFilter в базе."""
+
+    request = SimpleNamespace(user=user)
+    filterset = RecipeFilter(params, queryset=Recipe.objects.all(),
+                             request=request)
+    assert filterset.is_valid(), filterset.errors
+    expected = list(filterset.qs.order_by('-id').distinct()
+                    .values_list('id', flat=True))
+    recipe_ids = recipe_filter_index.filter(filterset.form.cleaned_data,
+                                            user)
+    assert recipe_ids is not None
+    assert list(recipe_ids) == expected, params.urlencode()
+    assert len(recipe_ids) == len(expected)
+    return expected
+
+
+@pytest.mark.django_db
+class TestRecipeFilterIndex:
+
+    def test_combinations(self, catalog):
+        authors = (None, catalog.user.pk, catalog.other.pk)
+        tag_sets = (None, ['tag0'], ['tag1', 'tag2'])
+        flags = (None, 0, 1)
+        matched = set()
+        for tags, author, favorited, in_cart in product(
+                tag_sets, authors, flags, flags):
+            expected = compare(query(
+                tags=tags, author=author, is_favorited=favorited,
+                is_in_shopping_cart=in_cart), catalog.user)
+            matched.add(bool(expected))
+        # Среди сочетаний есть и пустые, и непустые результаты.
+        assert matched == {True, False}
+
+    def test_anonymous_ignores_user_flags(self, catalog):
+        for favorited, in_cart in product((None, 1), repeat=2):
+            compare(query(tags=['tag0'], is_favorited=favorited,
+                          is_in_shopping_cart=in_cart), AnonymousUser())
+
+    def test_ingredients_and_cooking_time(self, catalog):
+        first, second, third = (ingredient.pk
+                                for ingredient in catalog.ingredients[:3])
+        for params in (
+            query(ingredients=[first]),
+            query(ingredients=[first, second]),
+            query(exclude_ingredients=[first]),
+            query(ingredients=[second], exclude_ingredients=[third]),
+            query(cooking_time_min=15),
+            query(cooking_time_max=12),
+            query(cooking_time_min=10, cooking_time_max=20,
+                  tags=['tag1'], is_favorited=1),
+        ):
+            compare(params, catalog.user)
+
+    def test_search_is_not_indexed(self, catalog):
+        assert recipe_filter_index.filter({'search': 'Рецепт'},
+                                          catalog.user) is None
@@ -0,0 +1,33 @@
+import pytest
+
+LIST_URL = '/api/recipes/'
+
+
+@pytest.mark.django_db
+class TestRecipeListQueries:
+    """Количество SQL запросов на страницу списка рецептов
+    не зависит от размера страницы.
+    """
+
+    @pytest.mark.parametrize('limit', (2, 10))
+    def test_anonymous(self, client, recipes, limit,
+                       django_assert_num_queries):
+        url = f'{LIST_URL}?limit={limit}'
+        # Первый запрос строит индекс фильтров в памяти воркера.
+        client.get(url)
+        # Рецепты страницы и prefetch тегов и ингредиентов.
+        with django_assert_num_queries(3):
+            response = client.get(url)
+        assert len(response.json()['results']) == limit
+
+    @pytest.mark.parametrize('limit', (2, 10))
+    def test_authenticated_with_filters(self, user_client, recipes, limit,
+                                        django_assert_num_queries):
+        url = f'{LIST_URL}?limit={limit}&tags=tag0&tags=tag1'
+        user_client.get(url)
+        # Плюс проверка токена и теги из параметров фильтра.
+        with django_assert_num_queries(5):
+            response = user_client.get(url)
+        results = response.json()['results']
+        assert len(results) == limit
+        assert all('is_favorited' in recipe for recipe in results)
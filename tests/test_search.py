@@ -0,0 +1,70 @@
+import pytest
+from conftest import image
+from django.db import connection
+
+from recipes.models import Recipe
+from recipes.search import search_recipes
+
+
+@pytest.fixture
+def dishes(user):
+    def create(name, text):
+        return Recipe.objects.create(author=user, name=name, text=text,
+                                     cooking_time=30, image=image())
+
+    return {
+        'borscht': create('Борщ украинский', 'Свекла, капуста и мясо.'),
+        'soup': create('Суп на говяжьем бульоне',
+                       'Подавать со сметаной, как борщ.'),
+        'salad': create('Винегрет', 'Свекла, огурцы и горошек.'),
+        'pie': create('Ёлочный пирог', 'Пирог с капустой.'),
+    }
+
+
+def found(value):
+    return [recipe.name for recipe in search_recipes(Recipe.objects.all(),
+                                                     value)]
+
+
+@pytest.mark.django_db
+class TestSearch:
+
+    def test_name_ranks_above_text(self, dishes):
+        assert found('борщ') == ['Борщ украинский',
+                                 'Суп на говяжьем бульоне']
+
+    def test_case_and_prefix(self, dishes):
+        assert found('БОРЩ') == found('борщ')
+        assert found('капуст') == ['Ёлочный пирог', 'Борщ украинский']
+        assert found('говяж бульон') == ['Суп на говяжьем бульоне']
+
+    def test_index_follows_changes(self, dishes):
+        recipe = dishes['salad']
+        recipe.name = 'Борщ холодный'
+        recipe.save()
+        assert found('борщ')[0] in ('Борщ украинский', 'Борщ холодный')
+        assert 'Борщ холодный' in found('борщ')
+
+        recipe.delete()
+        assert 'Борщ холодный' not in found('борщ')
+
+    @pytest.mark.parametrize('value', ('', '  ', '?!'))
+    def test_empty_query(self, dishes, value):
+        assert found(value) == []
+
+    def test_api(self, client, dishes):
+        response = client.get('/api/recipes/', {'search': 'свекла'})
+        assert response.status_code == 200
+        assert {recipe['name'] for recipe in response.json()} == {
+            'Борщ украинский', 'Винегрет'}
+
+    def test_icontains_fallback(self, dishes, monkeypatch):
+        # В СУБД без полнотекстового поиска ищем по вхождению строки
+        # в название или описание, без ранжирования.
+        monkeypatch.setattr(connection, 'vendor', 'mysql')
+        queryset = search_recipes(Recipe.objects.all(), 'капуст')
+        sql = str(queryset.query)
+        names = {recipe.name for recipe in queryset}
+        monkeypatch.undo()
+        assert 'LIKE' in sql and 'recipes_recipe_fts' not in sql
+        assert names == {'Борщ украинский', 'Ёлочный пирог'}
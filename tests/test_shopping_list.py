@@ -0,0 +1,113 @@
+from collections import Counter
+
+import pytest
+
+from recipes.models import IngredientsAmount, ShoppingCart, ShoppingListItem
+
+
+def shopping_list(user):
+    return dict(ShoppingListItem.objects.filter(user=user).values_list(
+        'ingredient_id', 'amount'))
+
+
+def expected_list(user):
+    """Список покупок, пересчитанный по корзине пользователя."""
+
+    result = Counter()
+    for ingredient_id, amount in IngredientsAmount.objects.filter(
+            recipe__shop_recipe__user=user).values_list(
+                'ingredient_id', 'amount'):
+        result[ingredient_id] += amount
+    return dict(result)
+
+
+@pytest.mark.django_db
+class TestApply:
+
+    def test_upsert(self, user, ingredients):
+        first, second, third = (ingredient.id for ingredient in ingredients[:3])
+        ShoppingListItem.objects.apply((user.id,), {first: 5, second: 2})
+        # Существующие строки увеличиваются (ON CONFLICT DO UPDATE),
+        # недостающие создаются.
+        ShoppingListItem.objects.apply((user.id, user.id),
+                                       {first: 3, third: 7})
+        assert shopping_list(user) == {first: 8, second: 2, third: 7}
+
+    def test_batches(self, user, ingredients):
+        rows = [(user.id, ingredient.id, 1) for ingredient in ingredients]
+        ShoppingListItem.objects.upsert(rows, batch_size=4)
+        ShoppingListItem.objects.upsert(rows[:2], batch_size=4)
+        assert shopping_list(user) == {
+            ingredient.id: 2 if index < 2 else 1
+            for index, ingredient in enumerate(ingredients)}
+
+    def test_subtract(self, user, ingredients):
+        first, second, third = (ingredient.id for ingredient in ingredients[:3])
+        ShoppingListItem.objects.apply((user.id,),
+                                       {first: 5, second: 2, third: 1})
+        ShoppingListItem.objects.apply((user.id,),
+                                       {first: -3, second: -2, third: -4})
+        # Нулевые и отрицательные итоги удаляются.
+        assert shopping_list(user) == {first: 2}
+
+    def test_mixed(self, user, django_user_model, ingredients):
+        other = django_user_model.objects.create_user(
+            email='baker@foodgram.ru', username='baker', first_name='Анна',
+            last_name='Сидорова', password='Test12345!')
+        first, second = (ingredient.id for ingredient in ingredients[:2])
+        ShoppingListItem.objects.apply((user.id, other.id), {first: 4})
+        ShoppingListItem.objects.apply((user.id, other.id),
+                                       {first: -1, second: 6})
+        assert shopping_list(user) == shopping_list(other) == {
+            first: 3, second: 6}
+
+    def test_nothing_to_do(self, user, ingredients,
+                           django_assert_num_queries):
+        with django_assert_num_queries(0):
+            ShoppingListItem.objects.apply((), {ingredients[0].id: 1})
+            ShoppingListItem.objects.apply((user.id,), {})
+
+
+@pytest.mark.django_db
+class TestRecipeChanges:
+
+    @pytest.fixture
+    def cart(self, user, user_client, recipes):
+        for recipe in recipes[:4]:
+            response = user_client.post(
+                f'/api/recipes/{recipe.id}/shopping_cart/')
+            assert response.status_code == 201
+        assert shopping_list(user) == expected_list(user)
+        return recipes[:4]
+
+    def test_remove_from_cart(self, user, user_client, cart):
+        response = user_client.delete(
+            f'/api/recipes/{cart[1].id}/shopping_cart/')
+        assert response.status_code == 204
+        assert not ShoppingCart.objects.filter(recipe=cart[1]).exists()
+        assert shopping_list(user) == expected_list(user)
+
+    def test_patch(self, user, user_client, cart, ingredients, tags):
+        recipe = cart[0]
+        kept, removed = recipe.recipes_amount.order_by('id')[:2]
+        response = user_client.patch(f'/api/recipes/{recipe.id}/', {
+            'ingredients': [
+                {'id': kept.ingredient_id, 'amount': kept.amount + 10},
+                {'id': ingredients[5].id, 'amount': 7},
+            ],
+            'tags': [tags[0].id],
+        }, format='json')
+        assert response.status_code == 200
+        assert not recipe.recipes_amount.filter(
+            ingredient_id=removed.ingredient_id).exists()
+        assert shopping_list(user) == expected_list(user)
+
+    def test_delete(self, user, user_client, cart):
+        response = user_client.delete(f'/api/recipes/{cart[2].id}/')
+        assert response.status_code == 204
+        assert shopping_list(user) == expected_list(user)
+
+        for recipe in (cart[0], cart[1], cart[3]):
+            assert user_client.delete(
+                f'/api/recipes/{recipe.id}/').status_code == 204
+        assert shopping_list(user) == {}
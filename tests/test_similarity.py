@@ -0,0 +1,58 @@
+import heapq
+import random
+
+import pytest
+
+from recipes.management.commands.generate_dataset import zipf_weights
+from recipes.similarity import jaccard, load_ingredient_sets, similar_recipes
+
+
+def generate(recipes, ingredients, seed):
+    """Пары (рецепт, ингредиент) с популярностью ингредиентов по Ципфу,
+    как в generate_dataset.
+    """
+
+    rng = random.Random(seed)
+    weights = zipf_weights(ingredients, 1.0)
+    return [(recipe_id, ingredient_id)
+            for recipe_id in range(1, recipes + 1)
+            for ingredient_id in rng.choices(
+                range(ingredients), cum_weights=weights,
+                k=rng.randint(3, 12))]
+
+
+def brute_force(recipe_id, recipes, top_k):
+    ingredients = recipes[recipe_id]
+    return [(pk, score) for score, pk in heapq.nlargest(top_k, (
+        (jaccard(ingredients, other), pk)
+        for pk, other in recipes.items() if pk != recipe_id))]
+
+
+@pytest.mark.parametrize('size, ingredients, top_k', (
+    (300, 40, 10),
+    (2000, 500, 10),
+    (2000, 30, 5),
+))
+def test_same_as_brute_force(size, ingredients, top_k):
+    recipes, postings = load_ingredient_sets(
+        generate(size, ingredients, seed=size + ingredients))
+    sample = random.Random(size).sample(sorted(recipes), 300)
+    for recipe_id in sample:
+        assert similar_recipes(recipe_id, recipes, postings, top_k) == (
+            brute_force(recipe_id, recipes, top_k))
+
+
+def test_ties_and_short_lists():
+    recipes, postings = load_ingredient_sets([
+        (1, 10), (1, 11),
+        (2, 10), (2, 11),
+        (3, 10), (3, 11),
+        (4, 11), (4, 12),
+        (5, 13),
+    ])
+    # При равной оценке выше рецепт с большим id.
+    assert similar_recipes(1, recipes, postings, 2) == [(3, 1.0), (2, 1.0)]
+    assert similar_recipes(4, recipes, postings, 10) == [
+        (3, 1 / 3), (2, 1 / 3), (1, 1 / 3)]
+    assert similar_recipes(5, recipes, postings, 10) == []
+    assert similar_recipes(1, recipes, postings, 0) == []
@@ -0,0 +1,75 @@
+import pytest
+from rest_framework.test import APIClient
+
+from recipes.models import Follow, Recipe
+
+SUBSCRIPTIONS_URL = '/api/users/subscriptions/'
+
+
+@pytest.fixture
+def authors(django_user_model, recipes):
+    """Два автора: у первого все рецепты из фикстуры recipes."""
+
+    first = recipes[0].author
+    second = django_user_model.objects.create_user(
+        email='baker@foodgram.ru', username='baker', first_name='Анна',
+        last_name='Сидорова', password='Test12345!')
+    return first, second
+
+
+@pytest.fixture
+def reader(django_user_model, authors):
+    reader = django_user_model.objects.create_user(
+        email='reader@foodgram.ru', username='reader', first_name='Олег',
+        last_name='Иванов', password='Test12345!')
+    for author in authors:
+        Follow.objects.create(user=reader, following=author)
+    return reader
+
+
+@pytest.fixture
+def reader_client(reader):
+    client = APIClient()
+    client.force_authenticate(reader)
+    return client
+
+
+@pytest.mark.django_db
+class TestSubscriptions:
+
+    @pytest.mark.parametrize('query', ('?limit=6&recipes_limit=2',
+                                       '?limit=6'))
+    def test_no_subscriptions(self, user_client, query):
+        response = user_client.get(SUBSCRIPTIONS_URL + query)
+        assert response.status_code == 200
+        assert response.json()['count'] == 0
+        assert response.json()['results'] == []
+
+    @pytest.mark.parametrize('query', ('?recipes_limit=2', ''))
+    def test_no_subscriptions_unpaginated(self, user_client, query):
+        response = user_client.get(SUBSCRIPTIONS_URL + query)
+        assert response.status_code == 200
+        assert response.json() == []
+
+    def test_recipes_limit(self, reader_client, authors):
+        response = reader_client.get(
+            SUBSCRIPTIONS_URL + '?limit=6&recipes_limit=2')
+        assert response.status_code == 200
+        results = {
+            author['id']: author for author in response.json()['results']}
+        first, second = authors
+        assert set(results) == {first.id, second.id}
+
+        latest = list(Recipe.objects.filter(author=first)
+                      .order_by('-id').values_list('id', flat=True)[:2])
+        recipes = results[first.id]['recipes']
+        assert [recipe['id'] for recipe in recipes] == latest
+        assert results[second.id]['recipes'] == []
+
+    def test_unpaginated(self, reader_client, authors):
+        response = reader_client.get(SUBSCRIPTIONS_URL + '?recipes_limit=1')
+        assert response.status_code == 200
+        data = response.json()
+        assert [author['id'] for author in data] == sorted(
+            author.id for author in authors)
+        assert len(data[0]['recipes']) == 1
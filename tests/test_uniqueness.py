@@ -0,0 +1,145 @@
+import pytest
+from django.db import IntegrityError, connection, transaction
+from django.db.migrations.executor import MigrationExecutor
+
+from recipes.models import Favourite, Follow, ShoppingCart, ShoppingListItem
+
+BEFORE = ('recipes', '0020_auto_20261018_0552')
+AFTER = ('recipes', '0022_auto_20261018_0556')
+
+
+def migrate(target):
+    """Мигрирует базу и возвращает модели в состоянии target."""
+
+    executor = MigrationExecutor(connection)
+    executor.migrate([target])
+    return executor.loader.project_state(target).apps
+
+
+@pytest.fixture
+def old_apps():
+    apps = migrate(BEFORE)
+    yield apps
+    executor = MigrationExecutor(connection)
+    executor.migrate(executor.loader.graph.leaf_nodes())
+
+
+@pytest.mark.django_db(transaction=True)
+class TestRemoveDuplicates:
+
+    def test_migration(self, old_apps):
+        User = old_apps.get_model('recipes', 'User')
+        Recipe = old_apps.get_model('recipes', 'Recipe')
+        Ingredient = old_apps.get_model('recipes', 'Ingredient')
+        IngredientsAmount = old_apps.get_model('recipes', 'IngredientsAmount')
+        OldFavourite = old_apps.get_model('recipes', 'Favourite')
+        OldFollow = old_apps.get_model('recipes', 'Follow')
+        OldCart = old_apps.get_model('recipes', 'ShoppingCart')
+        OldItem = old_apps.get_model('recipes', 'ShoppingListItem')
+
+        author, reader = (
+            User.objects.create(email=f'{name}@foodgram.ru', username=name,
+                                first_name='Имя', last_name='Фамилия')
+            for name in ('cook', 'reader'))
+        first, second = (
+            Recipe.objects.create(author=author, name=f'Рецепт {index}',
+                                  text='Описание', cooking_time=10,
+                                  image='recipes/images/recipe.png')
+            for index in range(2))
+        salt, flour = (Ingredient.objects.create(name=name,
+                                                 measurement_unit='г')
+                       for name in ('соль', 'мука'))
+        IngredientsAmount.objects.bulk_create((
+            IngredientsAmount(recipe=first, ingredient=salt, amount=5),
+            IngredientsAmount(recipe=second, ingredient=salt, amount=2),
+            IngredientsAmount(recipe=second, ingredient=flour, amount=300),
+        ))
+
+        # Повторы, которые могли появиться до уникальных ограничений.
+        for _ in range(3):
+            OldFavourite.objects.create(user=reader, recipe=first)
+            OldFollow.objects.create(user=reader, following=author)
+            OldCart.objects.create(user=reader, recipe=second)
+        OldFavourite.objects.create(user=reader, recipe=second)
+        OldCart.objects.create(user=reader, recipe=first)
+        # Список покупок, набранный с учетом повторов в корзине.
+        OldItem.objects.bulk_create((
+            OldItem(user=reader, ingredient=salt, amount=11),
+            OldItem(user=reader, ingredient=flour, amount=900),
+        ))
+        Recipe.objects.filter(pk=first.pk).update(favorites_count=3)
+        User.objects.filter(pk=author.pk).update(followers_count=3)
+        keep = OldFavourite.objects.filter(
+            user=reader, recipe=first).order_by('pk').first().pk
+
+        new_apps = migrate(AFTER)
+        Favourite = new_apps.get_model('recipes', 'Favourite')
+        Follow = new_apps.get_model('recipes', 'Follow')
+        ShoppingCart = new_apps.get_model('recipes', 'ShoppingCart')
+        ShoppingListItem = new_apps.get_model('recipes', 'ShoppingListItem')
+        User = new_apps.get_model('recipes', 'User')
+        Recipe = new_apps.get_model('recipes', 'Recipe')
+
+        assert sorted(Favourite.objects.values_list('recipe', flat=True)) == [
+            first.pk, second.pk]
+        assert Favourite.objects.get(recipe_id=first.pk).pk == keep
+        assert Follow.objects.count() == 1
+        assert sorted(ShoppingCart.objects.values_list(
+            'recipe', flat=True)) == [first.pk, second.pk]
+        assert dict(ShoppingListItem.objects.values_list(
+            'ingredient', 'amount')) == {salt.pk: 7, flour.pk: 300}
+        assert dict(Recipe.objects.values_list('pk', 'favorites_count')) == {
+            first.pk: 1, second.pk: 1}
+        assert User.objects.get(pk=author.pk).followers_count == 1
+
+        # Модели из состояния миграции не принимают экземпляры старого
+        # состояния, поэтому связи задаются через id.
+        for model, fields in ((Favourite, {'recipe_id': first.pk}),
+                              (ShoppingCart, {'recipe_id': second.pk}),
+                              (Follow, {'following_id': author.pk})):
+            with pytest.raises(IntegrityError), transaction.atomic():
+                model.objects.create(user_id=reader.pk, **fields)
+
+
+@pytest.mark.django_db
+class TestDuplicateAdd:
+
+    @pytest.mark.parametrize('url, model', (
+        ('/api/recipes/{}/favorite/', Favourite),
+        ('/api/recipes/{}/shopping_cart/', ShoppingCart),
+    ))
+    def test_recipe_lists(self, user, user_client, recipes, url, model):
+        recipe = recipes[0]
+        url = url.format(recipe.id)
+        assert user_client.post(url).status_code == 201
+
+        response = user_client.post(url)
+        assert response.status_code == 400
+        assert model.objects.filter(user=user, recipe=recipe).count() == 1
+        recipe.refresh_from_db()
+        if model is Favourite:
+            assert recipe.favorites_count == 1
+        else:
+            assert dict(ShoppingListItem.objects.filter(
+                user=user).values_list('ingredient', 'amount')) == dict(
+                recipe.recipes_amount.values_list('ingredient', 'amount'))
+
+    def test_subscribe(self, user, user_client, django_user_model):
+        author = django_user_model.objects.create_user(
+            email='baker@foodgram.ru', username='baker', first_name='Анна',
+            last_name='Сидорова', password='Test12345!')
+        url = f'/api/users/{author.id}/subscribe/'
+        assert user_client.post(url).status_code == 201
+
+        response = user_client.post(url)
+        assert response.status_code == 400
+        assert Follow.objects.filter(user=user, following=author).count() == 1
+        author.refresh_from_db()
+        assert author.followers_count == 1
+
+    def test_insert_conflict(self, user, recipes):
+        # Параллельный повтор, который прошел проверки в представлении,
+        # отсекается уникальным ограничением в базе.
+        Favourite.objects.create(user=user, recipe=recipes[0])
+        with pytest.raises(IntegrityError), transaction.atomic():
+            Favourite.objects.create(user=user, recipe=recipes[0])
@@ -0,0 +1,180 @@
+import io
+import os
+
+import pytest
+from PIL import Image
+
+from api import uploads
+from recipes.models import ImageUpload
+
+UPLOADS_URL = '/api/uploads/'
+
+
+def png(width=8, height=8):
+    buffer = io.BytesIO()
+    Image.new('RGB', (width, height), (200, 10, 10)).save(buffer, 'PNG')
+    return buffer.getvalue()
+
+
+def open_paths():
+    """Файлы, открытые процессом (Linux)."""
+
+    paths = set()
+    for fd in os.listdir('/proc/self/fd'):
+        try:
+            paths.add(os.readlink(f'/proc/self/fd/{fd}'))
+        except OSError:
+            pass
+    return paths
+
+
+@pytest.fixture(autouse=True)
+def upload_root(settings, tmp_path):
+    settings.UPLOAD_ROOT = tmp_path / 'uploads'
+
+
+def start(client, size):
+    response = client.post(UPLOADS_URL, {'size': size}, format='json')
+    assert response.status_code == 201
+    return response.json()['token']
+
+
+def put(client, token, data, offset):
+    return client.generic('PUT', f'{UPLOADS_URL}{token}/', data,
+                          content_type='application/octet-stream',
+                          HTTP_UPLOAD_OFFSET=str(offset))
+
+
+@pytest.mark.django_db
+class TestMultipartUpload:
+
+    def test_upload(self, user_client):
+        data = png(20, 10)
+        response = user_client.post(UPLOADS_URL, {
+            'file': io.BytesIO(data)}, format='multipart')
+        assert response.status_code == 201
+        assert response.json()['completed'] is True
+        assert (response.json()['width'], response.json()['height']) == (
+            20, 10)
+        upload = ImageUpload.objects.get()
+        assert upload.size == len(data)
+        assert os.path.getsize(upload.path) == len(data)
+
+    def test_size_limit(self, user_client, settings):
+        settings.IMAGE_UPLOAD_MAX_SIZE = 100
+        response = user_client.post(UPLOADS_URL, {
+            'file': io.BytesIO(png(64, 64))}, format='multipart')
+        assert response.status_code == 400
+        assert response.json() == {
+            'file': ['Файл больше заявленного размера.']}
+        assert not ImageUpload.objects.exists()
+        assert not os.listdir(settings.UPLOAD_ROOT)
+
+    def test_pixel_limit(self, user_client, settings):
+        settings.IMAGE_MAX_PIXELS = 100
+        response = user_client.post(UPLOADS_URL, {
+            'file': io.BytesIO(png(20, 10))}, format='multipart')
+        assert response.status_code == 400
+        assert response.json() == {'file': ['Изображение слишком большое.']}
+        assert not ImageUpload.objects.exists()
+
+    def test_header_limit(self, user_client, monkeypatch):
+        # Данные, в начале которых не находится заголовок изображения,
+        # отклоняются, как только их больше HEADER_LIMIT.
+        monkeypatch.setattr(uploads, 'HEADER_LIMIT', 1024)
+        response = user_client.post(UPLOADS_URL, {
+            'file': io.BytesIO(b'\0' * 4096)}, format='multipart')
+        assert response.status_code == 400
+        assert response.json() == {'file': ['Файл не является изображением.']}
+        assert not ImageUpload.objects.exists()
+
+    def test_format(self, user_client):
+        buffer = io.BytesIO()
+        Image.new('RGB', (8, 8)).save(buffer, 'BMP')
+        response = user_client.post(UPLOADS_URL, {
+            'file': io.BytesIO(buffer.getvalue())}, format='multipart')
+        assert response.status_code == 400
+        assert response.json() == {
+            'file': ['Формат BMP не поддерживается.']}
+
+
+@pytest.mark.django_db
+class TestChunkedUpload:
+
+    def test_two_parts(self, user_client):
+        data = png(16, 16)
+        token = start(user_client, len(data))
+        middle = len(data) // 2
+
+        response = put(user_client, token, data[:middle], 0)
+        assert response.status_code == 200
+        assert response.json()['offset'] == middle
+        assert response.json()['completed'] is False
+
+        response = put(user_client, token, data[middle:], middle)
+        assert response.status_code == 200
+        assert response.json()['completed'] is True
+        assert response.json()['format'] == 'PNG'
+
+    def test_wrong_offset(self, user_client):
+        data = png()
+        token = start(user_client, len(data))
+        assert put(user_client, token, data[:10], 0).status_code == 200
+
+        response = put(user_client, token, data[10:], 0)
+        assert response.status_code == 409
+        assert response.json()['offset'] == 10
+
+    def test_declared_size(self, user_client):
+        data = png()
+        token = start(user_client, len(data) - 1)
+        response = put(user_client, token, data, 0)
+        assert response.status_code == 400
+        assert response.json() == {
+            'file': ['Файл больше заявленного размера.']}
+        assert not ImageUpload.objects.exists()
+
+    def test_declared_size_limit(self, user_client, settings):
+        settings.IMAGE_UPLOAD_MAX_SIZE = 100
+        response = user_client.post(UPLOADS_URL, {'size': 101},
+                                    format='json')
+        assert response.status_code == 400
+        assert response.json() == {'size': ['Файл слишком большой.']}
+
+    def test_completed(self, user_client):
+        data = png()
+        token = start(user_client, len(data))
+        assert put(user_client, token, data, 0).status_code == 200
+        response = put(user_client, token, data, len(data))
+        assert response.status_code == 400
+
+
+@pytest.mark.django_db
+class TestRecipeImageToken:
+
+    @pytest.fixture
+    def token(self, user_client):
+        response = user_client.post(UPLOADS_URL, {
+            'file': io.BytesIO(png())}, format='multipart')
+        return response.json()['token']
+
+    def test_invalid_recipe_leaves_no_open_file(self, user_client, token,
+                                                tags):
+        path = ImageUpload.objects.get(token=token).path
+        response = user_client.post('/api/recipes/', {
+            'ingredients': [], 'tags': [tags[0].id], 'image': token,
+            'name': 'Рецепт', 'text': 'Описание', 'cooking_time': 10,
+        }, format='json')
+        assert response.status_code == 400
+        assert str(path) not in open_paths()
+
+    def test_recipe_with_token(self, user_client, token, tags, ingredients):
+        path = ImageUpload.objects.get(token=token).path
+        response = user_client.post('/api/recipes/', {
+            'ingredients': [{'id': ingredients[0].id, 'amount': 10}],
+            'tags': [tags[0].id], 'image': token,
+            'name': 'Рецепт', 'text': 'Описание', 'cooking_time': 10,
+        }, format='json')
+        assert response.status_code == 201
+        assert response.json()['image']
+        assert str(path) not in open_paths()